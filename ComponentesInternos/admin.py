@@ -1,17 +1,22 @@
 from django.contrib import admin
-from import_export.admin import ExportMixin
+from .exportacion import ExportacionXLSXMixin
 from import_export.formats import base_formats
 from .models import (
     NumeroInventario, SistemaOperativo, Procesador,
-    RAM, DiscoDuro
+    RAM, DiscoDuro, TrabajoExportacion
 )
 from .resources import (NumeroInventarioResource, SistemaOperativoResource, 
                       ProcesadorResource, RAMResource, DiscoDuroResource)
-from django.db.models import Q
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.apps import apps
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .views import NumeroInventarioAutocompleteView
 
 @admin.register(NumeroInventario)
-class NumeroInventarioAdmin(ExportMixin, admin.ModelAdmin):
+class NumeroInventarioAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = NumeroInventarioResource
     formats = [base_formats.XLSX]
     list_display = ['codigo', 'tipo_dispositivo', 'get_responsable']
@@ -19,76 +24,46 @@ class NumeroInventarioAdmin(ExportMixin, admin.ModelAdmin):
     list_filter = ['tipo_dispositivo']
     ordering = ['codigo']
 
+    def get_queryset(self, request):
+        # Dueños y responsables de toda la página en una consulta por tipo de dispositivo
+        return super().get_queryset(request).prefetch_related('propietario__responsable')
+
     def get_responsable(self, obj):
-        dispositivo = obj.get_dispositivo()
+        dispositivo = obj.propietario
         if dispositivo and dispositivo.responsable:
             return dispositivo.responsable
         return "-"
     get_responsable.short_description = 'Responsable'
 
-    def get_search_results(self, request, queryset, search_term):
-        print(f"\nBúsqueda iniciada con término: {search_term}")
-        
-        # Si no hay término de búsqueda, retornamos el queryset original
-        if not search_term:
-            return queryset, False
-
-        # Si estamos en un autocomplete
-        if request.path.endswith('/autocomplete/'):
-            print("Estamos en autocomplete")
-            # Obtenemos el tipo de modelo del parámetro model_name
-            model_name = request.GET.get('model_name', '').capitalize()
-            print(f"Nombre del modelo: {model_name}")
-            
-            if model_name:
-                # Convertimos el nombre del modelo a tipo de dispositivo
-                model_type = model_name.capitalize()
-                print(f"Tipo de dispositivo: {model_type}")
-                
-                # Primero filtramos por tipo
-                queryset = queryset.filter(
-                    Q(tipo_dispositivo__isnull=True) | Q(tipo_dispositivo=model_type)
-                )
-                
-                # Creamos un queryset vacío para los resultados
-                resultados = self.model.objects.none()
-                
-                try:
-                    # Buscar por código
-                    qs_codigo = queryset.filter(codigo__icontains=search_term)
-                    print(f"Resultados por código: {qs_codigo.count()}")
-                    resultados = resultados | qs_codigo
-                    
-                    # Buscar por responsable
-                    app_label = 'Perifericos' if model_type != 'PC' else 'EstacionesTrabajo'
-                    model_class = 'Scaner' if model_type == 'Scanner' else model_type
-                    print(f"Buscando en modelo: {app_label}.{model_class}")
-                    
-                    modelo = apps.get_model(app_label, model_class)
-                    
-                    # Primero obtenemos los dispositivos que tienen responsables que coinciden
-                    dispositivos_con_responsable = modelo.objects.filter(
-                        responsable__nombre__icontains=search_term,
-                        numero_inventario__isnull=False
-                    )
-                    print(f"Dispositivos encontrados por responsable: {dispositivos_con_responsable.count()}")
-                    
-                    # Luego obtenemos sus números de inventario
-                    if dispositivos_con_responsable.exists():
-                        nums_por_responsable = dispositivos_con_responsable.values_list('numero_inventario', flat=True)
-                        qs_responsable = queryset.filter(id__in=nums_por_responsable)
-                        print(f"Números de inventario por responsable: {qs_responsable.count()}")
-                        resultados = resultados | qs_responsable
-                    
-                    print(f"Total resultados combinados: {resultados.count()}")
-                    return resultados.distinct(), True
-                    
-                except Exception as e:
-                    print(f"Error en búsqueda: {str(e)}")
-                    return queryset, False
-            
-        # Si no estamos en autocomplete, hacemos la búsqueda normal
-        return super().get_search_results(request, queryset, search_term)
+    def get_urls(self):
+        urls = [
+            path('autocompletar/',
+                 self.admin_site.admin_view(
+                     NumeroInventarioAutocompleteView.as_view(admin_site=self.admin_site)
+                 ),
+                 name='ComponentesInternos_numeroinventario_autocompletar'),
+        ]
+        return urls + super().get_urls()
+
+
+class NumeroInventarioAutocompleteSelect(AutocompleteSelect):
+    """Selector que consulta el autocompletado propio de NumeroInventario"""
+    url_name = '%s:ComponentesInternos_numeroinventario_autocompletar'
+
+    def get_url(self):
+        return reverse(self.url_name % self.admin_site.name)
+
+
+class NumeroInventarioAutocompleteMixin:
+    """Usa NumeroInventarioAutocompleteSelect para el campo numero_inventario"""
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if (db_field.name == 'numero_inventario' and 'widget' not in kwargs
+                and db_field.name in self.get_autocomplete_fields(request)):
+            kwargs['widget'] = NumeroInventarioAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 class ComponenteBaseAdmin(admin.ModelAdmin):
     list_display = ['nombre']
@@ -96,29 +71,90 @@ class ComponenteBaseAdmin(admin.ModelAdmin):
     ordering = ['nombre']
 
 @admin.register(SistemaOperativo)
-class SistemaOperativoAdmin(ExportMixin, admin.ModelAdmin):
+class SistemaOperativoAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = SistemaOperativoResource
     formats = [base_formats.XLSX]
     list_display = ['nombre']
     search_fields = ['nombre']
 
 @admin.register(Procesador)
-class ProcesadorAdmin(ExportMixin, admin.ModelAdmin):
+class ProcesadorAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = ProcesadorResource
     formats = [base_formats.XLSX]
     list_display = ['nombre']
     search_fields = ['nombre']
 
 @admin.register(RAM)
-class RAMAdmin(ExportMixin, admin.ModelAdmin):
+class RAMAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = RAMResource
     formats = [base_formats.XLSX]
     list_display = ['capacidad']
     search_fields = ['capacidad']
 
 @admin.register(DiscoDuro)
-class DiscoDuroAdmin(ExportMixin, admin.ModelAdmin):
+class DiscoDuroAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = DiscoDuroResource
     formats = [base_formats.XLSX]
     list_display = ['capacidad']
     search_fields = ['capacidad']
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    """Estado y descarga de las exportaciones en segundo plano (solo lectura)"""
+    list_display = ['__str__', 'estado', 'filas', 'usuario', 'creado', 'terminado', 'get_descarga']
+    list_filter = ['estado', 'modelo']
+    fields = ['modelo', 'filtros', 'campos', 'estado', 'filas', 'error', 'usuario',
+              'creado', 'iniciado', 'terminado', 'get_descarga']
+    readonly_fields = fields
+
+    def modelos_visibles(self, request):
+        """Modelos cuyas exportaciones puede ver el usuario: los que puede ver en el admin"""
+        return [
+            modelo._meta.label for modelo, modeladmin in self.admin_site._registry.items()
+            if modeladmin.has_view_permission(request)
+        ]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario').filter(
+            modelo__in=self.modelos_visibles(request)
+        )
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_active and request.user.is_staff
+
+    def has_module_permission(self, request):
+        return self.has_view_permission(request)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:pk>/descargar/',
+                 self.admin_site.admin_view(self.descargar_view),
+                 name='ComponentesInternos_trabajoexportacion_descargar'),
+        ]
+        return urls + super().get_urls()
+
+    def descargar_view(self, request, pk):
+        trabajo = self.get_queryset(request).filter(pk=pk).first()
+        if trabajo is None or not trabajo.archivo:
+            raise Http404
+        modeladmin = self.admin_site._registry.get(apps.get_model(trabajo.modelo))
+        if modeladmin is None or not modeladmin.has_export_permission(request):
+            raise PermissionDenied
+        return FileResponse(trabajo.archivo.open('rb'), as_attachment=True,
+                            filename=trabajo.archivo.name.rsplit('/', 1)[-1])
+
+    def get_descarga(self, obj):
+        if obj.estado == TrabajoExportacion.TERMINADO and obj.archivo:
+            url = reverse(f'{self.admin_site.name}:ComponentesInternos_trabajoexportacion_descargar',
+                          args=[obj.pk])
+            return format_html('<a href="{}">Descargar</a>', url)
+        if obj.estado == TrabajoExportacion.TERMINADO:
+            return 'Reemplazada por una más reciente'
+        return '-'
+    get_descarga.short_description = 'Archivo'
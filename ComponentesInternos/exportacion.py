@@ -0,0 +1,268 @@
+"""
+Exportación a XLSX en streaming para los admins con ExportMixin.
+
+ExportMixin construye el Dataset de tablib completo en memoria antes de generar
+el archivo. ExportacionXLSXMixin, en cambio, recorre el queryset por lotes con
+.iterator(), escribe cada fila en un libro openpyxl write_only (que las va
+volcando a disco) y devuelve el archivo con un FileResponse, que se envía por
+trozos. La memoria no depende del número de filas.
+
+Cada recurso (RecursoExportacion) declara las relaciones y columnas que lee, y
+filter_export las aplica con select_related y only(): no hay consultas por fila
+ni se leen columnas que no se exportan. Los prefetch_related del changelist no
+se usan en la exportación.
+
+Las exportaciones de más de `filas_exportacion_directa` filas no se generan en la
+petición: se encarga un TrabajoExportacion y el comando procesar_exportaciones lo
+genera en segundo plano. Si ya existe un archivo para la misma exportación
+(modelo, filtros y columnas) y los datos no han cambiado desde entonces (sello
+TrabajoExportacion.VERSION_DATOS), se reutiliza.
+"""
+import datetime
+import hashlib
+import json
+import re
+import tempfile
+from decimal import Decimal
+from urllib.parse import urlencode
+from django.apps import apps
+from django.contrib import admin, messages
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db.models import Q
+from django.http import FileResponse, HttpRequest, HttpResponseRedirect, QueryDict
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from import_export.admin import ExportMixin, ImportMixin
+from import_export.formats import base_formats
+from import_export.signals import post_export
+from openpyxl import Workbook
+from .models import TrabajoExportacion
+from .versiones import obtener_version
+
+TAMANO_LOTE = 2000
+# Exportaciones con más filas se generan en segundo plano
+FILAS_EXPORTACION_DIRECTA = 5000
+# Un trabajo en proceso desde hace más tiempo se da por abandonado (el proceso murió)
+DURACION_MAXIMA_EXPORTACION = datetime.timedelta(hours=1)
+
+# Caracteres de control que openpyxl no acepta en una celda
+CARACTERES_ILEGALES = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+# Tipos que openpyxl escribe tal cual; el resto se escribe como texto
+TIPOS_NATIVOS = (bool, int, float, Decimal, datetime.date, datetime.time, datetime.timedelta)
+
+
+def limpiar_celda(valor):
+    if valor is None or isinstance(valor, TIPOS_NATIVOS):
+        return valor
+    return CARACTERES_ILEGALES.sub('', str(valor))
+
+
+def escribir_xlsx(recurso, queryset, destino, campos=None, tamano_lote=TAMANO_LOTE):
+    """
+    Escribe en `destino` (ruta o archivo) el XLSX del recurso para el queryset.
+    Devuelve el número de filas escritas.
+    """
+    recurso.before_export(queryset, export_fields=campos)
+    # RecursoExportacion.filter_export deja solo las relaciones y columnas que se exportan
+    queryset = recurso.filter_export(queryset, export_fields=campos)
+
+    # export_resource() vuelve a calcular las columnas en cada fila; aquí se calculan una vez
+    columnas = recurso.get_export_fields(campos)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append([limpiar_celda(cabecera) for cabecera in recurso.get_export_headers(selected_fields=campos)])
+    filas = 0
+    for obj in queryset.iterator(chunk_size=tamano_lote):
+        hoja.append([
+            limpiar_celda(recurso.export_field(columna, obj, force_native_type=True))
+            for columna in columnas
+        ])
+        filas += 1
+    libro.save(destino)
+    return filas
+
+
+# Exportaciones en segundo plano ------------------------------------------------------------
+
+def clave_exportacion(modelo, recurso, filtros, campos, ids):
+    datos = json.dumps([modelo, recurso, filtros, campos, ids], sort_keys=True)
+    return hashlib.md5(datos.encode('utf-8')).hexdigest()
+
+
+def encargar_exportacion(modelo, recurso, parametros, campos=None, ids=None, usuario=None):
+    """
+    Devuelve (trabajo, reutilizado): el trabajo de una exportación igual que esté
+    pendiente, o en proceso o terminado con los datos actuales, o uno nuevo.
+    `parametros` son los del changelist (request.GET).
+    """
+    modelo = modelo._meta.label
+    recurso = f'{recurso.__module__}.{recurso.__qualname__}'
+    filtros = urlencode(sorted((nombre, valor) for nombre, valores in parametros.lists() for valor in valores))
+    clave = clave_exportacion(modelo, recurso, filtros, campos, ids)
+
+    # Los pendientes aún no han leído los datos; los demás sirven si los leyeron con el sello actual
+    # (y los en proceso, si no están abandonados)
+    version = obtener_version(TrabajoExportacion.VERSION_DATOS)
+    existente = TrabajoExportacion.objects.filter(clave=clave).filter(
+        Q(estado=TrabajoExportacion.PENDIENTE)
+        | Q(estado=TrabajoExportacion.EN_PROCESO, version_datos=version,
+            iniciado__gt=timezone.now() - DURACION_MAXIMA_EXPORTACION)
+        | Q(estado=TrabajoExportacion.TERMINADO, version_datos=version)
+    ).exclude(estado=TrabajoExportacion.TERMINADO, archivo='').order_by('-creado').first()
+    if existente is not None:
+        return existente, True
+
+    trabajo = TrabajoExportacion.objects.create(
+        modelo=modelo, recurso=recurso, filtros=filtros, campos=campos, ids=ids, clave=clave,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    return trabajo, False
+
+
+def marcar_abandonados():
+    """
+    Pasa a error los trabajos en proceso desde hace más de DURACION_MAXIMA_EXPORTACION,
+    que dejó un proceso que terminó sin completarlos. No se reintentan: si el propio
+    trabajo tumbó el proceso, volvería a hacerlo; encargarlo otra vez crea uno nuevo.
+    Devuelve cuántos se marcaron.
+    """
+    ahora = timezone.now()
+    return TrabajoExportacion.objects.filter(
+        estado=TrabajoExportacion.EN_PROCESO, iniciado__lte=ahora - DURACION_MAXIMA_EXPORTACION,
+    ).update(estado=TrabajoExportacion.ERROR, terminado=ahora,
+             error='Abandonado: el proceso que lo generaba terminó sin completarlo')
+
+
+def reclamar_siguiente():
+    """
+    Marca como en proceso el pendiente más antiguo y lo devuelve (None si no hay).
+    El UPDATE condicional evita que dos procesos tomen el mismo trabajo. Antes se
+    marcan los trabajos abandonados.
+    """
+    marcar_abandonados()
+    pendientes = TrabajoExportacion.objects.filter(estado=TrabajoExportacion.PENDIENTE).order_by('creado')
+    for pk in pendientes.values_list('pk', flat=True)[:10]:
+        reclamado = TrabajoExportacion.objects.filter(pk=pk, estado=TrabajoExportacion.PENDIENTE).update(
+            estado=TrabajoExportacion.EN_PROCESO,
+            iniciado=timezone.now(),
+            # Se toma antes de leer: si los datos cambian durante la exportación, no se reutilizará
+            version_datos=obtener_version(TrabajoExportacion.VERSION_DATOS),
+        )
+        if reclamado:
+            return TrabajoExportacion.objects.get(pk=pk)
+    return None
+
+
+def ejecutar_trabajo(trabajo):
+    """
+    Genera el archivo del trabajo con el queryset que mostraría el changelist con sus
+    filtros. Devuelve el trabajo terminado o con el error. Si mientras tanto se dio
+    por abandonado (marcar_abandonados), se queda en error y el archivo se descarta.
+    """
+    try:
+        modelo = apps.get_model(trabajo.modelo)
+        modeladmin = admin.site._registry[modelo]
+        # El changelist solo lee del request los parámetros y el usuario
+        request = HttpRequest()
+        request.method = 'GET'
+        request.GET = QueryDict(trabajo.filtros)
+        request.user = trabajo.usuario or AnonymousUser()
+        queryset = modeladmin.get_export_queryset(request)
+        if trabajo.ids is not None:
+            queryset = queryset.filter(pk__in=trabajo.ids)
+        recurso = import_string(trabajo.recurso)(**modeladmin.get_export_resource_kwargs(request))
+
+        with tempfile.TemporaryFile() as archivo:
+            trabajo.filas = escribir_xlsx(recurso, queryset, archivo, trabajo.campos)
+            archivo.seek(0)
+            nombre = modeladmin.get_export_filename(request, queryset, base_formats.XLSX())
+            trabajo.archivo.save(nombre, File(archivo), save=False)
+    except Exception as e:
+        trabajo.estado = TrabajoExportacion.ERROR
+        trabajo.error = f'{type(e).__name__}: {e}'
+    else:
+        trabajo.estado = TrabajoExportacion.TERMINADO
+    trabajo.terminado = timezone.now()
+    # UPDATE condicional: no pisa el error de marcar_abandonados
+    guardado = TrabajoExportacion.objects.filter(pk=trabajo.pk, estado=TrabajoExportacion.EN_PROCESO).update(
+        estado=trabajo.estado, error=trabajo.error, filas=trabajo.filas,
+        archivo=trabajo.archivo.name or '', terminado=trabajo.terminado,
+    )
+    if not guardado:
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.refresh_from_db()
+        return trabajo
+
+    if trabajo.estado == TrabajoExportacion.TERMINADO:
+        # Los archivos anteriores de la misma exportación ya no se reutilizarán
+        anteriores = TrabajoExportacion.objects.filter(clave=trabajo.clave).exclude(pk=trabajo.pk)
+        for anterior in anteriores.exclude(archivo=''):
+            anterior.archivo.delete(save=True)
+    return trabajo
+
+
+class ExportacionXLSXMixin(ExportMixin):
+    """
+    ExportMixin que genera los XLSX con escribir_xlsx y los envía por trozos, o
+    que los encarga en segundo plano si tienen muchas filas (None: nunca)
+    """
+    tamano_lote_exportacion = TAMANO_LOTE
+    filas_exportacion_directa = FILAS_EXPORTACION_DIRECTA
+
+    def _do_file_export(self, file_format, request, queryset, export_form=None):
+        if not isinstance(file_format, base_formats.XLSX):
+            return super()._do_file_export(file_format, request, queryset, export_form=export_form)
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+
+        clase_recurso = self.choose_export_resource_class(export_form, request)
+        campos = self.get_export_resource_fields_from_form(export_form)
+        if self.filas_exportacion_directa is not None and queryset.count() > self.filas_exportacion_directa:
+            return self.encargar_exportacion(request, clase_recurso, campos, export_form)
+
+        recurso = clase_recurso(**self.get_export_resource_kwargs(request, export_form=export_form))
+        # El archivo temporal se borra al cerrarlo, cuando termina la respuesta
+        archivo = tempfile.TemporaryFile(suffix='.xlsx')
+        escribir_xlsx(recurso, queryset, archivo, campos, self.tamano_lote_exportacion)
+        archivo.seek(0)
+
+        response = FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=self.get_export_filename(request, queryset, file_format),
+            content_type=file_format.get_content_type(),
+        )
+        post_export.send(sender=None, model=self.model)
+        return response
+
+    def encargar_exportacion(self, request, clase_recurso, campos, export_form=None):
+        ids = None
+        if export_form is not None and 'export_items' in export_form.changed_data:
+            # Exportación de los elementos marcados en el changelist
+            ids = sorted(export_form.cleaned_data['export_items'])
+        trabajo, reutilizado = encargar_exportacion(
+            self.model, clase_recurso, request.GET, campos, ids, request.user
+        )
+        if trabajo.estado == TrabajoExportacion.TERMINADO:
+            self.message_user(request, 'Los datos no han cambiado desde la última exportación igual: '
+                                       'puede descargar ese archivo.', messages.SUCCESS)
+        elif reutilizado:
+            self.message_user(request, 'Ya hay una exportación igual en curso.', messages.INFO)
+        else:
+            self.message_user(request, 'La exportación se está generando en segundo plano. '
+                                       'Descárguela desde aquí cuando esté terminada.', messages.INFO)
+        return HttpResponseRedirect(
+            reverse(f'{self.admin_site.name}:ComponentesInternos_trabajoexportacion_change', args=[trabajo.pk])
+        )
+
+
+class ImportacionExportacionXLSXMixin(ImportMixin, ExportacionXLSXMixin):
+    """
+    ImportExportMixin con la exportación de ExportacionXLSXMixin. La importación
+    es la de django-import-export; con un RecursoImportacionEnBloque se hace en bloque.
+    """
+    import_export_change_list_template = 'admin/import_export/change_list_import_export.html'
@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ComponentesInternos.exportacion import ejecutar_trabajo, reclamar_siguiente
+from ComponentesInternos.models import TrabajoExportacion
+
+class Command(BaseCommand):
+    help = ('Genera las exportaciones encargadas desde el admin. Se deja corriendo como servicio; '
+            'con --una-vez procesa la cola y termina')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar las exportaciones pendientes y terminar'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera entre dos revisiones de la cola vacía (por defecto: 5)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            trabajo = reclamar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    return
+                # Conexión nueva si la anterior caducó mientras se esperaba
+                close_old_connections()
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Exportando {trabajo} (#{trabajo.pk})...')
+            inicio = time.monotonic()
+            ejecutar_trabajo(trabajo)
+            if trabajo.estado == TrabajoExportacion.TERMINADO:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {trabajo.filas} filas en {time.monotonic() - inicio:.1f} s: {trabajo.archivo.name}'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ {trabajo.error}'))
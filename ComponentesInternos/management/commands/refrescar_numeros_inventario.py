@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ComponentesInternos.models import NumeroInventario, SufijoBusqueda, TrabajoExportacion
+from ComponentesInternos.versiones import incrementar_version
+
+class Command(BaseCommand):
+    help = 'Recalcula el dispositivo dueño y el nombre del responsable guardados en cada número de inventario'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Refrescando números de inventario...')
+        NumeroInventario.refrescar_propietarios()
+        NumeroInventario.refrescar_responsables()
+        SufijoBusqueda.purgar()
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+        self.stdout.write(self.style.SUCCESS(f'✓ Refrescados {NumeroInventario.objects.count()} números de inventario'))
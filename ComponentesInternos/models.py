@@ -1,8 +1,22 @@
+import unicodedata
+import uuid
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.apps import apps
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from .versiones import incrementar_version
 
 # Create your models here.
 
+def normalizar_busqueda(texto):
+    """Minúsculas, sin tildes y con espacios simples, para búsquedas por prefijo indexadas"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
 class NumeroInventario(models.Model):
     TIPOS_DISPOSITIVOS = [
         ('PC', 'PC'),
@@ -14,6 +28,21 @@ class NumeroInventario(models.Model):
         ('UPS', 'UPS'),
     ]
 
+    # Tipo de dispositivo -> (app, modelo) del dispositivo dueño del número
+    MODELOS_POR_TIPO = {
+        'PC': ('EstacionesTrabajo', 'PC'),
+        'Monitor': ('Perifericos', 'Monitor'),
+        'Teclado': ('Perifericos', 'Teclado'),
+        'Mouse': ('Perifericos', 'Mouse'),
+        'Impresora': ('Perifericos', 'Impresora'),
+        'Scanner': ('Perifericos', 'Scaner'),
+        'UPS': ('Perifericos', 'UPS'),
+    }
+    # Sello de versión de los números libres (ver ComponentesInternos.versiones)
+    VERSION_DISPONIBLES = 'numeros_inventario_disponibles'
+    # Nombres por cada UPDATE ... CASE de normalizar_busquedas
+    LOTE_NOMBRES = 500
+
     codigo = models.CharField(max_length=50)
     tipo_dispositivo = models.CharField(
         max_length=50,
@@ -22,40 +51,162 @@ class NumeroInventario(models.Model):
         null=True,
         verbose_name='Tipo de Dispositivo'
     )
+    # Copia del nombre del responsable del dispositivo, mantenida por señales
+    # (EstacionesTrabajo/signals.py) para que __str__ no consulte la base de datos
+    responsable_nombre = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Responsable'
+    )
+    responsable_busqueda = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True
+    )
 
-    def get_dispositivo(self):
-        if not self.tipo_dispositivo:
+    # Dispositivo dueño del número (PC o periférico), mantenido por PC.save y DispositivoBase.save
+    propietario_tipo = models.ForeignKey(
+        ContentType,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    propietario_id = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    propietario = GenericForeignKey('propietario_tipo', 'propietario_id')
+
+    @classmethod
+    def get_modelo_dispositivo(cls, tipo_dispositivo):
+        if tipo_dispositivo not in cls.MODELOS_POR_TIPO:
             return None
-            
-        # Mapeo de tipos de dispositivo a modelos
-        tipo_a_modelo = {
-            'Monitor': 'Monitor',
-            'Teclado': 'Teclado',
-            'Mouse': 'Mouse',
-            'Impresora': 'Impresora',
-            'Scanner': 'Scaner',
-            'UPS': 'UPS',
-            'PC': 'PC'
-        }
-        
-        if self.tipo_dispositivo in tipo_a_modelo:
-            app_label = 'Perifericos' if self.tipo_dispositivo != 'PC' else 'EstacionesTrabajo'
-            modelo = apps.get_model(app_label, tipo_a_modelo[self.tipo_dispositivo])
-            try:
-                return modelo.objects.get(numero_inventario=self)
-            except:
-                return None
-        return None
+        return apps.get_model(*cls.MODELOS_POR_TIPO[tipo_dispositivo])
+
+    def get_dispositivo(self):
+        return self.propietario
+
+    @classmethod
+    def sincronizar_propietario(cls, dispositivo):
+        """Apunta el número de inventario del dispositivo hacia él y libera el que tuviera antes"""
+        tipo = ContentType.objects.get_for_model(dispositivo)
+        numero = dispositivo.numero_inventario
+        # Estado previo al guardado que deja la señal pre_save (EstacionesTrabajo/signals.py):
+        # None si el dispositivo es nuevo. Sin él no se sabe si cambió y se libera igualmente
+        anterior = getattr(dispositivo, '_estado_anterior', False)
+        if anterior is False or (anterior is not None
+                                 and anterior['numero_inventario_id'] != dispositivo.numero_inventario_id):
+            cls.objects.filter(propietario_tipo=tipo, propietario_id=dispositivo.pk).exclude(
+                pk=numero.pk if numero else None
+            ).update(propietario_tipo=None, propietario_id=None)
+        if numero and (numero.propietario_tipo_id != tipo.pk or numero.propietario_id != dispositivo.pk):
+            cls.objects.filter(pk=numero.pk).update(propietario_tipo=tipo, propietario_id=dispositivo.pk)
+            numero.propietario_tipo, numero.propietario_id = tipo, dispositivo.pk
+
+    @classmethod
+    def refrescar_propietarios(cls, queryset=None, tipos=None, compartidos=True):
+        """
+        Recalcula el puntero al dispositivo dueño con un UPDATE por tipo de dispositivo
+        (`tipos`: los que hay en el queryset; por defecto, todos). Con compartidos=False
+        no se incrementa el sello de versión (ver refrescar_responsables)
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        for tipo in tipos or cls.MODELOS_POR_TIPO:
+            modelo = cls.get_modelo_dispositivo(tipo)
+            dispositivo_id = modelo.objects.filter(numero_inventario=OuterRef('pk')).values('pk')[:1]
+            queryset.filter(tipo_dispositivo=tipo).update(
+                propietario_tipo=ContentType.objects.get_for_model(modelo),
+                propietario_id=Subquery(dispositivo_id)
+            )
+        queryset.filter(propietario_id__isnull=True).update(propietario_tipo=None)
+        if compartidos:
+            incrementar_version(cls.VERSION_DISPONIBLES)
+
+    @classmethod
+    def asignar_responsable(cls, queryset, nombre):
+        """Guarda el nombre del responsable (y su forma de búsqueda) en los números indicados"""
+        actualizados = queryset.exclude(responsable_nombre=nombre).update(
+            responsable_nombre=nombre,
+            responsable_busqueda=normalizar_busqueda(nombre)
+        )
+        if actualizados:
+            SufijoBusqueda.registrar([normalizar_busqueda(nombre)])
+
+    @classmethod
+    def buscar(cls, queryset, termino):
+        """
+        Prefijo del código o de alguna palabra del nombre del responsable. Solo
+        comparaciones por prefijo sobre columnas indexadas (ver SufijoBusqueda).
+        """
+        termino = termino.strip()
+        if not termino:
+            return queryset
+        condicion = models.Q(codigo__istartswith=termino)
+        normalizado = normalizar_busqueda(termino)
+        if normalizado:
+            nombres = SufijoBusqueda.objects.filter(sufijo__startswith=normalizado).values('nombre')
+            condicion |= models.Q(responsable_busqueda__in=nombres)
+        return queryset.filter(condicion)
+
+    @classmethod
+    def refrescar_responsables(cls, queryset=None, tipos=None, compartidos=True):
+        """
+        Recalcula responsable_nombre con un UPDATE por tipo de dispositivo (`tipos`:
+        los que hay en el queryset; por defecto, todos) y después responsable_busqueda.
+        Con compartidos=False no se registran los sufijos de búsqueda, una tabla que
+        comparten los importadores en paralelo: quien llama usa SufijoBusqueda.completar()
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        if tipos is None:
+            queryset.filter(tipo_dispositivo__isnull=True).exclude(responsable_nombre='').update(
+                responsable_nombre=''
+            )
+        for tipo in tipos or cls.MODELOS_POR_TIPO:
+            nombre = cls.get_modelo_dispositivo(tipo).objects.filter(
+                numero_inventario=OuterRef('pk')
+            ).values('responsable__nombre')[:1]
+            queryset.filter(tipo_dispositivo=tipo).update(
+                responsable_nombre=Coalesce(Subquery(nombre), Value(''))
+            )
+        cls.normalizar_busquedas(queryset, compartidos)
+
+    @classmethod
+    def normalizar_busquedas(cls, queryset, compartidos=True):
+        """
+        Recalcula responsable_busqueda: la normalización se hace en Python una vez por
+        nombre distinto y se escribe con un UPDATE ... CASE cada LOTE_NOMBRES nombres
+        """
+        nombres = list(queryset.order_by().values_list('responsable_nombre', flat=True).distinct())
+        busquedas = {nombre: normalizar_busqueda(nombre) for nombre in nombres}
+        if compartidos:
+            SufijoBusqueda.registrar(busquedas.values())
+        for inicio in range(0, len(nombres), cls.LOTE_NOMBRES):
+            lote = nombres[inicio:inicio + cls.LOTE_NOMBRES]
+            queryset.filter(responsable_nombre__in=lote).update(responsable_busqueda=Case(
+                *[When(responsable_nombre=nombre, then=Value(busquedas[nombre])) for nombre in lote],
+                default=F('responsable_busqueda'),
+            ))
 
     def __str__(self):
+        return self.describir()
+
+    def describir(self, dispositivo=None):
+        """
+        Texto del número. Si se indica el dispositivo se usa su responsable actual; si no,
+        el nombre guardado en responsable_nombre.
+        """
         partes = [self.codigo]
         if self.tipo_dispositivo:
             partes.append(self.get_tipo_dispositivo_display())  # Usar el método display para mostrar el nombre amigable
-        
-        dispositivo = self.get_dispositivo()
-        if dispositivo and dispositivo.responsable:
-            partes.append(f"({dispositivo.responsable})")
-            
+
+        if dispositivo is not None:
+            if dispositivo.responsable:
+                partes.append(f"({dispositivo.responsable})")
+        elif self.responsable_nombre:
+            partes.append(f"({self.responsable_nombre})")
+
         return " - ".join(partes)
 
     class Meta:
@@ -63,6 +214,60 @@ class NumeroInventario(models.Model):
         verbose_name_plural = 'Números de Inventario'
         ordering = ['codigo']
         unique_together = ['codigo', 'tipo_dispositivo']
+        indexes = [
+            models.Index(fields=['propietario_tipo', 'propietario_id']),
+            # Números libres de un tipo, recorridos en orden de código
+            models.Index(fields=['tipo_dispositivo', 'propietario_id', 'codigo']),
+        ]
+
+class SelloVersion(models.Model):
+    """Última modificación de un conjunto de datos (ver ComponentesInternos/versiones.py)"""
+    nombre = models.CharField(max_length=100, unique=True)
+    version = models.FloatField()
+
+    def __str__(self):
+        return self.nombre
+
+class SufijoBusqueda(models.Model):
+    """
+    Cada nombre de responsable normalizado (NumeroInventario.responsable_busqueda)
+    desde cada una de sus palabras: 'jose perez gomez', 'perez gomez' y 'gomez'.
+    NumeroInventario.buscar compara el término por prefijo con `sufijo`, indexado,
+    en lugar de un LIKE '% término%' que recorre toda la tabla. Hay una fila por
+    nombre distinto, no por número; las de nombres que ya nadie usa no encuentran
+    ningún número y las borra el comando refrescar_numeros_inventario.
+    """
+    sufijo = models.CharField(max_length=100)
+    nombre = models.CharField(max_length=100)
+
+    @classmethod
+    def registrar(cls, nombres):
+        """Crea los sufijos que falten de los nombres ya normalizados"""
+        sufijos = []
+        # En orden: dos transacciones que registran los mismos nombres bloquean las filas en
+        # el mismo orden y no se interbloquean
+        for nombre in sorted(set(nombres)):
+            palabras = nombre.split()
+            sufijos += [cls(sufijo=' '.join(palabras[i:]), nombre=nombre) for i in range(len(palabras))]
+        sufijos.sort(key=lambda s: (s.sufijo, s.nombre))
+        cls.objects.bulk_create(sufijos, batch_size=1000, ignore_conflicts=True)
+
+    @classmethod
+    def completar(cls):
+        """Registra los sufijos de todos los nombres que tienen los números de inventario"""
+        cls.registrar(NumeroInventario.objects.exclude(responsable_busqueda='').order_by()
+                      .values_list('responsable_busqueda', flat=True).distinct())
+
+    @classmethod
+    def purgar(cls):
+        """Borra los sufijos de nombres que ya no tiene ningún número"""
+        return cls.objects.exclude(
+            nombre__in=NumeroInventario.objects.values('responsable_busqueda')
+        ).delete()[0]
+
+    class Meta:
+        # El índice único empieza por sufijo: sirve a la búsqueda por prefijo
+        unique_together = ['sufijo', 'nombre']
 
 class ComponenteBase(models.Model):
     nombre = models.CharField(max_length=100)
@@ -105,3 +310,61 @@ class DiscoDuro(models.Model):
         verbose_name = 'Disco Duro'
         verbose_name_plural = 'Discos Duros'
         ordering = ['capacidad']
+
+def ruta_exportacion(trabajo, nombre):
+    # MEDIA_ROOT es público (Nginx sirve /media/): un nombre imposible de adivinar
+    return f'exportaciones/{uuid.uuid4().hex}/{nombre}'
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación XLSX encargada desde el admin y generada en segundo plano por el
+    comando procesar_exportaciones (ver ComponentesInternos/exportacion.py).
+    """
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    TERMINADO = 'terminado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (TERMINADO, 'Terminado'),
+        (ERROR, 'Error'),
+    ]
+    # Sello de versión de todos los datos exportables: cambia con cualquier escritura
+    # (señales en EstacionesTrabajo/signals.py y las operaciones en bloque)
+    VERSION_DATOS = 'datos_inventario'
+
+    # 'app_label.Modelo' y ruta de la clase del recurso de import_export
+    modelo = models.CharField(max_length=100)
+    recurso = models.CharField(max_length=255)
+    # Parámetros del changelist (filtros, búsqueda, orden), columnas e ids elegidos
+    filtros = models.TextField(blank=True, default='')
+    campos = models.JSONField(null=True, blank=True)
+    ids = models.JSONField(null=True, blank=True)
+    # Misma clave y mismo sello de datos: el mismo archivo
+    clave = models.CharField(max_length=32, db_index=True, editable=False)
+    version_datos = models.FloatField(null=True, blank=True, editable=False)
+
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    archivo = models.FileField(upload_to=ruta_exportacion, blank=True)
+    filas = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        modelo = apps.get_model(self.modelo)
+        return f"{modelo._meta.verbose_name_plural.capitalize()} ({self.creado:%Y-%m-%d %H:%M})"
+
+    class Meta:
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+        ordering = ['-creado']
+        indexes = [
+            # La cola: pendientes por orden de llegada
+            models.Index(fields=['estado', 'creado']),
+        ]
@@ -1,32 +1,189 @@
+from django.core.exceptions import ObjectDoesNotExist
 from import_export import resources, fields
+from import_export.instance_loaders import CachedInstanceLoader, ModelInstanceLoader
 from import_export.widgets import ForeignKeyWidget
 from .models import NumeroInventario, SistemaOperativo, Procesador, RAM, DiscoDuro
 
-class NumeroInventarioResource(resources.ModelResource):
+# Filas que se escriben por bulk_create/bulk_update y valores por consulta IN
+TAMANO_LOTE_IMPORTACION = 1000
+
+
+def clave_importacion(valor):
+    """Texto con el que se compara una celda con los valores de la base de datos"""
+    if isinstance(valor, float) and valor.is_integer():
+        # Excel guarda los códigos numéricos como 1234.0
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def en_lotes(valores, tamano=TAMANO_LOTE_IMPORTACION):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+class ForeignKeyPrecargadoWidget(ForeignKeyWidget):
+    """
+    ForeignKeyWidget que, una vez llamado precargar() con los valores de la
+    columna, resuelve cada celda en un diccionario {valor: objeto} en lugar de
+    hacer un .get() por celda. Sin precargar se comporta como ForeignKeyWidget.
+    Un valor que coincide con varios objetos es un error de la fila, como el
+    MultipleObjectsReturned del .get().
+    """
+    objetos = None
+    ambiguos = frozenset()
+
+    def valor_de(self, obj):
+        # `field` puede cruzar relaciones: 'numero_inventario__codigo'
+        for atributo in self.field.split('__'):
+            obj = getattr(obj, atributo, None)
+        return obj
+
+    def precargar(self, valores, queryset=None):
+        """Carga los objetos de `valores` con una consulta por cada TAMANO_LOTE_IMPORTACION valores"""
+        if queryset is None:
+            queryset = self.get_queryset(None, None)
+        relacion = self.field.rpartition('__')[0]
+        if relacion:
+            queryset = queryset.select_related(relacion)
+        claves = sorted({clave_importacion(valor) for valor in valores if valor not in (None, '')})
+        self.objetos = {}
+        ambiguos = set()
+        for lote in en_lotes(claves):
+            for obj in queryset.filter(**{f'{self.field}__in': lote}).order_by('pk'):
+                clave = clave_importacion(self.valor_de(obj))
+                if clave in self.objetos:
+                    ambiguos.add(clave)
+                else:
+                    self.objetos[clave] = obj
+        self.ambiguos = frozenset(ambiguos)
+        return self.objetos
+
+    def clean(self, value, row=None, **kwargs):
+        if self.objetos is None:
+            return super().clean(value, row, **kwargs)
+        if value in (None, ''):
+            return None
+        clave = clave_importacion(value)
+        if clave in self.ambiguos:
+            raise ValueError(f'Hay varios {self.model._meta.verbose_name_plural} "{value}"')
+        try:
+            return self.objetos[clave]
+        except KeyError:
+            raise ValueError(f'No existe {self.model._meta.verbose_name} "{value}"')
+
+
+class CargadorPorLotes(CachedInstanceLoader):
+    """
+    CachedInstanceLoader que busca las instancias existentes por lotes, sin un IN
+    con todas las filas del archivo, y con las relaciones_exportacion del recurso
+    ya unidas: la vista previa las muestra sin consultas por fila.
+    """
+    def __init__(self, resource, dataset=None):
+        ModelInstanceLoader.__init__(self, resource, dataset)
+        self.pk_field = resource.fields[resource.get_import_id_fields()[0]]
+        self.all_instances = {}
+        if dataset is None or self.pk_field.column_name not in dataset.headers:
+            return
+
+        ids = set()
+        for fila in dataset.dict:
+            try:
+                ids.add(self.pk_field.clean(fila))
+            except (ValueError, ObjectDoesNotExist):
+                # El error se mostrará en la fila al importarla
+                pass
+        ids.discard(None)
+        queryset = self.get_queryset().select_related(*getattr(resource, 'relaciones_exportacion', ()))
+        for lote in en_lotes(ids):
+            for instancia in queryset.filter(**{f'{self.pk_field.attribute}__in': lote}):
+                self.all_instances[self.pk_field.get_value(instancia)] = instancia
+
+class RecursoExportacion(resources.ModelResource):
+    """
+    ModelResource que declara las columnas que lee al exportar:
+    `relaciones_exportacion` (select_related) y `campos_exportacion` (only()).
+    filter_export las aplica al queryset del changelist, sin sus prefetch_related
+    ni select_related, para que cada fila salga de una sola consulta.
+    """
+    relaciones_exportacion = ()
+    campos_exportacion = ()
+
+    def filter_export(self, queryset, **kwargs):
+        queryset = super().filter_export(queryset, **kwargs)
+        queryset = queryset.prefetch_related(None).select_related(None)
+        if self.relaciones_exportacion:
+            queryset = queryset.select_related(*self.relaciones_exportacion)
+        if self.campos_exportacion:
+            queryset = queryset.only(*self.campos_exportacion)
+        return queryset
+
+class RecursoImportacionEnBloque(RecursoExportacion):
+    """
+    RecursoExportacion que también importa, en bloque: las filas se escriben con
+    bulk_create/bulk_update cada TAMANO_LOTE_IMPORTACION (Meta.use_bulk), las
+    columnas ForeignKeyPrecargadoWidget se resuelven con un diccionario por modelo
+    relacionado cargado en before_import y las instancias existentes se buscan
+    con CargadorPorLotes. Como bulk_create y bulk_update no llaman a save() ni
+    emiten señales, las subclases completan en after_import lo que estos
+    mantendrían. La vista previa hace lo mismo dentro de una transacción que se
+    deshace.
+    """
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        self.precargar_relaciones(dataset)
+
+    def queryset_relacion(self, campo):
+        """Objetos entre los que se buscan los valores de la columna de `campo`"""
+        return campo.widget.get_queryset(None, None)
+
+    def precargar_relaciones(self, dataset):
+        for campo in self.get_import_fields():
+            if isinstance(campo.widget, ForeignKeyPrecargadoWidget) and campo.column_name in dataset.headers:
+                campo.widget.precargar(dataset[campo.column_name], self.queryset_relacion(campo))
+
+    class Meta:
+        use_bulk = True
+        batch_size = TAMANO_LOTE_IMPORTACION
+        instance_loader_class = CargadorPorLotes
+        # Lo que se crea en before_import debe deshacerse con la vista previa
+        use_transactions = True
+
+class NumeroInventarioResource(RecursoExportacion):
+    campos_exportacion = ('codigo',)
+
     class Meta:
         model = NumeroInventario
         fields = ('codigo',)
         export_order = fields
 
-class SistemaOperativoResource(resources.ModelResource):
+class SistemaOperativoResource(RecursoExportacion):
+    campos_exportacion = ('nombre',)
+
     class Meta:
         model = SistemaOperativo
         fields = ('nombre',)
         export_order = fields
 
-class ProcesadorResource(resources.ModelResource):
+class ProcesadorResource(RecursoExportacion):
+    campos_exportacion = ('nombre',)
+
     class Meta:
         model = Procesador
         fields = ('nombre',)
         export_order = fields
 
-class RAMResource(resources.ModelResource):
+class RAMResource(RecursoExportacion):
+    campos_exportacion = ('capacidad',)
+
     class Meta:
         model = RAM
         fields = ('capacidad',)
         export_order = fields
 
-class DiscoDuroResource(resources.ModelResource):
+class DiscoDuroResource(RecursoExportacion):
+    campos_exportacion = ('capacidad',)
+
     class Meta:
         model = DiscoDuro
         fields = ('capacidad',)
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from . import exportacion
+from .exportacion import DURACION_MAXIMA_EXPORTACION, ejecutar_trabajo, marcar_abandonados, reclamar_siguiente
+from .models import NumeroInventario, TrabajoExportacion
+from .versiones import obtener_version
+from EstacionesTrabajo.models import PC, Responsable, AreaOrganizativa
 
-# Create your tests here.
+
+class NumeroInventarioAutocompleteTests(TestCase):
+    # Sesión y usuario (2) y la página de resultados (1); nunca un COUNT
+    CONSULTAS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        responsable = Responsable.objects.create(nombre='José Pérez', area=area)
+        NumeroInventario.objects.bulk_create([
+            NumeroInventario(codigo=f'1{i:03d}', tipo_dispositivo='PC') for i in range(30)
+        ])
+        NumeroInventario.objects.create(codigo='1999', tipo_dispositivo='Monitor')
+        PC.objects.create(
+            numero_inventario=NumeroInventario.objects.create(codigo='2000', tipo_dispositivo='PC'),
+            responsable=responsable,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def autocompletar(self, termino, pagina=1):
+        with self.assertNumQueries(self.CONSULTAS):
+            response = self.client.get(reverse('admin:ComponentesInternos_numeroinventario_autocompletar'), {
+                'term': termino, 'page': pagina, 'app_label': 'EstacionesTrabajo',
+                'model_name': 'pc', 'field_name': 'numero_inventario',
+            })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefijo_de_codigo_paginado_y_ordenado(self):
+        datos = self.autocompletar('1')
+        self.assertEqual([r['text'] for r in datos['results']], [f'1{i:03d} - PC' for i in range(20)])
+        self.assertTrue(datos['pagination']['more'])
+
+        datos = self.autocompletar('1', pagina=2)
+        # El número de tipo Monitor queda fuera por limit_choices_to
+        self.assertEqual(len(datos['results']), 10)
+        self.assertFalse(datos['pagination']['more'])
+
+    def test_busqueda_por_responsable_sin_tildes(self):
+        datos = self.autocompletar('perez')
+        self.assertEqual([r['text'] for r in datos['results']], ['2000 - PC - (José Pérez)'])
+        for termino in ('jose', 'JOSÉ PÉ', 'pérez'):
+            datos = self.autocompletar(termino)
+            self.assertEqual([r['text'] for r in datos['results']], ['2000 - PC - (José Pérez)'])
+        self.assertEqual(self.autocompletar('erez')['results'], [])
+
+    def test_solo_busquedas_por_prefijo(self):
+        # Un LIKE '%...' no puede usar el índice y recorrería toda la tabla
+        consulta = str(NumeroInventario.buscar(NumeroInventario.objects.all(), 'perez').query)
+        self.assertIn('perez%', consulta)
+        self.assertNotIn('%perez', consulta)
+        self.assertNotIn('% perez', consulta)
+
+
+class PropietarioNumeroTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.n1 = NumeroInventario.objects.create(codigo='N1')
+        cls.n2 = NumeroInventario.objects.create(codigo='N2')
+        cls.pc1 = PC.objects.create(numero_inventario=cls.n1, area=area)
+        cls.pc2 = PC.objects.create(numero_inventario=cls.n2, area=area)
+
+    def propietarios(self):
+        return dict(NumeroInventario.objects.values_list('codigo', 'propietario_id'))
+
+    def test_reasignar_numero_entre_dispositivos(self):
+        self.assertEqual(self.propietarios(), {'N1': self.pc1.pk, 'N2': self.pc2.pk})
+
+        # N1 pasa de la PC 1 a la PC 2, que deja libre N2
+        self.pc1.numero_inventario = None
+        self.pc1.save()
+        self.pc2.numero_inventario = NumeroInventario.objects.get(pk=self.n1.pk)
+        self.pc2.save()
+        self.assertEqual(self.propietarios(), {'N1': self.pc2.pk, 'N2': None})
+
+        self.pc1.numero_inventario = NumeroInventario.objects.get(pk=self.n2.pk)
+        self.pc1.save()
+        self.assertEqual(self.propietarios(), {'N1': self.pc2.pk, 'N2': self.pc1.pk})
+
+    def test_sin_cambio_de_numero_no_se_libera_nada(self):
+        pc = PC.objects.select_related('numero_inventario').get(pk=self.pc1.pk)
+        pc.funciona = not pc.funciona
+        with CaptureQueriesContext(connection) as consultas:
+            pc.save()
+        self.assertFalse([c['sql'] for c in consultas if 'propietario_id" = NULL' in c['sql']])
+        self.assertEqual(self.propietarios(), {'N1': self.pc1.pk, 'N2': self.pc2.pk})
+
+
+class ResponsableNumeroTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.ana = Responsable.objects.create(nombre='Ana Gómez', area=area)
+        cls.luis = Responsable.objects.create(nombre='Luis Pérez', area=area)
+        cls.pc = PC.objects.create(numero_inventario=NumeroInventario.objects.create(codigo='N1'),
+                                   responsable=cls.ana)
+
+    def nombre_guardado(self, codigo='N1'):
+        return NumeroInventario.objects.values_list('responsable_nombre', 'responsable_busqueda').get(codigo=codigo)
+
+    def buscar(self, termino):
+        return list(NumeroInventario.buscar(NumeroInventario.objects.all(), termino).values_list('codigo', flat=True))
+
+    def test_renombrar_y_reasignar_actualizan_el_nombre_guardado(self):
+        self.assertEqual(self.nombre_guardado(), ('Ana Gómez', 'ana gomez'))
+
+        self.ana.nombre = 'Ana María Gómez'
+        self.ana.save()
+        self.assertEqual(self.nombre_guardado(), ('Ana María Gómez', 'ana maria gomez'))
+        self.assertEqual(self.buscar('mar'), ['N1'])
+
+        self.pc.responsable = self.luis
+        self.pc.save()
+        self.assertEqual(self.nombre_guardado(), ('Luis Pérez', 'luis perez'))
+        self.assertEqual(self.buscar('perez'), ['N1'])
+        self.assertEqual(self.buscar('ana'), [])
+
+        # El número que deja el dispositivo ya no lleva su responsable
+        self.pc.numero_inventario = NumeroInventario.objects.create(codigo='N2')
+        self.pc.save()
+        self.assertEqual(self.nombre_guardado('N1'), ('', ''))
+        self.assertEqual(self.nombre_guardado('N2'), ('Luis Pérez', 'luis perez'))
+
+
+class ExportacionSegundoPlanoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        for i in range(5):
+            PC.objects.create(numero_inventario=NumeroInventario.objects.create(codigo=f'PC-{i}'),
+                              area=cls.area)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        # Cualquier exportación de PCs con más de 2 filas va a segundo plano
+        pc_admin = admin.site._registry[PC]
+        anterior = pc_admin.filas_exportacion_directa
+        pc_admin.filas_exportacion_directa = 2
+        self.addCleanup(setattr, pc_admin, 'filas_exportacion_directa', anterior)
+
+    def exportar(self, **filtros):
+        url = reverse('admin:EstacionesTrabajo_pc_export')
+        if filtros:
+            url += '?' + '&'.join(f'{nombre}={valor}' for nombre, valor in filtros.items())
+        return self.client.post(url, {'format': '0', 'resource': '0', 'pcresource_numero_inventario': 'on'})
+
+    def test_encargar_generar_y_reutilizar(self):
+        respuesta = self.exportar()
+        trabajo = TrabajoExportacion.objects.get()
+        self.assertRedirects(respuesta, reverse('admin:ComponentesInternos_trabajoexportacion_change',
+                                                args=[trabajo.pk]))
+        self.assertEqual(trabajo.estado, TrabajoExportacion.PENDIENTE)
+
+        # Mientras está pendiente, la misma exportación no se encarga dos veces
+        self.exportar()
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+        call_command('procesar_exportaciones', una_vez=True, stdout=io.StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.filas), (TrabajoExportacion.TERMINADO, 5))
+        self.assertTrue(trabajo.archivo.name.startswith('exportaciones/'))
+
+        descarga = self.client.get(reverse('admin:ComponentesInternos_trabajoexportacion_descargar',
+                                           args=[trabajo.pk]))
+        libro = load_workbook(io.BytesIO(b''.join(descarga.streaming_content)), read_only=True)
+        self.assertEqual(sorted(fila[0] for fila in list(libro.active.values)[1:]),
+                         [f'PC-{i}' for i in range(5)])
+
+        # Sin cambios en los datos se reutiliza el archivo
+        self.exportar()
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+        # Otros filtros son otra exportación
+        self.exportar(q='PC')
+        self.assertEqual(TrabajoExportacion.objects.count(), 2)
+
+        # Un cambio en los datos obliga a generar otro archivo, que reemplaza al anterior
+        PC.objects.create(area=self.area)
+        self.exportar()
+        self.assertEqual(TrabajoExportacion.objects.count(), 3)
+        call_command('procesar_exportaciones', una_vez=True, stdout=io.StringIO())
+        trabajo.refresh_from_db()
+        self.assertFalse(trabajo.archivo)
+        self.assertEqual(
+            TrabajoExportacion.objects.filter(estado=TrabajoExportacion.TERMINADO).exclude(archivo='').count(), 2
+        )
+
+    def test_trabajo_abandonado_no_se_reutiliza_y_pasa_a_error(self):
+        self.exportar()
+        trabajo = TrabajoExportacion.objects.get()
+        en_proceso = TrabajoExportacion.objects.filter(pk=trabajo.pk)
+        en_proceso.update(estado=TrabajoExportacion.EN_PROCESO,
+                          version_datos=obtener_version(TrabajoExportacion.VERSION_DATOS),
+                          iniciado=timezone.now())
+        # En proceso con los datos actuales: se reutiliza
+        self.exportar()
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+        # El proceso que lo generaba murió hace tiempo
+        en_proceso.update(iniciado=timezone.now() - DURACION_MAXIMA_EXPORTACION)
+        self.exportar()
+        self.assertEqual(TrabajoExportacion.objects.count(), 2)
+        call_command('procesar_exportaciones', una_vez=True, stdout=io.StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+        self.assertIn('Abandonado', trabajo.error)
+        self.assertTrue(TrabajoExportacion.objects.filter(estado=TrabajoExportacion.TERMINADO).exists())
+
+    def test_abandonado_mientras_se_genera_sigue_en_error(self):
+        self.exportar()
+        trabajo = reclamar_siguiente()
+        escribir_xlsx = exportacion.escribir_xlsx
+
+        def escribir_y_abandonar(*args, **kwargs):
+            filas = escribir_xlsx(*args, **kwargs)
+            # Tarda más de la cuenta y otro proceso lo da por abandonado
+            TrabajoExportacion.objects.filter(pk=trabajo.pk).update(
+                iniciado=timezone.now() - DURACION_MAXIMA_EXPORTACION
+            )
+            marcar_abandonados()
+            return filas
+
+        with mock.patch.object(exportacion, 'escribir_xlsx', escribir_y_abandonar):
+            trabajo = ejecutar_trabajo(trabajo)
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+        self.assertIn('Abandonado', trabajo.error)
+        self.assertFalse(trabajo.archivo)
+        self.assertEqual([archivo for _, _, archivos in os.walk(settings.MEDIA_ROOT) for archivo in archivos], [])
+
+    def test_error_queda_registrado(self):
+        trabajo = TrabajoExportacion.objects.create(modelo='EstacionesTrabajo.PC', recurso='no.existe.Recurso',
+                                                    clave='x')
+        call_command('procesar_exportaciones', una_vez=True, stdout=io.StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+        self.assertIn('ModuleNotFoundError', trabajo.error)
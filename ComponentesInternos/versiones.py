@@ -0,0 +1,36 @@
+"""
+Sellos de versión guardados en la base de datos (SelloVersion).
+
+Permiten saber si un conjunto de datos cambió con una sola consulta por clave
+primaria, sin recalcularlo: cada escritura relevante llama a
+incrementar_version() y los lectores comparan el sello que obtuvieron antes con
+obtener_version(). Al estar en la base de datos los comparten todos los procesos
+(los workers de Gunicorn y los comandos), y el sello nuevo solo es visible para
+los demás cuando se confirma la transacción que modificó los datos.
+"""
+import time
+from django.db import connection
+
+
+def incrementar_version(nombre):
+    """Marca el conjunto `nombre` como modificado ahora; devuelve el nuevo sello"""
+    from .models import SelloVersion
+
+    version = time.time()
+    # Un solo INSERT ... ON DUPLICATE KEY UPDATE (MariaDB no admite indicar el campo único)
+    unicos = ['nombre'] if connection.features.supports_update_conflicts_with_target else None
+    SelloVersion.objects.bulk_create([SelloVersion(nombre=nombre, version=version)], update_conflicts=True,
+                                     update_fields=['version'], unique_fields=unicos)
+    return version
+
+
+def obtener_version(nombre):
+    """Sello actual (timestamp de la última modificación) del conjunto `nombre`"""
+    from .models import SelloVersion
+
+    version = SelloVersion.objects.filter(nombre=nombre).values_list('version', flat=True).first()
+    if version is None:
+        # Sin sello previo: se asume modificado ahora
+        SelloVersion.objects.bulk_create([SelloVersion(nombre=nombre, version=time.time())], ignore_conflicts=True)
+        version = SelloVersion.objects.filter(nombre=nombre).values_list('version', flat=True).first()
+    return version
@@ -1,3 +1,40 @@
-from django.shortcuts import render
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from .models import NumeroInventario
 
-# Create your views here.
+
+class NumeroInventarioAutocompleteView(AutocompleteJsonView):
+    """
+    Autocompletado de números de inventario para los formularios del admin.
+    Busca por prefijo del código o del nombre del responsable, devuelve una página
+    acotada y ordenada, y detecta si hay más resultados sin hacer COUNT.
+    """
+    paginate_by = 20
+
+    def get(self, request, *args, **kwargs):
+        self.term, self.model_admin, self.source_field, to_field_name = self.process_request(request)
+
+        if not self.has_perm(request):
+            raise PermissionDenied
+
+        try:
+            pagina = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            pagina = 1
+        inicio = (pagina - 1) * self.paginate_by
+        # Se pide un resultado de más solo para saber si existe otra página
+        numeros = list(self.get_queryset()[inicio:inicio + self.paginate_by + 1])
+
+        return JsonResponse({
+            'results': [
+                self.serialize_result(numero, to_field_name)
+                for numero in numeros[:self.paginate_by]
+            ],
+            'pagination': {'more': len(numeros) > self.paginate_by},
+        })
+
+    def get_queryset(self):
+        # limit_choices_to del campo origen ya restringe al tipo de dispositivo
+        queryset = NumeroInventario.objects.complex_filter(self.source_field.get_limit_choices_to())
+        return NumeroInventario.buscar(queryset, self.term).order_by('codigo', 'id')
@@ -15,7 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
@@ -26,6 +26,7 @@ if settings.DEBUG:
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('estaciones/', include('EstacionesTrabajo.urls')),
      path('', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
               ]
 
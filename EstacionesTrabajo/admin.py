@@ -5,18 +5,101 @@ from django.http import HttpResponseRedirect
 from django.contrib import messages
 from django.urls import path
 from django.shortcuts import render
+from django import forms
 from django.db import models
+from django.db.models import Prefetch
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
-from import_export.admin import ExportMixin
+from django.core.exceptions import PermissionDenied
+from ComponentesInternos.exportacion import ExportacionXLSXMixin, ImportacionExportacionXLSXMixin
 from import_export.formats import base_formats
 from .models import PC, Responsable, AreaOrganizativa
 from Perifericos.models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
 from ComponentesInternos.models import (SistemaOperativo, Procesador, RAM, DiscoDuro,
                                       NumeroInventario)
+from ComponentesInternos.admin import NumeroInventarioAutocompleteMixin
 from .resources import PCResource, AreaOrganizativaResource, ResponsableResource
+from .sincronizacion import modelos_perifericos, mover_dispositivos
+
+class MoverDispositivosForm(forms.Form):
+    area = forms.ModelChoiceField(
+        queryset=AreaOrganizativa.objects.order_by('nombre'), required=False, label='Área'
+    )
+    responsable = forms.ModelChoiceField(
+        queryset=Responsable.objects.all(), required=False, label='Responsable',
+        help_text='Si el responsable tiene área, los dispositivos pasan a su área.'
+    )
+
+    def clean(self):
+        datos = super().clean()
+        area, responsable = datos.get('area'), datos.get('responsable')
+        if not area and not responsable:
+            raise forms.ValidationError('Indique un área, un responsable o ambos.')
+        # mover_dispositivos da a los dispositivos el área del responsable, si tiene
+        if area and responsable and responsable.area_id and responsable.area_id != area.pk:
+            raise forms.ValidationError(
+                f'{responsable} pertenece al área {responsable.area}: deje el área en blanco '
+                f'o elija un responsable de {area}.'
+            )
+        return datos
+
+
+@admin.action(description='Mover seleccionados a otra área/responsable', permissions=['change'])
+def mover_a_area_o_responsable(modeladmin, request, queryset):
+    """
+    Acción con página de confirmación: reasigna todos los dispositivos
+    seleccionados con unos pocos UPDATEs (ver mover_dispositivos). Al mover PCs
+    se mueven también sus periféricos.
+    """
+    # permissions=['change'] la oculta; esto cubre un POST directo con la acción
+    if not modeladmin.has_change_permission(request):
+        raise PermissionDenied
+    modelo = queryset.model
+    es_pc = modelo.TIPO_DISPOSITIVO == 'PC'
+    if 'aplicar' in request.POST:
+        form = MoverDispositivosForm(request.POST)
+        if form.is_valid():
+            movidos, omitidos = mover_dispositivos(
+                queryset, form.cleaned_data['responsable'], form.cleaned_data['area']
+            )
+            modeladmin.message_user(
+                request, f'{movidos} {modelo._meta.verbose_name_plural} movidos.', messages.SUCCESS
+            )
+            if omitidos:
+                modeladmin.message_user(
+                    request,
+                    f'{omitidos} conectados a una PC no se movieron: se mueven al mover su PC.',
+                    messages.WARNING
+                )
+            return None
+    else:
+        form = MoverDispositivosForm()
+
+    perifericos = 0
+    conectados = 0
+    if es_pc:
+        pc_ids = queryset.order_by().values('pk')
+        perifericos = sum(m.objects.filter(pc_asociada__in=pc_ids).count() for m in modelos_perifericos())
+    else:
+        conectados = queryset.filter(pc_asociada__isnull=False).count()
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': f'Mover {modelo._meta.verbose_name_plural}',
+        'form': form,
+        'seleccionados': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across') == '1',
+        'total': queryset.count(),
+        'perifericos': perifericos,
+        'conectados': conectados,
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        'opts': modelo._meta,
+        'app_label': modelo._meta.app_label,
+    }
+    return render(request, 'admin/EstacionesTrabajo/mover_dispositivos.html', context)
+
 
 # Inlines para PC
-class DispositivoBaseInline(admin.TabularInline):
+class DispositivoBaseInline(NumeroInventarioAutocompleteMixin, admin.TabularInline):
     extra = 1
     can_delete = True
     show_change_link = True
@@ -93,13 +176,8 @@ class PCAreaSelectFilter(SimpleListFilter):
         if value:
             try:
                 area_id = int(value)
-                area_ids = [area_id]
-                subareas = AreaOrganizativa.objects.filter(area_padre_id=area_id)
-                area_ids.extend(subareas.values_list('id', flat=True))
-                for subarea in subareas:
-                    sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea.id)
-                    area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(area__id__in=area_ids)
+                # Incluir el área seleccionada y todo su subárbol
+                return queryset.filter(area__jerarquia_ancestros__ancestro_id=area_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -121,10 +199,7 @@ class PCSubareaSelectFilter(SimpleListFilter):
         if value:
             try:
                 subarea_id = int(value)
-                area_ids = [subarea_id]
-                sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea_id)
-                area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(area__id__in=area_ids)
+                return queryset.filter(area__jerarquia_ancestros__ancestro_id=subarea_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -164,13 +239,7 @@ class AreaOrganizativaAreaSelectFilter(SimpleListFilter):
         if value:
             try:
                 area_id = int(value)
-                area_ids = [area_id]
-                subareas = AreaOrganizativa.objects.filter(area_padre_id=area_id)
-                area_ids.extend(subareas.values_list('id', flat=True))
-                for subarea in subareas:
-                    sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea.id)
-                    area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(id__in=area_ids)
+                return queryset.filter(jerarquia_ancestros__ancestro_id=area_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -192,10 +261,7 @@ class AreaOrganizativaSubareaSelectFilter(SimpleListFilter):
         if value:
             try:
                 subarea_id = int(value)
-                area_ids = [subarea_id]
-                sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea_id)
-                area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(id__in=area_ids)
+                return queryset.filter(jerarquia_ancestros__ancestro_id=subarea_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -298,7 +364,7 @@ class DiscoDuroSelectFilter(SimpleListFilter):
         return queryset
 
 @admin.register(AreaOrganizativa)
-class AreaOrganizativaAdmin(ExportMixin, admin.ModelAdmin):
+class AreaOrganizativaAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = AreaOrganizativaResource
     formats = [base_formats.XLSX]
     list_display = ['get_nombre_completo', 'area_padre', 'get_responsables_info', 'get_pcs_info', 
@@ -318,89 +384,53 @@ class AreaOrganizativaAdmin(ExportMixin, admin.ModelAdmin):
     get_nombre_completo.short_description = 'Nombre'
     get_nombre_completo.admin_order_field = 'nombre'
 
-    def get_areas_descendientes(self, obj):
-        """Obtiene todas las áreas descendientes (hijas y nietas)"""
-        areas = [obj.id]
-        # Obtener áreas hijas
-        hijas = AreaOrganizativa.objects.filter(area_padre=obj)
-        for hija in hijas:
-            areas.append(hija.id)
-            # Obtener áreas nietas
-            nietas = AreaOrganizativa.objects.filter(area_padre=hija)
-            areas.extend(nietas.values_list('id', flat=True))
-        return areas
+    def get_queryset(self, request):
+        # Los contadores se leen de las estadísticas acumuladas del área
+        return super().get_queryset(request).select_related('area_padre', 'estadisticas')
+
+    def formatear_conteo(self, obj, prefijo):
+        estadisticas = getattr(obj, 'estadisticas', None)
+        if estadisticas is None:
+            return "-"
+        return estadisticas.formatear(prefijo)
 
     def get_responsables_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        count = Responsable.objects.filter(area__id__in=areas).count()
-        return count if count > 0 else "-"
+        estadisticas = getattr(obj, 'estadisticas', None)
+        if estadisticas is None or estadisticas.responsables_total == 0:
+            return "-"
+        return estadisticas.responsables_total
     get_responsables_info.short_description = 'Responsables'
 
     def get_pcs_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = PC.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = PC.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'pcs')
     get_pcs_info.short_description = 'PCs (OK/Total)'
 
     def get_monitores_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Monitor.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Monitor.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'monitores')
     get_monitores_info.short_description = 'Monitores (OK/Total)'
 
     def get_teclados_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Teclado.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Teclado.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'teclados')
     get_teclados_info.short_description = 'Teclados (OK/Total)'
 
     def get_mouses_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Mouse.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Mouse.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'mouses')
     get_mouses_info.short_description = 'Mouse (OK/Total)'
 
     def get_impresoras_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Impresora.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Impresora.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'impresoras')
     get_impresoras_info.short_description = 'Impresoras (OK/Total)'
 
     def get_scaners_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Scaner.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Scaner.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'scaners')
     get_scaners_info.short_description = 'Escáneres (OK/Total)'
 
     def get_ups_info(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = UPS.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = UPS.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'ups')
     get_ups_info.short_description = 'UPS (OK/Total)'
 
 @admin.register(Responsable)
-class ResponsableAdmin(ExportMixin, admin.ModelAdmin):
+class ResponsableAdmin(ExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = ResponsableResource
     formats = [base_formats.XLSX]
     list_display = ['nombre', 'area', 'get_pcs_info', 'get_monitores_info', 'get_teclados_info', 
@@ -445,7 +475,7 @@ class ResponsableAdmin(ExportMixin, admin.ModelAdmin):
     get_ups_info.short_description = 'UPS'
 
 @admin.register(PC)
-class PCAdmin(ExportMixin, admin.ModelAdmin):
+class PCAdmin(NumeroInventarioAutocompleteMixin, ImportacionExportacionXLSXMixin, admin.ModelAdmin):
     resource_class = PCResource
     formats = [base_formats.XLSX]
     list_display = ['responsable', 'get_numero_inventario', 'get_area_display', 
@@ -469,6 +499,7 @@ class PCAdmin(ExportMixin, admin.ModelAdmin):
     autocomplete_fields = ['numero_inventario', 'responsable', 'area',
                           'sistema_operativo', 'procesador', 'ram', 'disco_duro']
     list_per_page = 20
+    actions = [mover_a_area_o_responsable]
 
     inlines = [
         MonitorInline,
@@ -491,6 +522,20 @@ class PCAdmin(ExportMixin, admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related(
+            'numero_inventario', 'responsable', 'area__area_padre__area_padre',
+            'sistema_operativo', 'procesador', 'ram', 'disco_duro'
+        )
+        # Una consulta por tipo de periférico para toda la página, con su número de inventario
+        return queryset.prefetch_related(*[
+            Prefetch(
+                f'{modelo._meta.model_name}_set',
+                queryset=modelo.objects.select_related('numero_inventario').order_by('pk')
+            )
+            for modelo in (Monitor, Teclado, Mouse, Impresora, Scaner, UPS)
+        ])
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
@@ -585,58 +630,37 @@ class PCAdmin(ExportMixin, admin.ModelAdmin):
         return "SI" if obj.es_proyecto_internacional else "NO"
     get_proyecto_internacional.short_description = 'Proyecto'
 
-    def get_monitor(self, obj):
-        monitor = obj.monitor_set.first()
-        if monitor:
-            if monitor.numero_inventario:
-                return monitor.numero_inventario.codigo
-            return f"Marca: {monitor.marca}"
+    def formatear_periferico(self, dispositivos):
+        # Se recorre el caché de prefetch_related; .first() haría una consulta por fila
+        dispositivo = next(iter(dispositivos), None)
+        if dispositivo:
+            if dispositivo.numero_inventario:
+                return dispositivo.numero_inventario.codigo
+            return f"Marca: {dispositivo.marca}"
         return "-"
+
+    def get_monitor(self, obj):
+        return self.formatear_periferico(obj.monitor_set.all())
     get_monitor.short_description = 'Monitor'
 
     def get_teclado(self, obj):
-        teclado = obj.teclado_set.first()
-        if teclado:
-            if teclado.numero_inventario:
-                return teclado.numero_inventario.codigo
-            return f"Marca: {teclado.marca}"
-        return "-"
+        return self.formatear_periferico(obj.teclado_set.all())
     get_teclado.short_description = 'Teclado'
 
     def get_mouse(self, obj):
-        mouse = obj.mouse_set.first()
-        if mouse:
-            if mouse.numero_inventario:
-                return mouse.numero_inventario.codigo
-            return f"Marca: {mouse.marca}"
-        return "-"
+        return self.formatear_periferico(obj.mouse_set.all())
     get_mouse.short_description = 'Mouse'
 
     def get_impresora(self, obj):
-        impresora = obj.impresora_set.first()
-        if impresora:
-            if impresora.numero_inventario:
-                return impresora.numero_inventario.codigo
-            return f"Marca: {impresora.marca}"
-        return "-"
+        return self.formatear_periferico(obj.impresora_set.all())
     get_impresora.short_description = 'Impresora'
 
     def get_scaner(self, obj):
-        scaner = obj.scaner_set.first()
-        if scaner:
-            if scaner.numero_inventario:
-                return scaner.numero_inventario.codigo
-            return f"Marca: {scaner.marca}"
-        return "-"
+        return self.formatear_periferico(obj.scaner_set.all())
     get_scaner.short_description = 'Escáner'
 
     def get_ups(self, obj):
-        ups = obj.ups_set.first()
-        if ups:
-            if ups.numero_inventario:
-                return ups.numero_inventario.codigo
-            return f"Marca: {ups.marca}"
-        return "-"
+        return self.formatear_periferico(obj.ups_set.all())
     get_ups.short_description = 'UPS'
 
     def get_area_display(self, obj):
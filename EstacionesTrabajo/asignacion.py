@@ -0,0 +1,152 @@
+"""
+Base de los comandos asignar_* que marcan un componente en las PCs a partir de un
+Excel con una columna '# Inventario' y una columna 0/1 por cada valor posible.
+
+La hoja se procesa por columnas con pandas/NumPy: el valor marcado de cada fila
+sale de un argmax sobre la matriz de marcas, los códigos se resuelven a PCs con
+una sola consulta IN y las asignaciones se aplican con un UPDATE por valor
+distinto, de modo que el número de consultas depende de los valores distintos
+y no de las filas.
+
+Con --dry-run se resuelve todo igual pero no se escribe nada; --informe guarda
+lo que se hizo (o se haría) con cada fila.
+"""
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from .importacion import InformeImportacion, agregar_opciones_informe, escribir_informe
+from ComponentesInternos.models import TrabajoExportacion
+from ComponentesInternos.versiones import incrementar_version
+from .models import PC
+from .progreso import ProgresoImportacion
+
+
+class ComandoAsignacionExcel(BaseCommand):
+    modelo_componente = None
+    # Campo de PC que se asigna
+    campo = None
+    archivo_por_defecto = None
+    # Columna del Excel -> nombre del componente
+    columnas = {}
+    descripcion = ''
+    mensaje_asignados = ''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'excel_path',
+            type=str,
+            nargs='?',  # Hace el argumento opcional
+            default=self.archivo_por_defecto,
+            help=f'Ruta al archivo Excel (por defecto: {self.archivo_por_defecto} en la raíz del proyecto)'
+        )
+        agregar_opciones_informe(parser)
+
+    def handle(self, *args, **options):
+        excel_path = options['excel_path']
+        simular = options['dry_run']
+        informe = None
+        if simular or options['informe']:
+            informe = InformeImportacion(self.__module__.rsplit('.', 1)[-1])
+        if simular:
+            self.stdout.write(self.style.WARNING('Simulación (--dry-run): no se guardará ningún cambio'))
+
+        try:
+            # Leer el Excel (los códigos como texto: numéricos, pandas los leería como 1234.0)
+            df = pd.read_excel(excel_path, dtype={'# Inventario': str})
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error leyendo el archivo Excel: {str(e)}'))
+            return
+
+        columnas = {col: nombre for col, nombre in self.columnas.items() if col in df.columns}
+        for col in self.columnas.keys() - columnas.keys():
+            self.stdout.write(self.style.WARNING(f"⚠️ El Excel no tiene la columna '{col}'; se ignora"))
+        if not columnas:
+            self.stdout.write(self.style.ERROR(
+                f"El Excel no tiene ninguna columna de {self.descripcion}: {', '.join(self.columnas)}"
+            ))
+            return
+
+        codigos = df['# Inventario'].astype(str).str.strip().to_numpy()
+
+        # Primera columna marcada con 1 de cada fila (el orden de self.columnas decide)
+        marcas = df[list(columnas)].eq(1).to_numpy()
+        tiene_marca = marcas.any(axis=1)
+        nombres = list(columnas.values())
+        marcados = [nombres[i] if marcada else None
+                    for i, marcada in zip(marcas.argmax(axis=1), tiene_marca)]
+
+        # Todos los códigos a ids de PC en una consulta (con el componente actual, para el informe)
+        pcs = {}
+        actuales = {}
+        for codigo, pc_id, actual in (
+            PC.objects.filter(numero_inventario__codigo__in=set(codigos))
+            .values_list('numero_inventario__codigo', 'id', f'{self.campo}__nombre')
+        ):
+            pcs[codigo] = pc_id
+            actuales[pc_id] = actual
+
+        progreso = ProgresoImportacion(self.stdout, self.style, options['verbosity'], total=len(codigos))
+        stats = {'pcs_encontradas': 0, 'pcs_no_encontradas': 0, 'asignados': 0}
+        # Si un código se repite, gana su última fila, como cuando se guardaba fila a fila
+        ultimo_por_pc = {}
+        # La fila 1 del Excel es la cabecera
+        for numero_fila, (codigo, nombre) in enumerate(zip(codigos, marcados), start=2):
+            progreso.avanzar()
+            pc_id = pcs.get(codigo)
+            if pc_id is None:
+                progreso.aviso(f"No se encontró PC con número de inventario: {codigo}")
+                stats['pcs_no_encontradas'] += 1
+                if informe is not None:
+                    informe.registrar('pc_no_encontrada', numero_fila, codigo)
+                continue
+
+            stats['pcs_encontradas'] += 1
+            if nombre is None:
+                progreso.aviso(f"PC {codigo}: No tiene {self.descripcion} marcado")
+                if informe is not None:
+                    informe.registrar('omitida', numero_fila, codigo, f'Sin {self.descripcion} marcado')
+                continue
+
+            if informe is not None:
+                if actuales[pc_id] == nombre:
+                    informe.registrar('sin_cambios', numero_fila, codigo, nombre)
+                else:
+                    informe.registrar('actualizar', numero_fila, codigo, f'{actuales[pc_id]} → {nombre}')
+            ultimo_por_pc[pc_id] = nombre
+            progreso.detalle(f"✅ PC {codigo}: Asignado {nombre}")
+            stats['asignados'] += 1
+
+        # Nombre del componente -> ids de PC
+        asignaciones = {}
+        for pc_id, nombre in ultimo_por_pc.items():
+            asignaciones.setdefault(nombre, []).append(pc_id)
+
+        if informe is not None:
+            existentes = set(
+                self.modelo_componente.objects.filter(nombre__in=asignaciones)
+                .values_list('nombre', flat=True)
+            )
+            for nombre in asignaciones.keys() - existentes:
+                informe.registrar('crear_componente', detalle=nombre)
+
+        if not simular:
+            # Un get_or_create y un UPDATE por componente distinto
+            with transaction.atomic():
+                for nombre, pc_ids in asignaciones.items():
+                    componente, created = self.modelo_componente.objects.get_or_create(nombre=nombre)
+                    PC.objects.filter(id__in=pc_ids).update(**{self.campo: componente})
+            if asignaciones:
+                incrementar_version(TrabajoExportacion.VERSION_DATOS)
+
+        progreso.terminar()
+
+        # Mostrar estadísticas
+        self.stdout.write("\n=== Estadísticas ===")
+        self.stdout.write(self.style.SUCCESS(f"PCs encontradas: {stats['pcs_encontradas']}"))
+        self.stdout.write(self.style.WARNING(f"PCs no encontradas: {stats['pcs_no_encontradas']}"))
+        self.stdout.write(self.style.SUCCESS(f"{self.mensaje_asignados}: {stats['asignados']}"))
+
+        if informe is not None:
+            escribir_informe(self, informe, options['informe'])
+        if simular:
+            self.stdout.write(self.style.WARNING('Simulación completada: no se guardó ningún cambio'))
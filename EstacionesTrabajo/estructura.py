@@ -0,0 +1,138 @@
+"""
+Estructura de áreas organizativas que usan los importadores.
+
+La jerarquía se declara en estructura_areas.json (o en el archivo indicado en
+settings.ESTRUCTURA_AREAS_JSON): una lista de áreas con sus `subareas` anidadas y
+un diccionario `alias` con las variantes de nombre que aparecen en los Excel.
+
+obtener_mapa_areas() sincroniza la estructura con AreaOrganizativa y devuelve
+{ubicación del Excel: id del área}. El mapa se guarda en memoria y lo comparten
+todos los importadores del proceso; solo se recalcula si cambia el archivo o
+alguna área (sello de versión AreaOrganizativa.VERSION_ESTRUCTURA).
+"""
+import json
+import os
+from contextlib import nullcontext
+from django.conf import settings
+from django.db import transaction
+from ComponentesInternos.versiones import incrementar_version, obtener_version
+from ComponentesInternos.models import TrabajoExportacion
+from .models import AreaOrganizativa, AreaJerarquia, EstadisticaInventarioArea
+
+RUTA_POR_DEFECTO = os.path.join(os.path.dirname(__file__), 'estructura_areas.json')
+
+_cache = {}
+
+
+def ruta_estructura():
+    return getattr(settings, 'ESTRUCTURA_AREAS_JSON', RUTA_POR_DEFECTO)
+
+
+def cargar_estructura(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def recorrer_areas(nodos, camino=()):
+    """Genera el camino de nombres de cada área, siempre antes que el de sus subáreas"""
+    for nodo in nodos:
+        actual = camino + (nodo['nombre'],)
+        yield actual
+        yield from recorrer_areas(nodo.get('subareas', []), actual)
+
+
+def ubicacion(camino):
+    """Nombre con que aparece el área en los Excel: 'Área (Departamento, Local)'"""
+    if len(camino) == 1:
+        return camino[0]
+    return f"{camino[0]} ({', '.join(camino[1:])})"
+
+
+def sincronizar_areas(estructura, simular=False):
+    """
+    Crea las áreas de la estructura que falten y devuelve ({camino: id}, [ids creados]).
+
+    Una consulta lee todas las áreas existentes; las que faltan se insertan con un
+    bulk_create por nivel de profundidad. Como bulk_create no pasa por save(), la
+    tabla de cierre, las estadísticas y el sello de versión se actualizan aquí.
+    Con simular=True no se escribe nada y las áreas que faltan reciben ids
+    provisionales negativos.
+    """
+    existentes = {
+        (padre_id, nombre): pk
+        for pk, nombre, padre_id in AreaOrganizativa.objects.values_list('pk', 'nombre', 'area_padre_id')
+    }
+    niveles = {}
+    for camino in recorrer_areas(estructura['areas']):
+        niveles.setdefault(len(camino), []).append(camino)
+
+    ids = {}
+    creadas = []
+    with nullcontext() if simular else transaction.atomic():
+        for profundidad in sorted(niveles):
+            nuevas = {}
+            for camino in niveles[profundidad]:
+                padre_id = ids[camino[:-1]] if profundidad > 1 else None
+                pk = existentes.get((padre_id, camino[-1]))
+                if pk is None:
+                    nuevas[camino] = AreaOrganizativa(nombre=camino[-1], area_padre_id=padre_id)
+                else:
+                    ids[camino] = pk
+            if not nuevas:
+                continue
+            if simular:
+                for camino in nuevas:
+                    creadas.append(-len(creadas) - 1)
+                    ids[camino] = creadas[-1]
+                continue
+
+            AreaOrganizativa.objects.bulk_create(nuevas.values())
+            if any(area.pk is None for area in nuevas.values()):
+                # La base de datos no devolvió los ids insertados
+                existentes = {
+                    (padre_id, nombre): pk
+                    for pk, nombre, padre_id in AreaOrganizativa.objects.values_list(
+                        'pk', 'nombre', 'area_padre_id'
+                    )
+                }
+                for area in nuevas.values():
+                    area.pk = existentes[(area.area_padre_id, area.nombre)]
+            for camino, area in nuevas.items():
+                ids[camino] = area.pk
+                creadas.append(area.pk)
+
+        if creadas and not simular:
+            AreaJerarquia.reconstruir()
+            EstadisticaInventarioArea.objects.bulk_create(
+                [EstadisticaInventarioArea(area_id=area_id) for area_id in creadas]
+            )
+            incrementar_version(AreaOrganizativa.VERSION_ESTRUCTURA)
+            incrementar_version(TrabajoExportacion.VERSION_DATOS)
+    return ids, creadas
+
+
+def obtener_mapa_areas(simular=False):
+    """
+    {ubicación del Excel o alias: id del área}, sincronizando la estructura si hace
+    falta. Con simular=True no se crea nada: las áreas que faltan tienen id negativo.
+    """
+    ruta = ruta_estructura()
+    clave = (ruta, os.path.getmtime(ruta), obtener_version(AreaOrganizativa.VERSION_ESTRUCTURA))
+    if _cache.get('clave') == clave:
+        return _cache['mapa']
+
+    estructura = cargar_estructura(ruta)
+    ids, creadas = sincronizar_areas(estructura, simular)
+    mapa = {ubicacion(camino): pk for camino, pk in ids.items()}
+    for alias, nombre in estructura.get('alias', {}).items():
+        if nombre in mapa:
+            mapa[alias] = mapa[nombre]
+
+    if simular and creadas:
+        # Un mapa con ids provisionales no se guarda
+        return mapa
+    if creadas:
+        # Crear áreas cambia el sello de versión
+        clave = clave[:2] + (obtener_version(AreaOrganizativa.VERSION_ESTRUCTURA),)
+    _cache.update(clave=clave, mapa=mapa)
+    return mapa
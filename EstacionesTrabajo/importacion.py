@@ -0,0 +1,614 @@
+"""
+Motor común de los comandos importar_* que cargan dispositivos desde Excel.
+
+En lugar de get_or_create/create fila a fila, se precargan los responsables y los
+números de inventario existentes en diccionarios, las filas se resuelven en
+memoria y todo se escribe con bulk_create/bulk_update por lotes dentro de una
+única transacción. Como bulk_create no llama a save() ni emite señales, al final
+se recalculan en bloque los datos que mantienen esos ganchos (dueño y responsable
+de cada número de inventario, estadísticas por área).
+
+Con upsert=True (opción --upsert de los comandos) la importación es idempotente:
+cada fila se identifica por su número de inventario dentro del tipo de
+dispositivo y se compara su huella (hash_importacion) con la guardada en la
+importación anterior. Las filas sin cambios no se tocan, las modificadas se
+escriben con bulk_update y solo las nuevas se crean.
+
+Con simular=True (--dry-run) las filas se resuelven igual, contra los datos
+leídos al empezar, pero no se escribe nada ni se abre ninguna transacción;
+InformeImportacion recoge lo que se habría hecho con cada fila.
+"""
+import hashlib
+import json
+import os
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import NamedTuple
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+import openpyxl
+from .models import Responsable, EstadisticaInventarioArea
+from .estructura import obtener_mapa_areas
+from .progreso import ProgresoImportacion
+from .sincronizacion import completar_responsable_y_area, propagar_a_perifericos
+from ComponentesInternos.models import NumeroInventario, TrabajoExportacion
+from ComponentesInternos.versiones import incrementar_version
+
+TAMANO_LOTE = 1000
+
+def normalizar_nombre(nombre):
+    if not nombre:
+        return nombre
+    # Convertir a string si no lo es
+    nombre = str(nombre)
+    # Eliminar espacios extra y convertir a título
+    nombre = ' '.join(nombre.split()).strip()
+    # Manejar casos especiales
+    nombre = nombre.replace(' (nuevo)', '')
+    nombre = nombre.replace(' (Nuevo)', '')
+    return nombre
+
+
+def crear_en_lotes(modelo, objetos, clave, **filtros):
+    """
+    bulk_create por lotes. Si la base de datos no devuelve los ids insertados
+    (MySQL, MariaDB < 10.5), se recuperan buscando las filas nuevas por `clave`
+    entre las que cumplen `filtros`: otros importadores pueden estar creando a la
+    vez filas con la misma clave (por ejemplo, el mismo código en otro tipo).
+    """
+    if not objetos:
+        return
+    ultimo_id = modelo.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+    modelo.objects.bulk_create(objetos, batch_size=TAMANO_LOTE)
+    if all(obj.pk is not None for obj in objetos):
+        return
+    ids = {clave(obj): obj.pk for obj in modelo.objects.filter(pk__gt=ultimo_id, **filtros)}
+    for obj in objetos:
+        obj.pk = ids[clave(obj)]
+
+
+class FilaDispositivo(NamedTuple):
+    """Datos de una fila del Excel ya convertidos a los tipos del modelo"""
+    numero_fila: int
+    ubicacion: str
+    inventario: str
+    responsable: str
+    funciona: bool
+    es_proyecto: bool
+
+
+def huella_fila(fila):
+    """Hash de los datos que la fila escribe en el dispositivo, para detectar cambios"""
+    contenido = '\x1f'.join(str(valor) for valor in (
+        fila.ubicacion, fila.responsable.lower(), fila.funciona, fila.es_proyecto
+    ))
+    return hashlib.md5(contenido.encode('utf-8')).hexdigest()
+
+
+def completar_efectos_de_guardado(tipo_dispositivo, recalcular_estadisticas=True, numeros_ids=None,
+                                  compartidos=True):
+    """
+    Lo que save() y las señales habrían mantenido fila a fila, tras escribir con
+    bulk_create/bulk_update dispositivos del tipo: dueño y responsable de sus
+    números de inventario y estadísticas por área. Con `numeros_ids` solo se
+    recalculan esos números (los de los dispositivos escritos), por lotes.
+    Con compartidos=False no se registran sufijos de búsqueda ni se incrementan
+    sellos de versión (ver ImportadorDispositivos, en_paralelo).
+    """
+    numeros = NumeroInventario.objects.filter(tipo_dispositivo=tipo_dispositivo)
+    if numeros_ids is None:
+        lotes = [numeros]
+    else:
+        lotes = [numeros.filter(pk__in=lote) for lote in en_lotes(sorted(numeros_ids))]
+    for lote in lotes:
+        NumeroInventario.refrescar_propietarios(lote, tipos=[tipo_dispositivo], compartidos=compartidos)
+        NumeroInventario.refrescar_responsables(lote, tipos=[tipo_dispositivo], compartidos=compartidos)
+    if recalcular_estadisticas:
+        EstadisticaInventarioArea.reconstruir()
+    if compartidos:
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+
+
+def leer_filas_excel(ruta, ancho, fila_inicial=2, progreso=None):
+    """
+    Abre el Excel en modo de solo lectura y devuelve un generador de
+    (número de fila, tupla de `ancho` valores) de la hoja activa.
+    Si se pasa `progreso`, recibe como total las filas que declara la hoja.
+
+    openpyxl lee la hoja a medida que se recorre, sin cargar el libro ni los
+    estilos en memoria; el archivo se abre aquí para que los errores de apertura
+    aparezcan antes de empezar a importar.
+    """
+    wb = openpyxl.load_workbook(ruta, read_only=True)
+    ws = wb.active
+    if progreso is not None and ws.max_row:
+        # Solo es una estimación: la dimensión declarada puede no ser exacta
+        progreso.total = max(ws.max_row - fila_inicial + 1, 0)
+    # Algunos generadores de Excel declaran mal las dimensiones de la hoja; sin
+    # ellas las filas llegan con su longitud real y se completan con None.
+    ws.reset_dimensions()
+    return _recorrer_hoja(wb, ws, ancho, fila_inicial)
+
+
+def _recorrer_hoja(wb, ws, ancho, fila_inicial):
+    try:
+        for numero_fila, valores in enumerate(ws.iter_rows(min_row=fila_inicial, values_only=True),
+                                              start=fila_inicial):
+            if len(valores) < ancho:
+                # Las filas que faltan en la hoja (huecos) llegan como una lista vacía
+                valores = tuple(valores) + (None,) * (ancho - len(valores))
+            yield numero_fila, valores
+    finally:
+        wb.close()
+
+
+def en_lotes(iterable, tamano=TAMANO_LOTE):
+    """Agrupa un iterable en listas de hasta `tamano` elementos sin materializarlo"""
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+@dataclass
+class ResultadoImportacion:
+    creados: int = 0
+    actualizados: int = 0
+    sin_cambios: int = 0
+    responsables_creados: int = 0
+    responsables_actualizados: int = 0
+    numeros_creados: int = 0
+    avisos: list = field(default_factory=list)
+    errores: list = field(default_factory=list)
+
+
+class InformeImportacion:
+    """
+    Lo que hace (o haría, con --dry-run) una importación, una entrada por acción:
+    crear, actualizar, sin_cambios, conflicto, area_desconocida, omitida,
+    crear_responsable, asignar_area_responsable, crear_area...
+    Se guarda como JSON o XLSX según la extensión del archivo.
+    """
+    COLUMNAS = ['accion', 'fila', 'codigo', 'detalle']
+
+    def __init__(self, comando=''):
+        self.comando = comando
+        self.entradas = []
+
+    def registrar(self, accion, fila=None, codigo='', detalle=''):
+        self.entradas.append({'accion': accion, 'fila': fila, 'codigo': codigo or '', 'detalle': detalle})
+
+    def resumen(self):
+        return Counter(entrada['accion'] for entrada in self.entradas)
+
+    def guardar(self, ruta):
+        if ruta.lower().endswith('.xlsx'):
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet('Informe')
+            ws.append(self.COLUMNAS)
+            for entrada in self.entradas:
+                ws.append([entrada[columna] for columna in self.COLUMNAS])
+            wb.save(ruta)
+        else:
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump({'comando': self.comando, 'resumen': self.resumen(), 'entradas': self.entradas},
+                          archivo, ensure_ascii=False, indent=2)
+
+
+class ImportadorDispositivos:
+    """
+    Resuelve en memoria las filas leídas del Excel y las guarda en bloque.
+
+    Las filas (FilaDispositivo) se consumen por lotes de TAMANO_LOTE, así que un
+    generador de filas nunca se materializa entero. Las reglas son las de los
+    importadores originales: el responsable se busca sin distinguir mayúsculas y
+    se crea en el área de la fila (o recibe esa área si no tenía), y el
+    dispositivo toma el área del responsable como haría su save().
+
+    Con en_paralelo=True (importar_todo, con un importador por tipo a la vez) solo
+    se escribe en las tablas del tipo: ni los periféricos de las PCs, ni los
+    sufijos de búsqueda, ni los sellos de versión, que comparten todos los tipos y
+    harían esperar (o interbloquearse) a las transacciones de los demás
+    importadores. importar_todo los completa una vez al terminar.
+    """
+
+    def __init__(self, modelo, tipo_dispositivo, areas, campos_extra=None,
+                 recalcular_estadisticas=True, upsert=False, simular=False, informe=None,
+                 progreso=None, en_paralelo=False):
+        self.modelo = modelo
+        self.tipo_dispositivo = tipo_dispositivo
+        self.areas = areas
+        self.campos_extra = campos_extra or {}
+        self.recalcular_estadisticas = recalcular_estadisticas
+        self.upsert = upsert
+        self.en_paralelo = en_paralelo
+        self.simular = simular
+        self.informe = informe
+        self.progreso = progreso
+        # Solo se describe cada fila si alguien va a leerlo
+        self.detallar = informe is not None or (progreso is not None and progreso.verbosidad >= 3)
+        # En los periféricos conectados a una PC, el responsable y el área los da la PC
+        self.enlazado_a_pc = any(campo.name == 'pc_asociada' for campo in modelo._meta.fields)
+
+    def anotar(self, accion, fila, codigo='', detalle=''):
+        if self.informe is not None:
+            self.informe.registrar(accion, fila.numero_fila, codigo, detalle)
+        if self.progreso is not None:
+            self.progreso.detalle(f'  Fila {fila.numero_fila}: {accion} {codigo} {detalle}'.rstrip())
+
+    def cargar_responsables(self):
+        self.responsables = {}
+        for responsable in Responsable.objects.order_by('pk'):
+            self.responsables.setdefault(responsable.nombre.lower(), responsable)
+
+    def resolver_responsable(self, fila, area_id, nuevos, modificados):
+        """Responsable de la fila, creándolo o completando su área si hace falta"""
+        if not fila.responsable:
+            return None
+        responsable = self.responsables.get(fila.responsable.lower())
+        if responsable is None:
+            responsable = Responsable(nombre=fila.responsable, area_id=area_id)
+            self.responsables[responsable.nombre.lower()] = responsable
+            nuevos.append(responsable)
+            self.anotar('crear_responsable', fila, detalle=responsable.nombre)
+        elif responsable.area_id is None:
+            responsable.area_id = area_id
+            modificados.append(responsable)
+            self.anotar('asignar_area_responsable', fila, detalle=responsable.nombre)
+        return responsable
+
+    def guardar_responsables(self, nuevos, modificados):
+        crear_en_lotes(Responsable, nuevos, clave=lambda r: r.nombre.lower())
+        Responsable.objects.bulk_update(modificados, ['area'], batch_size=TAMANO_LOTE)
+
+    def registrar_responsables(self, filas):
+        """
+        Solo crea (o completa el área de) los responsables de las filas, con las
+        mismas reglas que importar(). Permite dar de alta a todos los responsables
+        antes de importar varios tipos de dispositivo a la vez.
+        """
+        resultado = ResultadoImportacion()
+        self.cargar_responsables()
+        with transaction.atomic():
+            for lote in en_lotes(filas):
+                nuevos, modificados = [], []
+                for fila in lote:
+                    area_id = self.areas.get(fila.ubicacion) if fila.ubicacion else None
+                    if area_id is not None:
+                        self.resolver_responsable(fila, area_id, nuevos, modificados)
+                self.guardar_responsables(nuevos, modificados)
+                resultado.responsables_creados += len(nuevos)
+                resultado.responsables_actualizados += len(modificados)
+        if resultado.responsables_creados or resultado.responsables_actualizados:
+            incrementar_version(TrabajoExportacion.VERSION_DATOS)
+        return resultado
+
+    def importar(self, filas):
+        resultado = ResultadoImportacion()
+
+        self.cargar_responsables()
+        # Código -> id de los números del tipo, y códigos que ya tienen dispositivo
+        self.numeros = {}
+        self.ocupados = set()
+        # Números de los dispositivos creados o actualizados, para completar_efectos_de_guardado
+        self.numeros_escritos = set()
+        numeros = NumeroInventario.objects.filter(tipo_dispositivo=self.tipo_dispositivo)
+        for codigo, pk, propietario_id in numeros.values_list('codigo', 'pk', 'propietario_id'):
+            self.numeros[codigo] = pk
+            if propietario_id is not None:
+                self.ocupados.add(codigo)
+
+        # Código -> valores actuales de los dispositivos ya importados
+        self.existentes = {}
+        if self.upsert:
+            campos = ['pk', 'hash_importacion', 'responsable_id', 'area_id', 'funciona',
+                      'es_proyecto_internacional']
+            if self.enlazado_a_pc:
+                campos.append('pc_asociada_id')
+            dispositivos = self.modelo.objects.filter(
+                numero_inventario__tipo_dispositivo=self.tipo_dispositivo
+            ).values(*campos, codigo=F('numero_inventario__codigo'))
+            self.existentes = {dispositivo['codigo']: dispositivo for dispositivo in dispositivos}
+            # Sus números se reutilizan en lugar de dar error por estar asignados
+            self.ocupados -= self.existentes.keys()
+
+        # Sin transacción al simular: solo hay lecturas y no deben bloquear filas
+        with nullcontext() if self.simular else transaction.atomic():
+            for lote in en_lotes(filas):
+                self.guardar_lote(lote, resultado)
+                if self.progreso is not None:
+                    self.progreso.avanzar(len(lote))
+            if not self.simular and (resultado.creados or resultado.actualizados
+                                     or resultado.responsables_actualizados):
+                self.completar_efectos_de_guardado()
+        return resultado
+
+    def guardar_lote(self, lote, resultado):
+        responsables_nuevos = []
+        responsables_modificados = []
+        numeros_nuevos = {}
+        pendientes = []
+        modificados = []
+
+        for fila in lote:
+            if not fila.ubicacion:  # Si no hay ubicación, saltamos esta fila
+                continue
+
+            area_id = self.areas.get(fila.ubicacion)
+            if area_id is None:
+                resultado.avisos.append(f'Área no encontrada: {fila.ubicacion}')
+                self.anotar('area_desconocida', fila, str(fila.inventario or ''), fila.ubicacion)
+                continue
+
+            # El responsable se registra aunque la fila falle después, como antes
+            responsable = self.resolver_responsable(
+                fila, area_id, responsables_nuevos, responsables_modificados
+            )
+
+            codigo = None
+            if fila.inventario:
+                codigo = str(fila.inventario)
+                if codigo in self.ocupados:
+                    resultado.errores.append(
+                        f'Fila {fila.numero_fila}: el número de inventario {codigo} ya está asignado'
+                    )
+                    self.anotar('conflicto', fila, codigo, 'El número de inventario ya está asignado')
+                    continue
+                self.ocupados.add(codigo)
+                if codigo not in self.numeros:
+                    numeros_nuevos[codigo] = NumeroInventario(
+                        codigo=codigo, tipo_dispositivo=self.tipo_dispositivo
+                    )
+            elif self.upsert:
+                # Sin número no hay forma de reconocer la fila en la próxima importación
+                resultado.avisos.append(
+                    f'Fila {fila.numero_fila}: sin número de inventario, no se sincroniza'
+                )
+                self.anotar('omitida', fila, detalle='Sin número de inventario')
+                continue
+
+            existente = self.existentes.get(codigo)
+            if existente is None:
+                pendientes.append((fila, codigo, responsable, area_id))
+                self.anotar('crear', fila, codigo)
+            elif existente['hash_importacion'] == huella_fila(fila):
+                resultado.sin_cambios += 1
+                self.anotar('sin_cambios', fila, codigo)
+            else:
+                modificados.append((existente, fila, responsable, area_id))
+                if self.detallar:
+                    self.anotar('actualizar', fila, codigo,
+                                self.describir_cambios(existente, fila, responsable, area_id))
+
+        resultado.creados += len(pendientes)
+        resultado.actualizados += len(modificados)
+        resultado.responsables_creados += len(responsables_nuevos)
+        resultado.responsables_actualizados += len(responsables_modificados)
+        resultado.numeros_creados += len(numeros_nuevos)
+        if self.simular:
+            return
+
+        self.guardar_responsables(responsables_nuevos, responsables_modificados)
+        crear_en_lotes(NumeroInventario, list(numeros_nuevos.values()),
+                       clave=lambda n: (n.codigo, n.tipo_dispositivo), tipo_dispositivo=self.tipo_dispositivo)
+        self.numeros.update((codigo, numero.pk) for codigo, numero in numeros_nuevos.items())
+
+        nuevos = [
+            self.construir_dispositivo(
+                fila, responsable, area_id,
+                numero_inventario_id=self.numeros[codigo] if codigo else None,
+                **self.campos_extra
+            )
+            for fila, codigo, responsable, area_id in pendientes
+        ]
+        # Lo que haría save(): el área del responsable (ya cargado, sin consultas)
+        completar_responsable_y_area(nuevos)
+        self.modelo.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+        self.actualizar_dispositivos(modificados)
+        self.numeros_escritos.update(self.numeros[codigo] for _, codigo, _, _ in pendientes if codigo)
+        self.numeros_escritos.update(self.numeros[existente['codigo']] for existente, _, _, _ in modificados)
+
+    def construir_dispositivo(self, fila, responsable, area_id, **campos):
+        """Dispositivo (sin guardar) con los valores que escribe la fila"""
+        return self.modelo(
+            responsable=responsable,
+            area_id=area_id,
+            funciona=fila.funciona,
+            es_proyecto_internacional=fila.es_proyecto,
+            hash_importacion=huella_fila(fila),
+            **campos
+        )
+
+    def actualizar_dispositivos(self, modificados):
+        """
+        bulk_update de los dispositivos cuya fila cambió. Los periféricos conectados
+        a una PC conservan el responsable y el área de la PC, como en su save().
+        """
+        dispositivos = []
+        for existente, fila, responsable, area_id in modificados:
+            campos = {'pk': existente['pk']}
+            if existente.get('pc_asociada_id'):
+                campos['pc_asociada_id'] = existente['pc_asociada_id']
+            dispositivos.append(self.construir_dispositivo(fila, responsable, area_id, **campos))
+        completar_responsable_y_area(dispositivos)
+        self.modelo.objects.bulk_update(
+            dispositivos,
+            ['responsable', 'area', 'funciona', 'es_proyecto_internacional', 'hash_importacion'],
+            batch_size=TAMANO_LOTE
+        )
+        if self.tipo_dispositivo == 'PC' and dispositivos and not self.en_paralelo:
+            # bulk_update no emite señales: los periféricos siguen a su PC desde aquí
+            propagar_a_perifericos(dispositivos)
+
+    def describir_cambios(self, existente, fila, responsable, area_id):
+        """'campo: antes → después' de lo que cambia la fila, para el informe"""
+        if not hasattr(self, 'nombres_responsables'):
+            self.nombres_responsables = {r.pk: r.nombre for r in self.responsables.values() if r.pk}
+            # Al recorrer al revés, el nombre oficial de cada área pisa a sus alias
+            self.nombres_areas = {pk: nombre for nombre, pk in reversed(list(self.areas.items()))}
+
+        nuevo = self.construir_dispositivo(fila, responsable, area_id)
+        comparar = [
+            ('funciona', existente['funciona'], nuevo.funciona),
+            ('proyecto internacional', existente['es_proyecto_internacional'],
+             nuevo.es_proyecto_internacional),
+        ]
+        # Con PC asociada, el responsable y el área los pone la PC y no cambian
+        if not existente.get('pc_asociada_id'):
+            completar_responsable_y_area([nuevo])
+            comparar += [
+                ('responsable', self.nombres_responsables.get(existente['responsable_id']),
+                 responsable.nombre if responsable else None),
+                ('área', self.nombres_areas.get(existente['area_id']),
+                 self.nombres_areas.get(nuevo.area_id)),
+            ]
+        return '; '.join(f'{campo}: {antes} → {despues}'
+                         for campo, antes, despues in comparar if antes != despues)
+
+    def completar_efectos_de_guardado(self):
+        completar_efectos_de_guardado(self.tipo_dispositivo, self.recalcular_estadisticas, self.numeros_escritos,
+                                      compartidos=not self.en_paralelo)
+
+
+def agregar_opciones_informe(parser):
+    """--dry-run e --informe, comunes a los comandos importar_* y asignar_*"""
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Resolver todas las filas sin escribir nada en la base de datos'
+    )
+    parser.add_argument(
+        '--informe',
+        type=str,
+        help='Guardar lo que se hizo (o se haría) con cada fila en este archivo .json o .xlsx'
+    )
+
+
+def escribir_informe(comando, informe, ruta):
+    """Muestra el resumen del informe y, si se pidió, lo guarda en `ruta`"""
+    comando.stdout.write('\n=== Informe ===')
+    for accion, cantidad in sorted(informe.resumen().items()):
+        comando.stdout.write(f'{accion:<26} {cantidad}')
+    if ruta:
+        informe.guardar(ruta)
+        comando.stdout.write(comando.style.SUCCESS(f'✓ Informe guardado en {ruta}'))
+
+
+class ComandoImportacionExcel(BaseCommand):
+    """
+    Base de los comandos importar_*. Las subclases indican el modelo, el archivo
+    y en qué columna está cada dato; el resto lo hacen leer_filas_excel e
+    ImportadorDispositivos.
+    """
+    modelo = None
+    tipo_dispositivo = None
+    archivo = None
+    nombre_plural = ''
+    mensaje_creados = 'Creados {} dispositivos'
+    # Columna (empezando en 0) de cada dato de la fila
+    columnas = {'ubicacion': 0, 'inventario': 1, 'responsable': 2, 'funciona': 3, 'es_proyecto': 4}
+    campos_extra = {}
+
+    def ruta_excel(self):
+        # Los Excel se buscan dentro de la carpeta de la aplicación
+        return os.path.join(os.path.dirname(__file__), self.archivo)
+
+    def leer_fila(self, numero_fila, valores):
+        responsable = valores[self.columnas['responsable']]
+        return FilaDispositivo(
+            numero_fila=numero_fila,
+            # Las variantes de nombre se resuelven con los alias de estructura_areas.json
+            ubicacion=valores[self.columnas['ubicacion']] or '',
+            inventario=valores[self.columnas['inventario']] or '',
+            responsable=normalizar_nombre(responsable) if responsable else '',
+            # True solo si es 1, False si está vacío o es otro valor
+            funciona=valores[self.columnas['funciona']] == 1,
+            es_proyecto=valores[self.columnas['es_proyecto']] == 1,
+        )
+
+    def leer_filas(self, progreso=None):
+        """Abre el Excel y devuelve un generador de FilaDispositivo"""
+        valores = leer_filas_excel(self.ruta_excel(), ancho=max(self.columnas.values()) + 1,
+                                   progreso=progreso)
+        return (self.leer_fila(numero_fila, fila) for numero_fila, fila in valores)
+
+    def crear_importador(self, areas, **kwargs):
+        return ImportadorDispositivos(self.modelo, self.tipo_dispositivo, areas, self.campos_extra, **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sin-estadisticas',
+            action='store_true',
+            help='No recalcular las estadísticas por área al terminar (importar_todo lo hace una sola vez)'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Sincronizar con lo ya importado: actualizar las filas que cambiaron y crear solo las nuevas'
+        )
+        parser.add_argument(
+            '--en-paralelo',
+            action='store_true',
+            help='No escribir en lo que comparten todos los tipos (periféricos de las PCs, sufijos de '
+                 'búsqueda, sellos de versión): importar_todo lo hace cuando terminan todos los importadores'
+        )
+        agregar_opciones_informe(parser)
+
+    def handle(self, *args, **options):
+        simular = options['dry_run']
+        informe = None
+        if simular or options['informe']:
+            informe = InformeImportacion(self.__module__.rsplit('.', 1)[-1])
+        if simular:
+            self.stdout.write(self.style.WARNING('Simulación (--dry-run): no se guardará ningún cambio'))
+        self.stdout.write(f'Importando {self.nombre_plural} desde Excel...')
+        areas = obtener_mapa_areas(simular=simular)
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(areas)} áreas organizativas disponibles'))
+        if informe is not None:
+            # Áreas de la estructura que aún no existen (id provisional negativo); los
+            # alias van detrás de su área, así que se anota el nombre oficial
+            nuevas = {}
+            for nombre_area, pk in areas.items():
+                if pk < 0:
+                    nuevas.setdefault(pk, nombre_area)
+            for nombre_area in nuevas.values():
+                informe.registrar('crear_area', detalle=nombre_area)
+
+        progreso = ProgresoImportacion(self.stdout, self.style, options['verbosity'])
+        try:
+            # Abrir el archivo Excel (las filas se leen después, a medida que se importan)
+            filas = self.leer_filas(progreso)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error al abrir el archivo Excel: {e}'))
+            return
+
+        importador = self.crear_importador(
+            areas, recalcular_estadisticas=not options['sin_estadisticas'], upsert=options['upsert'],
+            simular=simular, informe=informe, progreso=progreso,
+            en_paralelo=options['en_paralelo']
+        )
+        resultado = importador.importar(filas)
+
+        for aviso in resultado.avisos:
+            progreso.aviso(aviso)
+        for error in resultado.errores:
+            progreso.error(f'Error al procesar fila: {error}')
+        progreso.terminar()
+
+        self.stdout.write(f'  + Creados {resultado.responsables_creados} responsables '
+                          f'({resultado.responsables_actualizados} con área actualizada)')
+        self.stdout.write(f'  + Creados {resultado.numeros_creados} números de inventario')
+        self.stdout.write(self.style.SUCCESS(f'✓ {self.mensaje_creados.format(resultado.creados)}'))
+        if options['upsert']:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {resultado.actualizados} actualizados, {resultado.sin_cambios} sin cambios'
+            ))
+
+        if informe is not None:
+            escribir_informe(self, informe, options['informe'])
+        if simular:
+            self.stdout.write(self.style.WARNING('Simulación completada: no se guardó ningún cambio'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Importación completada'))
@@ -1,47 +1,180 @@
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management import call_command, load_command_class
 from django.core.management.base import BaseCommand
-from django.core.management import call_command
+from django.db import connection, connections
+
+# Este módulo se importa en los procesos del pool antes de django.setup(), por eso los
+# modelos se importan dentro de las funciones que los usan.
+
+# Importadores de dispositivos: cada uno escribe en sus propias tablas, así que pueden
+# ejecutarse a la vez una vez que existen las áreas y los responsables. Con --en-paralelo
+# no tocan lo que comparten todos los tipos (periféricos de las PCs, sufijos de búsqueda,
+# sellos de versión): se completa una sola vez al terminar todos
+IMPORTADORES_DISPOSITIVOS = [
+    ('importar_pcs_desde_excel', 'PCs'),
+    ('importar_monitores', 'Monitores'),
+    ('importar_teclados_desde_excel', 'Teclados'),
+    ('importar_maus_desde_excel', 'Mouse'),
+    ('importar_impresoras_desde_excel', 'Impresoras'),
+    ('importar_scaners_desde_excel', 'Escáneres'),
+    ('importar_ups_desde_excel', 'UPS'),
+]
+
+# Necesitan las PCs. Se ejecutan uno tras otro porque ambos guardan las mismas PCs
+ASIGNACIONES = [
+    ('asignar_sistemas', 'Sistemas Operativos'),
+    ('asignar_procesadores', 'Procesadores'),
+]
+
+
+def _iniciar_proceso():
+    # Los procesos del pool arrancan con 'spawn': configuran Django y abren su propia conexión
+    django.setup()
+
+
+def ejecutar_comando(comando, *args):
+    """Ejecuta un comando capturando su salida. Devuelve (salida, segundos, error)"""
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    error = None
+    try:
+        call_command(comando, *args, stdout=salida)
+    except Exception as e:
+        error = str(e)
+    finally:
+        connections.close_all()
+    return salida.getvalue(), time.perf_counter() - inicio, error
+
 
 class Command(BaseCommand):
     help = 'Importa todos los datos (componentes, PCs, monitores, teclados, mouse, impresoras, escáneres y UPS)'
 
-    def handle(self, *args, **options):
-        self.stdout.write('🚀 Iniciando importación masiva...\n')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=len(IMPORTADORES_DISPOSITIVOS),
+            help='Importadores de dispositivos que se ejecutan a la vez (por defecto: todos)'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Sincronizar los dispositivos con lo ya importado (ver importar_* --upsert)'
+        )
+
+    def etapa(self, nombre):
+        self.stdout.write(f'\n📥 {nombre}...')
+        return time.perf_counter()
+
+    def fin_etapa(self, nombre, inicio):
+        segundos = time.perf_counter() - inicio
+        self.tiempos.append((nombre, segundos))
+        self.stdout.write(f'⏱ {nombre}: {segundos:.1f} s')
+
+    def informar(self, nombre, salida, segundos, error):
+        self.stdout.write(salida, ending='')
+        if error:
+            self.stdout.write(self.style.ERROR(f'❌ Error al importar {nombre}: {error}\n'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {nombre} importados correctamente ({segundos:.1f} s)\n'))
+
+    def preparar_areas_y_responsables(self):
+        """
+        Da de alta las áreas y los responsables de todas las hojas, en el mismo orden
+        en que se importan, para que los importadores en paralelo solo los consulten.
+        """
+        from EstacionesTrabajo.estructura import obtener_mapa_areas
 
-        # Primero importar componentes
-        try:
-            self.stdout.write('\n📥 Importando Componentes...')
-            call_command('importar_componentes')
-            self.stdout.write(self.style.SUCCESS(f'✅ Componentes importados correctamente\n'))
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(
-                    f'❌ Error al importar componentes: {str(e)}\n'
-                )
-            )
-
-        # Lista de comandos a ejecutar para dispositivos
-        comandos = [
-            ('importar_pcs_desde_excel', 'PCs'),
-            ('importar_monitores', 'Monitores'),
-            ('importar_teclados_desde_excel', 'Teclados'),
-            ('importar_maus_desde_excel', 'Mouse'),
-            ('importar_impresoras_desde_excel', 'Impresoras'),
-            ('importar_scaners_desde_excel', 'Escáneres'),
-            ('importar_ups_desde_excel', 'UPS'),
-            ('asignar_sistemas', 'Sistemas Operativos'),
-            ('asignar_procesadores', 'Procesadores')
-        ]
-
-        for comando, nombre in comandos:
+        areas = obtener_mapa_areas()
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(areas)} áreas organizativas disponibles'))
+        for comando, nombre in IMPORTADORES_DISPOSITIVOS:
+            importador_excel = load_command_class('EstacionesTrabajo', comando)
             try:
-                self.stdout.write(f'\n📥 Importando {nombre}...')
-                call_command(comando)
-                self.stdout.write(self.style.SUCCESS(f'✅ {nombre} importados correctamente\n'))
+                filas = importador_excel.leer_filas()
             except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'❌ Error al importar {nombre}: {str(e)}\n'
-                    )
-                )
+                self.stdout.write(self.style.ERROR(f'❌ Error al abrir el archivo de {nombre}: {e}'))
+                continue
+            resultado = importador_excel.crear_importador(areas).registrar_responsables(filas)
+            self.stdout.write(f'  + {nombre}: {resultado.responsables_creados} responsables creados, '
+                              f'{resultado.responsables_actualizados} con área actualizada')
+
+    def importar_dispositivos(self, procesos, argumentos):
+        if connection.vendor == 'sqlite' and procesos > 1:
+            # SQLite no admite varias transacciones de escritura a la vez
+            self.stdout.write(self.style.WARNING('⚠ SQLite: los dispositivos se importan de uno en uno'))
+            procesos = 1
+
+        if procesos <= 1:
+            for comando, nombre in IMPORTADORES_DISPOSITIVOS:
+                self.informar(nombre, *ejecutar_comando(comando, *argumentos))
+            return
+
+        # Cada proceso abre su propia conexión; no deben heredar la de este
+        connections.close_all()
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto,
+                                 initializer=_iniciar_proceso) as pool:
+            tareas = {
+                pool.submit(ejecutar_comando, comando, *argumentos): nombre
+                for comando, nombre in IMPORTADORES_DISPOSITIVOS
+            }
+            for tarea in as_completed(tareas):
+                self.informar(tareas[tarea], *tarea.result())
+
+    def handle(self, *args, **options):
+        from EstacionesTrabajo.models import PC, EstadisticaInventarioArea
+        from EstacionesTrabajo.sincronizacion import propagar_a_perifericos
+        from ComponentesInternos.models import NumeroInventario, SufijoBusqueda, TrabajoExportacion
+        from ComponentesInternos.versiones import incrementar_version
+
+        self.stdout.write('🚀 Iniciando importación masiva...\n')
+        self.tiempos = []
+        inicio_total = time.perf_counter()
+
+        # 1. Componentes, áreas y responsables: los necesitan todos los importadores
+        inicio = self.etapa('Importando Componentes')
+        self.informar('Componentes', *ejecutar_comando('importar_componentes'))
+        self.fin_etapa('Componentes', inicio)
+
+        inicio = self.etapa('Preparando áreas y responsables')
+        self.preparar_areas_y_responsables()
+        self.fin_etapa('Áreas y responsables', inicio)
+
+        # 2. Dispositivos, en paralelo
+        inicio = self.etapa('Importando dispositivos')
+        argumentos = ['--sin-estadisticas', '--en-paralelo'] + (['--upsert'] if options['upsert'] else [])
+        self.importar_dispositivos(options['procesos'], argumentos)
+        self.fin_etapa('Dispositivos', inicio)
+
+        # Lo que comparten todos los tipos, que los importadores en paralelo no escriben
+        inicio = self.etapa('Completando los datos compartidos')
+        if options['upsert']:
+            # Los periféricos conectados toman el responsable y el área de su PC
+            actualizados = propagar_a_perifericos(PC.objects.all())
+            self.stdout.write(self.style.SUCCESS(f'✓ {actualizados} periféricos actualizados'))
+        SufijoBusqueda.completar()
+        incrementar_version(NumeroInventario.VERSION_DISPONIBLES)
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+        self.fin_etapa('Datos compartidos', inicio)
+
+        # 3. Asignaciones sobre las PCs importadas
+        inicio = self.etapa('Asignando sistemas operativos y procesadores')
+        for comando, nombre in ASIGNACIONES:
+            self.informar(nombre, *ejecutar_comando(comando))
+        self.fin_etapa('Asignaciones', inicio)
+
+        # 4. Estadísticas por área, una sola vez para todos los dispositivos
+        inicio = self.etapa('Recalculando estadísticas por área')
+        EstadisticaInventarioArea.reconstruir()
+        self.fin_etapa('Estadísticas', inicio)
+
+        self.stdout.write('\n=== Tiempos por etapa ===')
+        for nombre, segundos in self.tiempos:
+            self.stdout.write(f'{nombre:<22} {segundos:6.1f} s')
+        self.stdout.write(f'{"Total":<22} {time.perf_counter() - inicio_total:6.1f} s')
 
-        self.stdout.write(self.style.SUCCESS('\n🎉 Proceso de importación masiva completado!')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('\n🎉 Proceso de importación masiva completado!'))
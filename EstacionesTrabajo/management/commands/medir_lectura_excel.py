@@ -0,0 +1,92 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+import openpyxl
+from EstacionesTrabajo.importacion import ComandoImportacionExcel, leer_filas_excel
+
+
+def leer_completo(ruta, comando):
+    """Lectura anterior: libro completo en memoria recorriendo objetos celda"""
+    wb = openpyxl.load_workbook(ruta)
+    ws = wb.active
+    filas = 0
+    for numero_fila, row in enumerate(ws.iter_rows(min_row=2), start=2):
+        comando.leer_fila(numero_fila, tuple(celda.value for celda in row))
+        filas += 1
+    wb.close()
+    return filas
+
+
+def leer_streaming(ruta, comando):
+    """Lectura actual: modo de solo lectura, valores y generadores"""
+    ancho = max(comando.columnas.values()) + 1
+    filas = 0
+    for numero_fila, valores in leer_filas_excel(ruta, ancho):
+        comando.leer_fila(numero_fila, valores)
+        filas += 1
+    return filas
+
+
+class Command(BaseCommand):
+    help = ('Compara el tiempo y la memoria de la lectura completa de openpyxl con la '
+            'lectura en streaming que usan los comandos importar_*')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            type=int,
+            default=100000,
+            help='Filas de la hoja de prueba que se genera (por defecto: 100000)'
+        )
+        parser.add_argument(
+            '--archivo',
+            type=str,
+            help='Medir con este Excel en lugar de generar uno'
+        )
+
+    def generar_excel(self, ruta, filas):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(['Ubicación', '# Inventario', 'Responsable', 'Funciona', 'Proyecto internacional'])
+        for i in range(filas):
+            ws.append([
+                'Subdelegación CTI', 100000 + i, f'Responsable {i % 500}',
+                1 if i % 3 else None, 1 if i % 7 == 0 else 0
+            ])
+        wb.save(ruta)
+
+    def medir(self, lector, ruta, comando):
+        inicio = time.perf_counter()
+        filas = lector(ruta, comando)
+        segundos = time.perf_counter() - inicio
+
+        # La memoria se mide en una pasada aparte: tracemalloc ralentiza la lectura
+        tracemalloc.start()
+        lector(ruta, comando)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return filas, segundos, pico
+
+    def handle(self, *args, **options):
+        comando = ComandoImportacionExcel()
+        temporal = None
+        ruta = options['archivo']
+        if not ruta:
+            temporal = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+            temporal.close()
+            ruta = temporal.name
+            self.stdout.write(f'Generando hoja de prueba con {options["filas"]} filas...')
+            self.generar_excel(ruta, options['filas'])
+
+        try:
+            for nombre, lector in [('Completa', leer_completo), ('Streaming', leer_streaming)]:
+                filas, segundos, pico = self.medir(lector, ruta, comando)
+                self.stdout.write(
+                    f'{nombre:<10} {filas} filas en {segundos:.2f} s '
+                    f'({filas / segundos:,.0f} filas/s), pico de memoria {pico / 2**20:.1f} MB'
+                )
+        finally:
+            if temporal:
+                os.remove(ruta)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from EstacionesTrabajo.models import EstadisticaInventarioArea
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero las estadísticas de inventario acumuladas por área'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando estadísticas de inventario por área...')
+        filas = EstadisticaInventarioArea.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'✓ Estadísticas recalculadas para {filas} áreas'))
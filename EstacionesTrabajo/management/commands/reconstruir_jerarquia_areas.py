@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from EstacionesTrabajo.models import AreaJerarquia
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de cierre de la jerarquía de áreas organizativas'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconstruyendo jerarquía de áreas...')
+        filas = AreaJerarquia.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'✓ Jerarquía reconstruida ({filas} relaciones ancestro/descendiente)'))
@@ -1,11 +1,19 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Subquery, Value, When
+from django.core.exceptions import ValidationError
 from ComponentesInternos.models import (
-    NumeroInventario, SistemaOperativo, Procesador, RAM, DiscoDuro
+    NumeroInventario, SistemaOperativo, Procesador, RAM, DiscoDuro, TrabajoExportacion
 )
+from ComponentesInternos.versiones import incrementar_version
+from .sincronizacion import completar_responsable_y_area, sincronizar_tipo_numeros
 
 # Create your models here.
 
 class AreaOrganizativa(models.Model):
+    # Sello de versión de las áreas (ver ComponentesInternos.versiones)
+    VERSION_ESTRUCTURA = 'areas_organizativas'
+
     nombre = models.CharField(max_length=100)
     area_padre = models.ForeignKey(
         'self',
@@ -16,6 +24,35 @@ class AreaOrganizativa(models.Model):
         related_name='departamentos'
     )
 
+    def clean(self):
+        # Evitar ciclos: un área no puede colgar de sí misma ni de una de sus subáreas
+        if self.pk and self.area_padre_id and self.area_padre_id in self.get_descendientes_ids():
+            raise ValidationError({'area_padre': 'Un área no puede depender de sí misma ni de una de sus subáreas.'})
+
+    def save(self, *args, **kwargs):
+        es_nueva = self._state.adding
+        padre_anterior_id = None
+        if not es_nueva:
+            padre_anterior_id = AreaOrganizativa.objects.filter(pk=self.pk).values_list(
+                'area_padre_id', flat=True
+            ).first()
+
+        super().save(*args, **kwargs)
+
+        # Mantener la tabla de cierre de la jerarquía y las estadísticas acumuladas
+        if es_nueva:
+            AreaJerarquia.registrar_area(self)
+            EstadisticaInventarioArea.objects.get_or_create(area=self)
+        elif padre_anterior_id != self.area_padre_id:
+            AreaJerarquia.mover_area(self)
+            EstadisticaInventarioArea.reconstruir()
+
+    def get_descendientes_ids(self):
+        """Ids del área y de todas sus subáreas (a cualquier profundidad) en una sola consulta"""
+        return list(
+            AreaJerarquia.objects.filter(ancestro_id=self.pk).values_list('descendiente_id', flat=True)
+        )
+
     def __str__(self):
         return self.nombre
 
@@ -25,6 +62,225 @@ class AreaOrganizativa(models.Model):
         ordering = ['nombre']
         unique_together = ['nombre', 'area_padre']  # Permite nombres repetidos solo si tienen diferente área padre
 
+class AreaJerarquia(models.Model):
+    """
+    Tabla de cierre de la jerarquía de áreas: una fila por cada par ancestro/descendiente
+    (incluido el par del área consigo misma con profundidad 0). Permite obtener un subárbol
+    completo con una sola consulta indexada, sin importar la profundidad.
+    """
+    ancestro = models.ForeignKey(
+        AreaOrganizativa,
+        on_delete=models.CASCADE,
+        related_name='jerarquia_descendientes'
+    )
+    descendiente = models.ForeignKey(
+        AreaOrganizativa,
+        on_delete=models.CASCADE,
+        related_name='jerarquia_ancestros'
+    )
+    profundidad = models.PositiveSmallIntegerField(default=0)
+
+    @classmethod
+    def registrar_area(cls, area):
+        """Crea las filas de una área recién creada a partir de los ancestros de su padre"""
+        filas = [cls(ancestro_id=area.pk, descendiente_id=area.pk, profundidad=0)]
+        if area.area_padre_id:
+            ancestros = list(
+                cls.objects.filter(descendiente_id=area.area_padre_id).values_list('ancestro_id', 'profundidad')
+            )
+            if not ancestros:
+                # La tabla aún no está poblada (datos anteriores): reconstruir completa
+                cls.reconstruir()
+                return
+            filas.extend(
+                cls(ancestro_id=ancestro_id, descendiente_id=area.pk, profundidad=profundidad + 1)
+                for ancestro_id, profundidad in ancestros
+            )
+        cls.objects.bulk_create(filas)
+
+    @classmethod
+    def mover_area(cls, area):
+        """Reubica el subárbol de un área cuyo padre cambió"""
+        subarbol = list(cls.objects.filter(ancestro_id=area.pk).values_list('descendiente_id', 'profundidad'))
+        if not subarbol:
+            cls.reconstruir()
+            return
+        ids_subarbol = [descendiente_id for descendiente_id, _ in subarbol]
+
+        with transaction.atomic():
+            # Cortar los vínculos con los ancestros anteriores
+            cls.objects.filter(descendiente_id__in=ids_subarbol).exclude(ancestro_id__in=ids_subarbol).delete()
+            # Enlazar el subárbol completo con los ancestros del nuevo padre
+            if area.area_padre_id:
+                ancestros = cls.objects.filter(descendiente_id=area.area_padre_id).values_list(
+                    'ancestro_id', 'profundidad'
+                )
+                cls.objects.bulk_create([
+                    cls(ancestro_id=ancestro_id, descendiente_id=descendiente_id,
+                        profundidad=profundidad_ancestro + profundidad_descendiente + 1)
+                    for ancestro_id, profundidad_ancestro in ancestros
+                    for descendiente_id, profundidad_descendiente in subarbol
+                ])
+
+    @classmethod
+    def reconstruir(cls):
+        """Regenera la tabla completa a partir de area_padre. Devuelve el número de filas creadas"""
+        padres = dict(AreaOrganizativa.objects.values_list('id', 'area_padre_id'))
+        filas = []
+        for area_id in padres:
+            ancestro_id, profundidad, visitados = area_id, 0, set()
+            while ancestro_id is not None and ancestro_id not in visitados:
+                visitados.add(ancestro_id)
+                filas.append(cls(ancestro_id=ancestro_id, descendiente_id=area_id, profundidad=profundidad))
+                ancestro_id = padres.get(ancestro_id)
+                profundidad += 1
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(filas, batch_size=1000)
+        return len(filas)
+
+    def __str__(self):
+        return f"{self.ancestro_id} -> {self.descendiente_id} ({self.profundidad})"
+
+    class Meta:
+        verbose_name = 'Relación de Jerarquía de Áreas'
+        verbose_name_plural = 'Relaciones de Jerarquía de Áreas'
+        unique_together = ['ancestro', 'descendiente']
+        indexes = [
+            models.Index(fields=['descendiente', 'ancestro']),
+        ]
+
+class EstadisticaInventarioArea(models.Model):
+    """
+    Conteos desnormalizados del inventario de un área, acumulados sobre todo su subárbol.
+    Se mantienen de forma incremental mediante señales (ver signals.py) y se regeneran con
+    el comando reconstruir_estadisticas_areas.
+    """
+    # Prefijo de los campos de conteo -> (app, modelo)
+    DISPOSITIVOS = {
+        'pcs': ('EstacionesTrabajo', 'PC'),
+        'monitores': ('Perifericos', 'Monitor'),
+        'teclados': ('Perifericos', 'Teclado'),
+        'mouses': ('Perifericos', 'Mouse'),
+        'impresoras': ('Perifericos', 'Impresora'),
+        'scaners': ('Perifericos', 'Scaner'),
+        'ups': ('Perifericos', 'UPS'),
+    }
+
+    area = models.OneToOneField(
+        AreaOrganizativa,
+        on_delete=models.CASCADE,
+        related_name='estadisticas',
+        verbose_name='Área'
+    )
+    responsables_total = models.PositiveIntegerField(default=0)
+    pcs_ok = models.PositiveIntegerField(default=0)
+    pcs_total = models.PositiveIntegerField(default=0)
+    monitores_ok = models.PositiveIntegerField(default=0)
+    monitores_total = models.PositiveIntegerField(default=0)
+    teclados_ok = models.PositiveIntegerField(default=0)
+    teclados_total = models.PositiveIntegerField(default=0)
+    mouses_ok = models.PositiveIntegerField(default=0)
+    mouses_total = models.PositiveIntegerField(default=0)
+    impresoras_ok = models.PositiveIntegerField(default=0)
+    impresoras_total = models.PositiveIntegerField(default=0)
+    scaners_ok = models.PositiveIntegerField(default=0)
+    scaners_total = models.PositiveIntegerField(default=0)
+    ups_ok = models.PositiveIntegerField(default=0)
+    ups_total = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def prefijo_de(cls, modelo):
+        """Prefijo de los campos de conteo para una clase de dispositivo, o None"""
+        for prefijo, (app_label, nombre_modelo) in cls.DISPOSITIVOS.items():
+            if modelo._meta.app_label == app_label and modelo.__name__ == nombre_modelo:
+                return prefijo
+        return None
+
+    @staticmethod
+    def _sumar(campo, delta):
+        """Expresión campo + delta que no baja de 0"""
+        if delta >= 0:
+            return F(campo) + delta
+        # Si los contadores se desfasaron, campo - n sería negativo y MariaDB rechaza el
+        # UPDATE (UNSIGNED fuera de rango) aunque se envolviera en GREATEST: se compara antes
+        return Case(When(**{f'{campo}__gt': -delta}, then=F(campo) + delta), default=Value(0))
+
+    @classmethod
+    def aplicar_delta(cls, area_id, prefijo, total=0, ok=0):
+        """Suma los deltas al área y a todos sus ancestros con un único UPDATE"""
+        if not area_id or (total == 0 and ok == 0):
+            return
+        cambios = {f'{prefijo}_total': cls._sumar(f'{prefijo}_total', total)}
+        if prefijo != 'responsables':
+            cambios[f'{prefijo}_ok'] = cls._sumar(f'{prefijo}_ok', ok)
+        ancestros = AreaJerarquia.objects.filter(descendiente_id=area_id).values('ancestro_id')
+        cls.objects.filter(area_id__in=Subquery(ancestros)).update(**cambios)
+
+    @classmethod
+    def calcular_conteos(cls):
+        """
+        Calcula {area_id: {campo: valor}} acumulado por subárbol: un GROUP BY por área
+        sobre la tabla de cada modelo, sin joins, y la suma a los ancestros en Python.
+        """
+        padres = dict(AreaOrganizativa.objects.order_by().values_list('id', 'area_padre_id'))
+        conteos = {}
+
+        def acumular(area_id, valores):
+            # El área y todos sus ancestros (con protección contra ciclos, como AreaJerarquia)
+            visitados = set()
+            while area_id is not None and area_id not in visitados and area_id in padres:
+                visitados.add(area_id)
+                acumulados = conteos.setdefault(area_id, {})
+                for campo, valor in valores.items():
+                    acumulados[campo] = acumulados.get(campo, 0) + valor
+                area_id = padres[area_id]
+
+        responsables = Responsable.objects.order_by().values('area_id').annotate(total=Count('pk'))
+        for fila in responsables:
+            acumular(fila['area_id'], {'responsables_total': fila['total']})
+
+        for prefijo, (app_label, nombre_modelo) in cls.DISPOSITIVOS.items():
+            modelo = apps.get_model(app_label, nombre_modelo)
+            filas = (
+                modelo.objects.order_by()
+                .values('area_id')
+                .annotate(total=Count('pk'), ok=Count('pk', filter=Q(funciona=True)))
+            )
+            for fila in filas:
+                acumular(fila['area_id'], {f'{prefijo}_total': fila['total'], f'{prefijo}_ok': fila['ok']})
+        return conteos
+
+    @classmethod
+    def reconstruir(cls):
+        """Regenera las estadísticas de todas las áreas. Devuelve el número de filas creadas"""
+        conteos = cls.calcular_conteos()
+        filas = [
+            cls(area_id=area_id, **conteos.get(area_id, {}))
+            for area_id in AreaOrganizativa.objects.values_list('id', flat=True)
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(filas, batch_size=1000)
+        # Los contadores salen en la exportación de áreas
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+        return len(filas)
+
+    def formatear(self, prefijo):
+        """Texto OK/Total que muestran el listado y la exportación de áreas"""
+        total = getattr(self, f'{prefijo}_total')
+        if total == 0:
+            return "-"
+        return f"{getattr(self, f'{prefijo}_ok')}/{total}"
+
+    def __str__(self):
+        return f"Estadísticas de {self.area}"
+
+    class Meta:
+        verbose_name = 'Estadística de Inventario por Área'
+        verbose_name_plural = 'Estadísticas de Inventario por Área'
+
 class Responsable(models.Model):
     nombre = models.CharField(max_length=100)
     area = models.ForeignKey(
@@ -44,6 +300,8 @@ class Responsable(models.Model):
         ordering = ['nombre']
 
 class PC(models.Model):
+    TIPO_DISPOSITIVO = 'PC'
+
     numero_inventario = models.OneToOneField(
         NumeroInventario,
         on_delete=models.SET_NULL,
@@ -100,22 +358,24 @@ class PC(models.Model):
         blank=True,
         verbose_name='Disco Duro'
     )
+    # Huella de la fila del Excel de la que se importó (ver EstacionesTrabajo.importacion)
+    hash_importacion = models.CharField(max_length=32, blank=True, default='', editable=False)
 
     def save(self, *args, **kwargs):
-        # Sincronizar área basado en el responsable
-        if self.responsable and self.responsable.area:
-            self.area = self.responsable.area
-        
-        # Asignar tipo de dispositivo al número de inventario
-        if self.numero_inventario:
-            self.numero_inventario.tipo_dispositivo = 'PC'
-            self.numero_inventario.save()
-            
+        # Sincronizar área basado en el responsable y asignar el tipo al número de
+        # inventario, con el mismo código que las importaciones en bloque
+        completar_responsable_y_area([self])
+        sincronizar_tipo_numeros([self])
+
         super().save(*args, **kwargs)
 
+        # Mantener el puntero del número de inventario hacia esta PC
+        NumeroInventario.sincronizar_propietario(self)
+
     def __str__(self):
         if self.numero_inventario:
-            return f"PC {self.numero_inventario}"
+            # El dispositivo del número es esta misma PC
+            return f"PC {self.numero_inventario.describir(self)}"
         elif self.responsable:
             return f"PC de {self.responsable}"
         else:
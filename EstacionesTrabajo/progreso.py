@@ -0,0 +1,106 @@
+"""
+Progreso de los comandos importar_* y asignar_*.
+
+En lugar de escribir una o dos líneas por fila, los comandos avisan a
+ProgresoImportacion de las filas procesadas y de lo que se hizo con cada una.
+Según la verbosidad (-v) del comando:
+
+    0  solo el resumen final, con el número de avisos y errores
+    1  además, una línea de progreso con filas/s y tiempo restante (por defecto)
+    2  además, cada aviso y error
+    3  además, el detalle de cada fila
+
+La línea de progreso se reescribe en el sitio si la salida es una terminal y,
+si no lo es (logs, importar_todo), se escribe como mucho cada pocos segundos.
+"""
+import time
+from collections import Counter
+
+
+class ProgresoImportacion:
+    # Segundos entre dos actualizaciones de la línea de progreso
+    INTERVALO_TERMINAL = 0.2
+    INTERVALO_LOG = 10
+
+    def __init__(self, stdout, style, verbosidad=1, total=None):
+        self.stdout = stdout
+        self.style = style
+        self.verbosidad = verbosidad
+        # Filas previstas; sin total no se calcula el tiempo restante
+        self.total = total
+        self.procesadas = 0
+        self.contadores = Counter()
+        self.en_terminal = stdout.isatty()
+        self.intervalo = self.INTERVALO_TERMINAL if self.en_terminal else self.INTERVALO_LOG
+        self.inicio = time.monotonic()
+        self.ultima_escritura = self.inicio
+        self.linea_abierta = False
+
+    def avanzar(self, filas=1):
+        self.procesadas += filas
+        ahora = time.monotonic()
+        if self.verbosidad >= 1 and ahora - self.ultima_escritura >= self.intervalo:
+            self.ultima_escritura = ahora
+            self.escribir_progreso(ahora)
+
+    def contar(self, accion, cantidad=1):
+        self.contadores[accion] += cantidad
+
+    def detalle(self, mensaje):
+        """Una línea por fila; solo con -v 3"""
+        if self.verbosidad >= 3:
+            self.escribir(mensaje)
+
+    def aviso(self, mensaje):
+        self.contar('avisos')
+        if self.verbosidad >= 2:
+            self.escribir(self.style.WARNING(f'⚠ {mensaje}'))
+
+    def error(self, mensaje):
+        self.contar('errores')
+        if self.verbosidad >= 2:
+            self.escribir(self.style.ERROR(f'❌ {mensaje}'))
+
+    def escribir(self, texto):
+        self.cerrar_linea()
+        self.stdout.write(texto)
+
+    def escribir_progreso(self, ahora):
+        segundos = ahora - self.inicio
+        velocidad = self.procesadas / segundos if segundos else 0
+        texto = f'  {self.procesadas:,} filas'
+        if self.total:
+            hecho = min(self.procesadas / self.total, 1)
+            barra = '#' * int(hecho * 20)
+            texto = f'  [{barra:<20}] {self.procesadas:,}/{self.total:,} filas'
+            if velocidad:
+                texto += f' · {velocidad:,.0f} filas/s · faltan {(self.total - self.procesadas) / velocidad:.0f} s'
+        elif velocidad:
+            texto += f' · {velocidad:,.0f} filas/s'
+
+        if self.en_terminal:
+            self.stdout.write(f'\r{texto}', ending='')
+            self.stdout.flush()
+            self.linea_abierta = True
+        else:
+            self.stdout.write(texto)
+
+    def cerrar_linea(self):
+        if self.linea_abierta:
+            self.stdout.write('')
+            self.linea_abierta = False
+
+    def terminar(self):
+        """Cierra la línea de progreso y escribe las filas y los contadores acumulados"""
+        self.cerrar_linea()
+        segundos = time.monotonic() - self.inicio
+        velocidad = f' ({self.procesadas / segundos:,.0f} filas/s)' if segundos else ''
+        self.stdout.write(f'  {self.procesadas:,} filas procesadas en {segundos:.1f} s{velocidad}')
+        if self.contadores['avisos']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠ {self.contadores['avisos']} avisos" + ('' if self.verbosidad >= 2 else ' (-v 2 para verlos)')
+            ))
+        if self.contadores['errores']:
+            self.stdout.write(self.style.ERROR(
+                f"❌ {self.contadores['errores']} errores" + ('' if self.verbosidad >= 2 else ' (-v 2 para verlos)')
+            ))
@@ -1,69 +1,192 @@
-from import_export import resources, fields
+from import_export import fields
+from import_export.results import RowResult
 from import_export.widgets import ForeignKeyWidget, BooleanWidget
-from .models import PC, AreaOrganizativa, Responsable
-from Perifericos.models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
+from django.core.exceptions import ValidationError
+from .models import PC, AreaOrganizativa, Responsable, EstadisticaInventarioArea
+from .importacion import completar_efectos_de_guardado, crear_en_lotes
+from .sincronizacion import completar_responsable_y_area, propagar_a_perifericos
 from ComponentesInternos.models import NumeroInventario, SistemaOperativo, Procesador, RAM, DiscoDuro
+from ComponentesInternos.resources import (
+    ForeignKeyPrecargadoWidget, RecursoExportacion, RecursoImportacionEnBloque, clave_importacion
+)
 from django.db.models import Count
 
 class SiNoWidget(BooleanWidget):
+    # Al importar se aceptan también los valores que escribe la exportación
+    TRUE_VALUES = BooleanWidget.TRUE_VALUES + ['SI', 'Si', 'si', 'SÍ', 'Sí', 'sí']
+
     def render(self, value, obj=None, **kwargs):
         return 'SI' if value else 'NO'
 
-class PCResource(resources.ModelResource):
+class RecursoDispositivo(RecursoImportacionEnBloque):
+    """
+    Importación en bloque de PCs y periféricos. Cada fila se identifica por su
+    número de inventario dentro del tipo de dispositivo; los números que aún no
+    existen se crean juntos en before_import. Cada dispositivo toma el responsable
+    y el área de su PC asociada o el área de su responsable, como en save(), y al
+    terminar se recalculan en bloque los números de inventario y las estadísticas.
+    """
+    def queryset_relacion(self, campo):
+        if campo.attribute == 'numero_inventario':
+            return NumeroInventario.objects.filter(tipo_dispositivo=self._meta.model.TIPO_DISPOSITIVO)
+        # El responsable y el área que el dispositivo toma de su PC o de su responsable
+        if campo.attribute == 'pc_asociada':
+            return super().queryset_relacion(campo).select_related('responsable', 'area')
+        if campo.attribute == 'responsable':
+            return super().queryset_relacion(campo).select_related('area')
+        return super().queryset_relacion(campo)
+
+    def precargar_relaciones(self, dataset):
+        super().precargar_relaciones(dataset)
+        # (modelo, id) -> objeto de todo lo precargado, con sus relaciones ya unidas
+        self.cargados = {}
+        pendientes = [obj for campo in self.get_import_fields()
+                      if isinstance(campo.widget, ForeignKeyPrecargadoWidget) and campo.widget.objetos
+                      for obj in campo.widget.objetos.values()]
+        while pendientes:
+            obj = pendientes.pop()
+            self.cargados[type(obj), obj.pk] = obj
+            pendientes += [campo.get_cached_value(obj) for campo in obj._meta.concrete_fields
+                           if campo.is_relation and campo.is_cached(obj)
+                           and campo.get_cached_value(obj) is not None]
+
+        self.codigos_importados = set()
+        # Números de los dispositivos guardados, para completar_efectos_de_guardado
+        self.numeros_escritos = set()
+        campo = self.fields['numero_inventario']
+        if campo.column_name not in dataset.headers:
+            return
+        numeros = campo.widget.objetos
+        nuevos = {}
+        for valor in dataset[campo.column_name]:
+            if valor in (None, ''):
+                continue
+            codigo = clave_importacion(valor)
+            if codigo not in numeros and codigo not in nuevos:
+                nuevos[codigo] = NumeroInventario(
+                    codigo=codigo, tipo_dispositivo=self._meta.model.TIPO_DISPOSITIVO
+                )
+        # Otro importador puede estar creando el mismo código para otro tipo
+        crear_en_lotes(NumeroInventario, list(nuevos.values()), clave=lambda n: (n.codigo, n.tipo_dispositivo),
+                       tipo_dispositivo=self._meta.model.TIPO_DISPOSITIVO)
+        numeros.update(nuevos)
+
+    def before_import_row(self, row, **kwargs):
+        valor = row.get(self.fields['numero_inventario'].column_name)
+        if valor not in (None, ''):
+            codigo = clave_importacion(valor)
+            if codigo in self.codigos_importados:
+                raise ValidationError({
+                    'numero_inventario': f'El número de inventario {codigo} está repetido en el archivo'
+                })
+            self.codigos_importados.add(codigo)
+        super().before_import_row(row, **kwargs)
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # Lo que haría save(), con la PC y el responsable ya cargados por los widgets
+        completar_responsable_y_area([instance])
+        # Solo se copian ids: se enlazan los objetos precargados para que la vista
+        # previa no consulte el responsable y el área de cada fila
+        for nombre in ('responsable', 'area'):
+            campo = instance._meta.get_field(nombre)
+            relacionado_id = getattr(instance, campo.attname)
+            if relacionado_id is not None and not campo.is_cached(instance):
+                relacionado = self.cargados.get((campo.related_model, relacionado_id))
+                if relacionado is not None:
+                    campo.set_cached_value(instance, relacionado)
+        if instance.numero_inventario_id:
+            self.numeros_escritos.add(instance.numero_inventario_id)
+        super().before_save_instance(instance, row, **kwargs)
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        if self._is_dry_run(kwargs):
+            return
+        if result.totals[RowResult.IMPORT_TYPE_NEW] or result.totals[RowResult.IMPORT_TYPE_UPDATE]:
+            completar_efectos_de_guardado(self._meta.model.TIPO_DISPOSITIVO, numeros_ids=self.numeros_escritos)
+
+class PCResource(RecursoDispositivo):
+    relaciones_exportacion = ('numero_inventario', 'responsable', 'area', 'sistema_operativo',
+                              'procesador', 'ram', 'disco_duro')
+    campos_exportacion = ('numero_inventario__codigo', 'responsable__nombre', 'area__nombre',
+                          'funciona', 'es_proyecto_internacional', 'sistema_operativo__nombre',
+                          'procesador__nombre', 'ram__capacidad', 'disco_duro__capacidad')
+
     numero_inventario = fields.Field(
         column_name='No. Inv.',
         attribute='numero_inventario',
-        widget=ForeignKeyWidget(NumeroInventario, 'codigo')
+        widget=ForeignKeyPrecargadoWidget(NumeroInventario, 'codigo')
     )
     responsable = fields.Field(
         column_name='Responsable',
         attribute='responsable',
-        widget=ForeignKeyWidget(Responsable, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(Responsable, 'nombre')
     )
     area = fields.Field(
         column_name='Área',
         attribute='area',
-        widget=ForeignKeyWidget(AreaOrganizativa, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(AreaOrganizativa, 'nombre')
     )
     funciona = fields.Field(
         column_name='Estado',
         attribute='funciona',
-        widget=SiNoWidget()
+        widget=SiNoWidget(),
+        default=True
     )
     es_proyecto_internacional = fields.Field(
         column_name='Proyecto Int.',
         attribute='es_proyecto_internacional',
-        widget=SiNoWidget()
+        widget=SiNoWidget(),
+        default=False
     )
     sistema_operativo = fields.Field(
         column_name='Sistema Op.',
         attribute='sistema_operativo',
-        widget=ForeignKeyWidget(SistemaOperativo, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(SistemaOperativo, 'nombre')
     )
     procesador = fields.Field(
         column_name='CPU',
         attribute='procesador',
-        widget=ForeignKeyWidget(Procesador, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(Procesador, 'nombre')
     )
     ram = fields.Field(
         column_name='RAM',
         attribute='ram',
-        widget=ForeignKeyWidget(RAM, 'capacidad')
+        widget=ForeignKeyPrecargadoWidget(RAM, 'capacidad')
     )
     disco_duro = fields.Field(
         column_name='HDD',
         attribute='disco_duro',
-        widget=ForeignKeyWidget(DiscoDuro, 'capacidad')
+        widget=ForeignKeyPrecargadoWidget(DiscoDuro, 'capacidad')
     )
 
+    def bulk_update(self, *args, **kwargs):
+        self.pcs_actualizadas.extend(self.update_instances)
+        super().bulk_update(*args, **kwargs)
+
+    def before_import(self, dataset, **kwargs):
+        self.pcs_actualizadas = []
+        super().before_import(dataset, **kwargs)
+
+    def after_import(self, dataset, result, **kwargs):
+        if not self._is_dry_run(kwargs) and self.pcs_actualizadas:
+            # bulk_update no emite señales: los periféricos siguen a su PC desde aquí
+            propagar_a_perifericos(self.pcs_actualizadas)
+        super().after_import(dataset, result, **kwargs)
+
     class Meta:
         model = PC
+        import_id_fields = ('numero_inventario',)
         fields = ('numero_inventario', 'responsable', 'area', 'funciona', 
                  'es_proyecto_internacional', 'sistema_operativo', 'procesador', 
                  'ram', 'disco_duro')
         export_order = fields
 
-class AreaOrganizativaResource(resources.ModelResource):
+class AreaOrganizativaResource(RecursoExportacion):
+    # Los conteos salen de before_export, no de la fila
+    relaciones_exportacion = ('area_padre',)
+    campos_exportacion = ('nombre', 'area_padre__nombre')
+
     area_padre = fields.Field(
         column_name='Área Principal',
         attribute='area_padre',
@@ -106,78 +229,53 @@ class AreaOrganizativaResource(resources.ModelResource):
         attribute=None
     )
     
-    def get_areas_descendientes(self, obj):
-        """Obtiene todas las áreas descendientes (hijas y nietas)"""
-        areas = [obj.id]
-        # Obtener áreas hijas
-        hijas = AreaOrganizativa.objects.filter(area_padre=obj)
-        for hija in hijas:
-            areas.append(hija.id)
-            # Obtener áreas nietas
-            nietas = AreaOrganizativa.objects.filter(area_padre=hija)
-            areas.extend(nietas.values_list('id', flat=True))
-        return areas
+    def before_export(self, queryset, **kwargs):
+        # Conteos exactos en el momento de exportar, para todas las áreas a la vez:
+        # un GROUP BY por tipo de dispositivo (ver EstadisticaInventarioArea.calcular_conteos)
+        self.estadisticas = {
+            area_id: EstadisticaInventarioArea(area_id=area_id, **conteos)
+            for area_id, conteos in EstadisticaInventarioArea.calcular_conteos().items()
+        }
+        super().before_export(queryset, **kwargs)
+
+    def obtener_estadisticas(self, obj):
+        if hasattr(self, 'estadisticas'):
+            return self.estadisticas.get(obj.pk)
+        # Fuera de export(): las estadísticas mantenidas por señales
+        return getattr(obj, 'estadisticas', None)
+
+    def formatear_conteo(self, obj, prefijo):
+        estadisticas = self.obtener_estadisticas(obj)
+        if estadisticas is None:
+            return "-"
+        return estadisticas.formatear(prefijo)
 
     def dehydrate_responsables(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        count = Responsable.objects.filter(area__id__in=areas).count()
-        return count if count > 0 else "-"
+        estadisticas = self.obtener_estadisticas(obj)
+        if estadisticas is None or estadisticas.responsables_total == 0:
+            return "-"
+        return estadisticas.responsables_total
 
     def dehydrate_pcs(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = PC.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = PC.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'pcs')
 
     def dehydrate_monitores(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Monitor.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Monitor.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'monitores')
 
     def dehydrate_teclados(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Teclado.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Teclado.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'teclados')
 
     def dehydrate_mouses(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Mouse.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Mouse.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'mouses')
 
     def dehydrate_impresoras(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Impresora.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Impresora.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'impresoras')
 
     def dehydrate_scaners(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = Scaner.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = Scaner.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'scaners')
 
     def dehydrate_ups(self, obj):
-        areas = self.get_areas_descendientes(obj)
-        total = UPS.objects.filter(area__id__in=areas).count()
-        if total == 0:
-            return "-"
-        funcionando = UPS.objects.filter(area__id__in=areas, funciona=True).count()
-        return f"{funcionando}/{total}"
+        return self.formatear_conteo(obj, 'ups')
 
     class Meta:
         model = AreaOrganizativa
@@ -185,7 +283,10 @@ class AreaOrganizativaResource(resources.ModelResource):
                  'teclados', 'mouses', 'impresoras', 'scaners', 'ups')
         export_order = fields
 
-class ResponsableResource(resources.ModelResource):
+class ResponsableResource(RecursoExportacion):
+    relaciones_exportacion = ('area',)
+    campos_exportacion = ('nombre', 'area__nombre')
+
     area = fields.Field(
         column_name='Área',
         attribute='area',
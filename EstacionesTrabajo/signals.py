@@ -0,0 +1,150 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from .models import PC, Responsable, AreaOrganizativa, EstadisticaInventarioArea
+from Perifericos.models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
+from ComponentesInternos.models import (NumeroInventario, TrabajoExportacion, SistemaOperativo, Procesador,
+                                       RAM, DiscoDuro)
+from ComponentesInternos.versiones import incrementar_version
+from .sincronizacion import propagar_a_perifericos
+
+MODELOS_DISPOSITIVO = [PC, Monitor, Teclado, Mouse, Impresora, Scaner, UPS]
+
+
+def recordar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda los valores previos al guardado para calcular qué cambió"""
+    instance._estado_anterior = None
+    if raw or instance.pk is None:
+        return
+    if sender is Responsable:
+        campos = ['area_id', 'nombre']
+    else:
+        campos = ['area_id', 'responsable_id', 'funciona', 'numero_inventario_id']
+    instance._estado_anterior = sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+
+# Estadísticas de inventario por área ------------------------------------------------------
+
+def actualizar_estadisticas_al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    prefijo = 'responsables' if sender is Responsable else EstadisticaInventarioArea.prefijo_de(sender)
+    funciona_actual = getattr(instance, 'funciona', False)
+    anterior = getattr(instance, '_estado_anterior', None)
+
+    if anterior is not None:
+        funciona_anterior = anterior.get('funciona', False)
+        if anterior['area_id'] == instance.area_id and funciona_anterior == funciona_actual:
+            return
+        EstadisticaInventarioArea.aplicar_delta(anterior['area_id'], prefijo, total=-1, ok=-int(funciona_anterior))
+
+    EstadisticaInventarioArea.aplicar_delta(instance.area_id, prefijo, total=1, ok=int(funciona_actual))
+
+
+def actualizar_estadisticas_al_eliminar(sender, instance, **kwargs):
+    prefijo = 'responsables' if sender is Responsable else EstadisticaInventarioArea.prefijo_de(sender)
+    funciona = getattr(instance, 'funciona', False)
+    EstadisticaInventarioArea.aplicar_delta(instance.area_id, prefijo, total=-1, ok=-int(funciona))
+
+
+# Nombre del responsable guardado en NumeroInventario ----------------------------------------
+
+def actualizar_numero_al_guardar_dispositivo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    numero_anterior_id = anterior['numero_inventario_id'] if anterior else None
+    if numero_anterior_id and numero_anterior_id != instance.numero_inventario_id:
+        NumeroInventario.asignar_responsable(NumeroInventario.objects.filter(pk=numero_anterior_id), '')
+
+    if instance.numero_inventario_id:
+        nombre = instance.responsable.nombre if instance.responsable_id else ''
+        NumeroInventario.asignar_responsable(
+            NumeroInventario.objects.filter(pk=instance.numero_inventario_id), nombre
+        )
+        instance.numero_inventario.responsable_nombre = nombre
+
+
+def actualizar_numero_al_eliminar_dispositivo(sender, instance, **kwargs):
+    if instance.numero_inventario_id:
+        NumeroInventario.objects.filter(pk=instance.numero_inventario_id).update(
+            responsable_nombre='', responsable_busqueda='', propietario_tipo=None, propietario_id=None
+        )
+
+
+def actualizar_numeros_al_guardar_responsable(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_estado_anterior', None)
+    if raw or created or anterior is None or anterior['nombre'] == instance.nombre:
+        return
+    for modelo in MODELOS_DISPOSITIVO:
+        NumeroInventario.asignar_responsable(
+            NumeroInventario.objects.filter(**{f'{modelo._meta.model_name}__responsable': instance}),
+            instance.nombre
+        )
+
+
+def actualizar_numeros_al_eliminar_responsable(sender, instance, **kwargs):
+    # Los dispositivos quedarán sin responsable (SET_NULL) sin pasar por save()
+    for modelo in MODELOS_DISPOSITIVO:
+        NumeroInventario.asignar_responsable(
+            NumeroInventario.objects.filter(**{f'{modelo._meta.model_name}__responsable': instance}),
+            ''
+        )
+
+
+# Periféricos conectados a una PC -----------------------------------------------------------
+
+def propagar_pc_a_perifericos(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_estado_anterior', None)
+    if raw or created or anterior is None:
+        return
+    if anterior['area_id'] != instance.area_id or anterior['responsable_id'] != instance.responsable_id:
+        propagar_a_perifericos([instance])
+
+
+# Sellos de versión ---------------------------------------------------------------------
+
+def invalidar_numeros_disponibles(sender, instance, raw=False, **kwargs):
+    incrementar_version(NumeroInventario.VERSION_DISPONIBLES)
+
+
+def invalidar_estructura_areas(sender, instance, raw=False, **kwargs):
+    incrementar_version(AreaOrganizativa.VERSION_ESTRUCTURA)
+
+
+def invalidar_exportaciones(sender, instance, raw=False, **kwargs):
+    incrementar_version(TrabajoExportacion.VERSION_DATOS)
+
+
+def conectar_senales():
+    for modelo in MODELOS_DISPOSITIVO + [Responsable]:
+        pre_save.connect(recordar_estado_anterior, sender=modelo,
+                         dispatch_uid=f'estado_anterior_{modelo._meta.label_lower}')
+        uid = f'estadisticas_{modelo._meta.label_lower}'
+        post_save.connect(actualizar_estadisticas_al_guardar, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(actualizar_estadisticas_al_eliminar, sender=modelo, dispatch_uid=uid)
+
+    for modelo in MODELOS_DISPOSITIVO:
+        uid = f'numero_inventario_{modelo._meta.label_lower}'
+        post_save.connect(actualizar_numero_al_guardar_dispositivo, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(actualizar_numero_al_eliminar_dispositivo, sender=modelo, dispatch_uid=uid)
+
+    post_save.connect(propagar_pc_a_perifericos, sender=PC, dispatch_uid='perifericos_pc')
+
+    uid = 'numero_inventario_responsable'
+    post_save.connect(actualizar_numeros_al_guardar_responsable, sender=Responsable, dispatch_uid=uid)
+    pre_delete.connect(actualizar_numeros_al_eliminar_responsable, sender=Responsable, dispatch_uid=uid)
+
+    for modelo in MODELOS_DISPOSITIVO + [NumeroInventario]:
+        uid = f'numeros_disponibles_{modelo._meta.label_lower}'
+        post_save.connect(invalidar_numeros_disponibles, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(invalidar_numeros_disponibles, sender=modelo, dispatch_uid=uid)
+
+    uid = 'estructura_areas'
+    post_save.connect(invalidar_estructura_areas, sender=AreaOrganizativa, dispatch_uid=uid)
+    post_delete.connect(invalidar_estructura_areas, sender=AreaOrganizativa, dispatch_uid=uid)
+
+    exportables = MODELOS_DISPOSITIVO + [Responsable, AreaOrganizativa, NumeroInventario,
+                                         SistemaOperativo, Procesador, RAM, DiscoDuro]
+    for modelo in exportables:
+        uid = f'exportaciones_{modelo._meta.label_lower}'
+        post_save.connect(invalidar_exportaciones, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(invalidar_exportaciones, sender=modelo, dispatch_uid=uid)
@@ -0,0 +1,213 @@
+"""
+Efectos de guardado de los dispositivos (PC y periféricos), por conjuntos.
+
+PC.save() y DispositivoBase.save() los aplican a un solo dispositivo y los
+importadores a lotes enteros, con el mismo código:
+
+- completar_responsable_y_area: el dispositivo toma el responsable y el área de
+  su PC asociada o, si no tiene, el área de su responsable.
+- sincronizar_tipo_numeros: el número de inventario toma el tipo del dispositivo.
+
+Los objetos relacionados que ya estén cargados se aprovechan; para el resto hay
+una consulta por modelo relacionado, sea cual sea el número de dispositivos.
+
+propagar_a_perifericos hace el camino inverso: cuando cambian el responsable o
+el área de una o muchas PCs, los copia a sus periféricos ya guardados, y
+mover_dispositivos reasigna de una vez todos los dispositivos de un queryset.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from ComponentesInternos.models import NumeroInventario, TrabajoExportacion
+from ComponentesInternos.versiones import incrementar_version
+
+
+def _valores_relacionados(dispositivos, campo, atributos):
+    """{id del objeto relacionado por `campo`: tupla de `atributos`}"""
+    campo_fk = dispositivos[0]._meta.get_field(campo)
+    valores = {}
+    faltan = set()
+    for dispositivo in dispositivos:
+        relacionado_id = getattr(dispositivo, campo_fk.attname)
+        if relacionado_id is None:
+            continue
+        relacionado = campo_fk.get_cached_value(dispositivo, default=None)
+        if relacionado is not None:
+            valores[relacionado_id] = tuple(getattr(relacionado, atributo) for atributo in atributos)
+        else:
+            faltan.add(relacionado_id)
+
+    faltan -= valores.keys()
+    if faltan:
+        consulta = campo_fk.related_model.objects.filter(pk__in=faltan).values_list('pk', *atributos)
+        valores.update((pk, tuple(resto)) for pk, *resto in consulta)
+    return valores
+
+
+def completar_responsable_y_area(dispositivos):
+    """
+    Antes de guardar, copia en cada dispositivo el responsable y el área de su PC
+    asociada o, si no tiene, el área de su responsable (si la tiene).
+    Solo cambia los objetos en memoria.
+    """
+    dispositivos = list(dispositivos)
+    if not dispositivos:
+        return
+
+    con_pc = [d for d in dispositivos if getattr(d, 'pc_asociada_id', None)]
+    sin_pc = [d for d in dispositivos if not getattr(d, 'pc_asociada_id', None) and d.responsable_id]
+    if con_pc:
+        pcs = _valores_relacionados(con_pc, 'pc_asociada', ['responsable_id', 'area_id'])
+        for dispositivo in con_pc:
+            if dispositivo.pc_asociada_id in pcs:
+                dispositivo.responsable_id, dispositivo.area_id = pcs[dispositivo.pc_asociada_id]
+    if sin_pc:
+        responsables = _valores_relacionados(sin_pc, 'responsable', ['area_id'])
+        for dispositivo in sin_pc:
+            area_id = responsables.get(dispositivo.responsable_id, (None,))[0]
+            if area_id:
+                dispositivo.area_id = area_id
+
+
+def sincronizar_tipo_numeros(dispositivos):
+    """
+    Marca los números de inventario de los dispositivos con su TIPO_DISPOSITIVO.
+    Un UPDATE ... WHERE id IN (...) por tipo, y solo si algún número tiene otro tipo.
+    """
+    pendientes = {}
+    for dispositivo in dispositivos:
+        if not dispositivo.numero_inventario_id:
+            continue
+        tipo = dispositivo.TIPO_DISPOSITIVO
+        numero = dispositivo._meta.get_field('numero_inventario').get_cached_value(dispositivo, default=None)
+        if numero is not None:
+            if numero.tipo_dispositivo == tipo:
+                continue
+            numero.tipo_dispositivo = tipo
+        pendientes.setdefault(tipo, set()).add(dispositivo.numero_inventario_id)
+
+    actualizados = 0
+    for tipo, ids in pendientes.items():
+        actualizados += NumeroInventario.objects.filter(pk__in=ids).exclude(
+            tipo_dispositivo=tipo
+        ).update(tipo_dispositivo=tipo)
+    if actualizados:
+        # Cambiar el tipo cambia los números libres de cada tipo
+        incrementar_version(NumeroInventario.VERSION_DISPONIBLES)
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+
+
+def modelos_perifericos():
+    """Modelos de dispositivo que pueden estar conectados a una PC"""
+    return [NumeroInventario.get_modelo_dispositivo(tipo)
+            for tipo in NumeroInventario.MODELOS_POR_TIPO if tipo != 'PC']
+
+
+def _trasladar_estadisticas(queryset, nueva_area):
+    """
+    Antes de cambiar el área de los dispositivos con update(): los resta de su área
+    actual y los suma a `nueva_area` (un id o una expresión), con una consulta
+    agrupada y un aplicar_delta por pareja de áreas distinta.
+    """
+    from .models import EstadisticaInventarioArea
+
+    prefijo = EstadisticaInventarioArea.prefijo_de(queryset.model)
+    if not hasattr(nueva_area, 'resolve_expression'):
+        nueva_area = Value(nueva_area)
+    movimientos = queryset.exclude(area_id=nueva_area).order_by().values(
+        'area_id', nueva_id=nueva_area
+    ).annotate(total=Count('pk'), ok=Count('pk', filter=Q(funciona=True)))
+    for movimiento in movimientos:
+        total, ok = movimiento['total'], movimiento['ok']
+        EstadisticaInventarioArea.aplicar_delta(movimiento['area_id'], prefijo, total=-total, ok=-ok)
+        EstadisticaInventarioArea.aplicar_delta(movimiento['nueva_id'], prefijo, total=total, ok=ok)
+
+
+def propagar_a_perifericos(pcs):
+    """
+    Copia el responsable y el área de las PCs (lista o queryset) a los periféricos
+    conectados a ellas: un UPDATE por tabla de periféricos, sea cual sea el número
+    de PCs. Como update() no pasa por save() ni emite señales, aquí se mantienen
+    también las estadísticas por área y el nombre del responsable guardado en los
+    números de inventario. Devuelve el número de periféricos actualizados.
+    """
+    if hasattr(pcs, 'values_list'):
+        pc_ids = list(pcs.order_by().values_list('pk', flat=True))
+    else:
+        pc_ids = [pc.pk for pc in pcs]
+    if not pc_ids:
+        return 0
+
+    actualizados = 0
+    numeros = Q()
+    for modelo in modelos_perifericos():
+        desfasados = modelo.objects.filter(pc_asociada__in=pc_ids).exclude(
+            responsable_id=F('pc_asociada__responsable_id'), area_id=F('pc_asociada__area_id')
+        ).order_by()
+
+        _trasladar_estadisticas(desfasados, F('pc_asociada__area_id'))
+
+        pc = modelo._meta.get_field('pc_asociada').related_model.objects.filter(
+            pk=OuterRef('pc_asociada_id')
+        ).order_by()
+        cantidad = desfasados.update(
+            responsable_id=Subquery(pc.values('responsable_id')[:1]),
+            area_id=Subquery(pc.values('area_id')[:1]),
+        )
+        if cantidad:
+            conectados = Q(**{f'{modelo._meta.model_name}__pc_asociada__in': pc_ids})
+            nombre = modelo.objects.filter(numero_inventario=OuterRef('pk')).values('responsable__nombre')[:1]
+            NumeroInventario.objects.filter(conectados).update(
+                responsable_nombre=Coalesce(Subquery(nombre), Value(''))
+            )
+            numeros |= conectados
+        actualizados += cantidad
+
+    if actualizados:
+        NumeroInventario.normalizar_busquedas(NumeroInventario.objects.filter(numeros))
+        incrementar_version(TrabajoExportacion.VERSION_DATOS)
+    return actualizados
+
+
+def mover_dispositivos(queryset, responsable=None, area=None):
+    """
+    Asigna el responsable y/o el área a todos los dispositivos del queryset con
+    UPDATEs en bloque y en una transacción. Si el responsable tiene área, los
+    dispositivos pasan a esa área, como en save(). Al mover PCs también se mueven
+    sus periféricos; los periféricos conectados a una PC no se mueven por sí solos
+    (los decide su PC). Devuelve (dispositivos movidos, periféricos conectados omitidos).
+    """
+    modelo = queryset.model
+    if responsable is not None and responsable.area_id:
+        area = responsable.area
+    cambios = {}
+    if responsable is not None:
+        cambios['responsable_id'] = responsable.pk
+    if area is not None:
+        cambios['area_id'] = area.pk
+    if not cambios:
+        return 0, 0
+
+    queryset = queryset.order_by()
+    omitidos = 0
+    if any(campo.name == 'pc_asociada' for campo in modelo._meta.fields):
+        omitidos = queryset.filter(pc_asociada__isnull=False).count()
+        queryset = queryset.filter(pc_asociada__isnull=True)
+    ids = list(queryset.values_list('pk', flat=True))
+    if not ids:
+        return 0, omitidos
+
+    seleccion = modelo.objects.filter(pk__in=ids)
+    with transaction.atomic():
+        if area is not None:
+            _trasladar_estadisticas(seleccion, area.pk)
+        seleccion.update(**cambios)
+        if responsable is not None:
+            NumeroInventario.asignar_responsable(
+                NumeroInventario.objects.filter(**{f'{modelo._meta.model_name}__in': ids}),
+                responsable.nombre
+            )
+        if modelo.TIPO_DISPOSITIVO == 'PC':
+            propagar_a_perifericos(seleccion)
+    incrementar_version(TrabajoExportacion.VERSION_DATOS)
+    return len(ids), omitidos
@@ -2,18 +2,22 @@ document.addEventListener('DOMContentLoaded', function() {
     // Función para modificar la URL del Select2 para incluir el tipo de dispositivo
     function modifySelect2Url(select, tipo) {
         if (!select.classList.contains('select2-hidden-accessible')) {
+            // Último código recibido, para pedir la página siguiente (paginación por clave)
+            let despues = '';
             django.jQuery(select).select2({
                 ajax: {
-                    url: '/admin/get-numeros-inventario/',
+                    url: '/estaciones/api/numeros-inventario/',
                     dataType: 'json',
                     delay: 250,
                     data: function(params) {
                         return {
                             term: params.term,
                             tipo: tipo,
+                            despues: (params.page || 1) > 1 ? despues : '',
                         };
                     },
                     processResults: function(data) {
+                        despues = data.pagination.despues || '';
                         return {
                             results: data.results,
                             pagination: data.pagination
@@ -1,3 +1,611 @@
+import io
+from functools import partial
+from unittest import mock
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook, load_workbook
+from django.urls import reverse, reverse_lazy
+from .models import PC, Responsable, AreaOrganizativa, AreaJerarquia, EstadisticaInventarioArea
+from . import estructura, importacion
+from .resources import PCResource, AreaOrganizativaResource
+from .importacion import FilaDispositivo, ImportadorDispositivos, InformeImportacion, leer_filas_excel
+from .sincronizacion import propagar_a_perifericos
+from Perifericos.models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
+from Perifericos.resources import MonitorResource
+from ComponentesInternos.models import (NumeroInventario, SufijoBusqueda, SistemaOperativo, Procesador,
+                                       RAM, DiscoDuro)
 
-# Create your tests here.
+
+class PCAdminChangelistTests(TestCase):
+    # Sesión y usuario (2), lookups de los filtros de área y componentes (7), conteos del
+    # paginador (2), la página de PCs (1) y un prefetch por tipo de periférico (6)
+    CONSULTAS_CHANGELIST = 18
+    # Sesión y usuario (2), lookups de los filtros (7 en PCs, 3 en periféricos), el conteo
+    # que decide si va a segundo plano (1) y una sola consulta con todas las filas, sin
+    # prefetch ni consultas por fila
+    CONSULTAS_EXPORTAR_PCS = 11
+    CONSULTAS_EXPORTAR_PERIFERICOS = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        departamento = AreaOrganizativa.objects.create(nombre='Departamento', area_padre=area)
+        local = AreaOrganizativa.objects.create(nombre='Local', area_padre=departamento)
+        sistema = SistemaOperativo.objects.create(nombre='W10')
+        procesador = Procesador.objects.create(nombre='Core i5')
+        ram = RAM.objects.create(capacidad='8GB')
+        disco = DiscoDuro.objects.create(capacidad='1TB')
+
+        for i in range(20):
+            responsable = Responsable.objects.create(nombre=f'Responsable {i}', area=local)
+            pc = PC.objects.create(
+                numero_inventario=NumeroInventario.objects.create(codigo=f'PC-{i}'),
+                responsable=responsable,
+                area=local,
+                sistema_operativo=sistema,
+                procesador=procesador,
+                ram=ram,
+                disco_duro=disco,
+            )
+            for modelo in (Monitor, Teclado, Mouse, Impresora, Scaner, UPS):
+                modelo.objects.create(
+                    numero_inventario=NumeroInventario.objects.create(
+                        codigo=f'{modelo.TIPO_DISPOSITIVO}-{i}'
+                    ),
+                    pc_asociada=pc,
+                )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_changelist_con_numero_fijo_de_consultas(self):
+        with self.assertNumQueries(self.CONSULTAS_CHANGELIST):
+            response = self.client.get(reverse('admin:EstacionesTrabajo_pc_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Monitor-19')
+        self.assertContains(response, 'UPS-0')
+
+    def exportar(self, url, recurso):
+        datos = {'format': '0', 'resource': '0'}
+        # El formulario de exportación pide marcar las columnas
+        datos.update({f'{recurso.__name__.lower()}_{campo}': 'on' for campo in recurso._meta.fields})
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(url, datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        libro = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        return list(libro.active.values), consultas
+
+    def test_exportar_pcs_en_streaming_sin_consultas_por_fila(self):
+        filas, consultas = self.exportar(reverse('admin:EstacionesTrabajo_pc_export'), PCResource)
+        self.assertEqual(filas[0][:3], ('No. Inv.', 'Responsable', 'Área'))
+        self.assertEqual(len(filas), 21)
+        self.assertIn(('PC-7', 'Responsable 7', 'Local', 'SI', 'NO', 'W10', 'Core i5', '8GB', '1TB'), filas)
+        self.assertEqual(len(consultas), self.CONSULTAS_EXPORTAR_PCS)
+
+    def test_exportar_perifericos_con_su_pc(self):
+        filas, consultas = self.exportar(reverse('admin:Perifericos_monitor_export'), MonitorResource)
+        self.assertEqual(len(filas), 21)
+        pcs = {fila[0]: fila[3] for fila in filas[1:]}
+        self.assertEqual(pcs['Monitor-3'], 'PC-3')
+        self.assertEqual(len(consultas), self.CONSULTAS_EXPORTAR_PERIFERICOS)
+        # Solo se leen las columnas declaradas por el recurso
+        self.assertNotIn('"EstacionesTrabajo_pc"."responsable_id"', consultas[-1]['sql'])
+
+
+def archivo_xlsx(filas):
+    """XLSX en memoria, como lo subiría un usuario al importar"""
+    libro = Workbook()
+    for fila in filas:
+        libro.active.append(fila)
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    archivo.name = 'importacion.xlsx'
+    return archivo
+
+
+def importar_desde_admin(test, modelo, filas):
+    """Vista previa y confirmación de la importación; devuelve las consultas de ambas"""
+    url = f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}'
+    # El LogEntry de la confirmación busca el ContentType una sola vez por proceso
+    ContentType.objects.get_for_model(modelo)
+    with CaptureQueriesContext(connection) as vista_previa:
+        response = test.client.post(reverse(f'{url}_import'), {
+            'format': '0', 'resource': '0', 'import_file': archivo_xlsx(filas),
+        })
+    test.assertEqual(response.status_code, 200)
+    result = response.context['result']
+    test.assertFalse(result.has_errors() or result.has_validation_errors(),
+                     [fila.validation_error for fila in result.invalid_rows])
+    with CaptureQueriesContext(connection) as confirmacion:
+        response = test.client.post(reverse(f'{url}_process_import'), response.context['confirm_form'].initial)
+    test.assertEqual(response.status_code, 302)
+    return vista_previa, confirmacion
+
+
+class PCAdminImportacionTests(TestCase):
+    CABECERA = ['No. Inv.', 'Responsable', 'Área', 'Estado', 'Proyecto Int.', 'Sistema Op.', 'CPU', 'RAM', 'HDD']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.otra = AreaOrganizativa.objects.create(nombre='Otra')
+        for i in range(5):
+            Responsable.objects.create(nombre=f'Responsable {i}', area=cls.area)
+        Responsable.objects.create(nombre='Sin área')
+        SistemaOperativo.objects.create(nombre='W10')
+        RAM.objects.create(capacidad='8GB')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def filas(self, cantidad, inicio=0):
+        return [self.CABECERA] + [
+            [1000 + i, f'Responsable {i % 5}', '', 'SI' if i % 2 else 'NO', 'NO', 'W10', '', '8GB', '']
+            for i in range(inicio, inicio + cantidad)
+        ]
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        pocas = importar_desde_admin(self, PC, self.filas(10))
+        muchas = importar_desde_admin(self, PC, self.filas(60, inicio=100))
+        self.assertEqual(len(pocas[0]), len(muchas[0]))
+        self.assertEqual(len(pocas[1]), len(muchas[1]))
+
+        pc = PC.objects.select_related('numero_inventario', 'ram').get(numero_inventario__codigo='1103')
+        self.assertEqual((pc.responsable.nombre, pc.area, pc.funciona, pc.ram.capacidad),
+                         ('Responsable 3', self.area, True, '8GB'))
+        # Lo que mantendrían save() y las señales
+        self.assertEqual(pc.numero_inventario.tipo_dispositivo, 'PC')
+        self.assertEqual(pc.numero_inventario.propietario, pc)
+        self.assertEqual(pc.numero_inventario.responsable_nombre, 'Responsable 3')
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.area).pcs_total, 70)
+
+    def test_reimportar_actualiza_y_mueve_los_perifericos(self):
+        importar_desde_admin(self, PC, self.filas(3))
+        pc = PC.objects.get(numero_inventario__codigo='1001')
+        monitor = Monitor.objects.create(pc_asociada=pc)
+
+        # Lo exportado se puede volver a importar tal cual, con cambios
+        filas = [self.CABECERA, ['1001', 'Sin área', 'Otra', 'NO', 'SI', 'W10', '', '8GB', '']]
+        importar_desde_admin(self, PC, filas)
+        self.assertEqual(PC.objects.count(), 3)
+        pc.refresh_from_db()
+        monitor.refresh_from_db()
+        self.assertEqual((pc.responsable.nombre, pc.area, pc.funciona, pc.es_proyecto_internacional),
+                         ('Sin área', self.otra, False, True))
+        self.assertEqual((monitor.responsable, monitor.area), (pc.responsable, self.otra))
+
+    def test_valores_desconocidos_y_codigos_repetidos_invalidan_la_fila(self):
+        filas = [self.CABECERA,
+                 ['1', 'Nadie', '', 'SI', 'NO', '', '', '', ''],
+                 ['2', '', 'Área', 'SI', 'NO', '', '', '', ''],
+                 ['2', '', 'Área', 'SI', 'NO', '', '', '', '']]
+        response = self.client.post(reverse('admin:EstacionesTrabajo_pc_import'), {
+            'format': '0', 'resource': '0', 'import_file': archivo_xlsx(filas),
+        })
+        self.assertEqual([fila.number for fila in response.context['result'].invalid_rows], [1, 3])
+        self.assertFalse(PC.objects.exists())
+        self.assertFalse(NumeroInventario.objects.exists())
+
+    def test_responsable_con_nombre_repetido_invalida_la_fila(self):
+        # Responsable.nombre no es único: no se elige uno de los dos en silencio
+        Responsable.objects.create(nombre='Responsable 0', area=self.otra)
+        filas = [self.CABECERA,
+                 ['1', 'Responsable 0', '', 'SI', 'NO', '', '', '', ''],
+                 ['2', 'Responsable 1', '', 'SI', 'NO', '', '', '', '']]
+        response = self.client.post(reverse('admin:EstacionesTrabajo_pc_import'), {
+            'format': '0', 'resource': '0', 'import_file': archivo_xlsx(filas),
+        })
+        invalidas = response.context['result'].invalid_rows
+        self.assertEqual([fila.number for fila in invalidas], [1])
+        self.assertIn('Hay varios', str(invalidas[0].error_dict['responsable']))
+
+
+class NumerosInventarioApiTests(TestCase):
+    URL = reverse_lazy('estacionestrabajo:get_numeros_inventario')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        NumeroInventario.objects.bulk_create([
+            NumeroInventario(codigo=f'M{i:03d}', tipo_dispositivo='Monitor') for i in range(45)
+        ])
+        Monitor.objects.create(numero_inventario=NumeroInventario.objects.get(codigo='M001'))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_paginacion_por_clave_solo_libres(self):
+        codigos = []
+        parametros = {'tipo': 'Monitor', 'term': 'M'}
+        while True:
+            datos = self.client.get(self.URL, parametros).json()
+            codigos += [r['text'] for r in datos['results']]
+            if not datos['pagination']['more']:
+                break
+            parametros['despues'] = datos['pagination']['despues']
+        self.assertEqual(codigos, [f'M{i:03d}' for i in range(45) if i != 1])
+
+    def test_busqueda_repetida_responde_304_sin_buscar(self):
+        response = self.client.get(self.URL, {'tipo': 'Monitor'})
+        etag = response['ETag']
+        # Sesión (1), usuario (1) y sello de versión (1)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.URL, {'tipo': 'Monitor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        NumeroInventario.objects.create(codigo='M999', tipo_dispositivo='Monitor')
+        response = self.client.get(self.URL, {'tipo': 'Monitor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_sin_sesion_no_hay_etag(self):
+        self.client.logout()
+        response = self.client.get(self.URL, {'tipo': 'Monitor'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class AreaOrganizativaExportTests(TestCase):
+    # Padres de todas las áreas (1), un GROUP BY de responsables (1) y uno por tipo de
+    # dispositivo (7) y las áreas a exportar (1), sin importar cuántas áreas haya
+    CONSULTAS = 10
+    # Sesión y usuario (2), lookups de los tres filtros de área (3), conteos del paginador (2)
+    # y la página de áreas con sus estadísticas (1), sin consultas por área
+    CONSULTAS_CHANGELIST = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.departamentos = [
+            AreaOrganizativa.objects.create(nombre=f'Departamento {i}', area_padre=cls.area) for i in range(5)
+        ]
+        for i, departamento in enumerate(cls.departamentos):
+            local = AreaOrganizativa.objects.create(nombre='Local', area_padre=departamento)
+            responsable = Responsable.objects.create(nombre=f'Responsable {i}', area=local)
+            PC.objects.create(responsable=responsable, area=local, funciona=i % 2 == 0)
+            Monitor.objects.create(area=departamento, funciona=True)
+
+    def test_conteos_por_subarbol_con_consultas_fijas(self):
+        # Contadores mantenidos desfasados a propósito: la exportación no depende de ellos
+        EstadisticaInventarioArea.objects.update(pcs_total=0, pcs_ok=0)
+        with self.assertNumQueries(self.CONSULTAS):
+            datos = AreaOrganizativaResource().export(
+                AreaOrganizativa.objects.select_related('area_padre').order_by('pk')
+            )
+        filas = {(fila[1], fila[0]): fila for fila in datos}
+        self.assertEqual(filas[('', 'Área')][2:5], (5, '3/5', '5/5'))
+        self.assertEqual(filas[('Área', 'Departamento 1')][2:5], (1, '0/1', '1/1'))
+        self.assertEqual(filas[('Departamento 0', 'Local')][2:5], (1, '1/1', '-'))
+
+    def test_changelist_lee_las_estadisticas_con_consultas_fijas(self):
+        self.client.force_login(self.usuario)
+        with self.assertNumQueries(self.CONSULTAS_CHANGELIST):
+            response = self.client.get(reverse('admin:EstacionesTrabajo_areaorganizativa_changelist'))
+        self.assertEqual(response.status_code, 200)
+        # PCs (OK/Total) y monitores del área raíz, acumulados sobre su subárbol
+        self.assertContains(response, '<td class="field-get_pcs_info">3/5</td>', html=True)
+        self.assertContains(response, '<td class="field-get_monitores_info">5/5</td>', html=True)
+
+
+class EstructuraAreasTests(TestCase):
+    def setUp(self):
+        estructura._cache.clear()
+
+    def test_sincroniza_estructura_y_comparte_mapa(self):
+        mapa = estructura.obtener_mapa_areas()
+        local = AreaOrganizativa.objects.get(nombre='Local informáticos')
+        self.assertEqual(mapa['Subdelegación OCIA (Departamento OCAI, Local informáticos)'], local.pk)
+        self.assertEqual(mapa['Subdelegación de CTI'], mapa['Subdelegación CTI'])
+        self.assertEqual(local.area_padre.area_padre.nombre, 'Subdelegación OCIA')
+        self.assertTrue(AreaJerarquia.objects.filter(descendiente=local, profundidad=2).exists())
+
+        # Sin cambios, el mapa sale de memoria: solo se lee el sello de versión
+        with self.assertNumQueries(1):
+            self.assertEqual(estructura.obtener_mapa_areas(), mapa)
+
+        # Modificar un área invalida el mapa; lo que ya existe no se vuelve a crear
+        total = AreaOrganizativa.objects.count()
+        AreaOrganizativa.objects.filter(pk=local.pk).delete()
+        AreaOrganizativa.objects.get(nombre='Economía').save()
+        estructura.obtener_mapa_areas()
+        self.assertEqual(AreaOrganizativa.objects.count(), total)
+
+
+class LecturaExcelTests(TestCase):
+    def test_leer_filas_excel_sin_cabecera_y_con_filas_vacias(self):
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(['Ubicación', 'No. Inv.', 'Responsable'])
+        hoja.append(['Economía', 1, 'Ana Gómez'])
+        hoja.append([])                  # Fila que no existe en la hoja
+        hoja.append(['Economía', 2])     # Fila más corta que el ancho pedido
+        hoja.append([None, None, None])  # Fila con celdas vacías
+        hoja['A6'] = 'Contabilidad'
+        archivo = io.BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        self.assertEqual(list(leer_filas_excel(archivo, ancho=3)), [
+            (2, ('Economía', 1, 'Ana Gómez')),
+            (3, (None, None, None)),
+            (4, ('Economía', 2, None)),
+            (5, (None, None, None)),
+            (6, ('Contabilidad', None, None)),
+        ])
+
+
+class AsignacionExcelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        for codigo in ('1234', '1235'):
+            PC.objects.create(numero_inventario=NumeroInventario.objects.create(codigo=codigo), area=area)
+
+    def asignar(self, filas):
+        salida = io.StringIO()
+        call_command('asignar_sistemas', excel_path=archivo_xlsx(filas), stdout=salida)
+        return salida.getvalue()
+
+    def test_codigos_numericos(self):
+        # La fila sin código hace que pandas lea la columna como float
+        self.asignar([['# Inventario', 'W10', 'W11'], [1234, 1, 0], [1235, 0, 1], [None, 1, 0]])
+        self.assertEqual(
+            dict(PC.objects.values_list('numero_inventario__codigo', 'sistema_operativo__nombre')),
+            {'1234': 'Windows 10', '1235': 'Windows 11'},
+        )
+
+    def test_sin_columnas_de_componentes(self):
+        salida = self.asignar([['# Inventario', 'Otra'], [1234, 1]])
+        self.assertIn('ninguna columna de sistema operativo', salida)
+        self.assertFalse(PC.objects.filter(sistema_operativo__isnull=False).exists())
+
+
+class ImportacionUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.area = AreaOrganizativa.objects.create(nombre='Economía')
+
+    def importar(self, filas, **kwargs):
+        importador = ImportadorDispositivos(Monitor, 'Monitor', {'Economía': self.area.pk}, upsert=True,
+                                            **kwargs)
+        return importador.importar(filas)
+
+    def test_reimportar_solo_escribe_los_cambios(self):
+        filas = [FilaDispositivo(i + 2, 'Economía', f'M{i}', 'Ana Gómez', True, False) for i in range(3)]
+        self.assertEqual(self.importar(filas).creados, 3)
+
+        resultado = self.importar(filas)
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.sin_cambios), (0, 0, 3))
+
+        filas[1] = filas[1]._replace(funciona=False)
+        filas.append(FilaDispositivo(5, 'Economía', 'M3', 'Ana Gómez', True, False))
+        resultado = self.importar(filas)
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.sin_cambios), (1, 1, 2))
+        self.assertEqual(Monitor.objects.count(), 4)
+        self.assertFalse(Monitor.objects.get(numero_inventario__codigo='M1').funciona)
+
+    def test_simulacion_no_escribe_y_describe_los_cambios(self):
+        filas = [FilaDispositivo(2, 'Economía', 'M0', 'Ana Gómez', True, False)]
+        self.importar(filas)
+
+        informe = InformeImportacion()
+        filas = [
+            filas[0]._replace(responsable='Luis Pérez'),
+            FilaDispositivo(3, 'Economía', 'M1', 'Ana Gómez', True, False),
+            FilaDispositivo(4, 'Contabilidad', 'M2', 'Ana Gómez', True, False),
+        ]
+        with self.assertNumQueries(3):
+            self.importar(filas, simular=True, informe=informe)
+
+        self.assertEqual(Monitor.objects.count(), 1)
+        self.assertFalse(Responsable.objects.filter(nombre='Luis Pérez').exists())
+        self.assertEqual(
+            [(e['accion'], e['codigo'], e['detalle']) for e in informe.entradas],
+            [('crear_responsable', '', 'Luis Pérez'),
+             ('actualizar', 'M0', 'responsable: Ana Gómez → Luis Pérez'),
+             ('crear', 'M1', ''),
+             ('area_desconocida', 'M2', 'Contabilidad')]
+        )
+
+    def test_lotes_sin_ids_devueltos_y_solo_los_numeros_escritos(self):
+        # Un número del tipo que la importación no toca conserva lo que tenga
+        NumeroInventario.objects.create(codigo='X', tipo_dispositivo='Monitor', responsable_nombre='Otro')
+        filas = [FilaDispositivo(i + 2, 'Economía', f'M{i}', f'Persona {i % 3}', True, False) for i in range(7)]
+
+        def actualizaciones_de_numeros(filas):
+            with CaptureQueriesContext(connection) as consultas:
+                self.importar(filas)
+            return len([c for c in consultas
+                        if c['sql'].startswith('UPDATE "ComponentesInternos_numeroinventario"')])
+
+        # Lotes de 3 filas y una base de datos que, como MySQL, no devuelve los ids insertados:
+        # crear_en_lotes los recupera por su código
+        lotes = mock.patch.object(importacion, 'en_lotes', partial(importacion.en_lotes, tamano=3))
+        lotes.start()
+        self.addCleanup(lotes.stop)
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            actualizaciones = actualizaciones_de_numeros(filas)
+
+        numeros = NumeroInventario.objects.filter(codigo__startswith='M').order_by('codigo')
+        self.assertEqual(
+            [(n.codigo, n.propietario.numero_inventario_id, n.responsable_nombre, n.responsable_busqueda)
+             for n in numeros],
+            [(f'M{i}', n.pk, f'Persona {i % 3}', f'persona {i % 3}') for i, n in enumerate(numeros)]
+        )
+        self.assertEqual(NumeroInventario.objects.get(codigo='X').responsable_nombre, 'Otro')
+
+        # Los UPDATE de los números no dependen de cuántos responsables distintos haya
+        filas = [fila._replace(responsable='Ana Gómez', funciona=False) for fila in filas]
+        self.assertEqual(actualizaciones_de_numeros(filas), actualizaciones)
+        self.assertEqual(set(numeros.values_list('responsable_busqueda', flat=True)), {'ana gomez'})
+
+    def test_crear_en_lotes_sin_ids_devueltos_no_confunde_tipos(self):
+        crear = NumeroInventario.objects.bulk_create
+
+        def con_otro_importador(objetos, **kwargs):
+            creados = crear(objetos, **kwargs)
+            # Otro importador crea a la vez el mismo código para otro tipo
+            NumeroInventario.objects.create(codigo='M0', tipo_dispositivo='PC')
+            return creados
+
+        with mock.patch.object(NumeroInventario.objects, 'bulk_create', con_otro_importador), \
+                mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.importar([FilaDispositivo(2, 'Economía', 'M0', 'Ana Gómez', True, False)])
+
+        self.assertEqual(Monitor.objects.get().numero_inventario.tipo_dispositivo, 'Monitor')
+        self.assertIsNone(NumeroInventario.objects.get(tipo_dispositivo='PC').propietario_id)
+
+    def test_en_paralelo_solo_escribe_las_tablas_del_tipo(self):
+        # Como en importar_todo: cada importador escribe solo en las tablas de su tipo; los
+        # periféricos de las PCs, los sufijos de búsqueda y los sellos se completan al final
+        filas = [FilaDispositivo(2, 'Economía', 'PC0', 'Ana Gómez', True, False)]
+        ImportadorDispositivos(PC, 'PC', {'Economía': self.area.pk}, upsert=True).importar(filas)
+        pc = PC.objects.get()
+        monitor = Monitor.objects.create(pc_asociada=pc)
+
+        filas = [filas[0]._replace(responsable='Luis Pérez'),
+                 FilaDispositivo(3, 'Economía', 'PC1', 'Rosa Díaz', True, False)]
+        with CaptureQueriesContext(connection) as consultas:
+            ImportadorDispositivos(PC, 'PC', {'Economía': self.area.pk}, upsert=True,
+                                   recalcular_estadisticas=False, en_paralelo=True).importar(filas)
+        compartidas = ('Perifericos_', 'ComponentesInternos_sufijobusqueda', 'ComponentesInternos_selloversion')
+        self.assertFalse([c['sql'] for c in consultas if not c['sql'].startswith('SELECT')
+                          and any(tabla in c['sql'] for tabla in compartidas)])
+        monitor.refresh_from_db()
+        self.assertEqual(monitor.responsable.nombre, 'Ana Gómez')
+        self.assertEqual(NumeroInventario.objects.get(codigo='PC1').responsable_busqueda, 'rosa diaz')
+        self.assertFalse(NumeroInventario.buscar(NumeroInventario.objects.all(), 'rosa').exists())
+
+        self.assertEqual(propagar_a_perifericos(PC.objects.all()), 1)
+        SufijoBusqueda.completar()
+        monitor.refresh_from_db()
+        self.assertEqual(monitor.responsable.nombre, 'Luis Pérez')
+        self.assertEqual(list(NumeroInventario.buscar(NumeroInventario.objects.all(), 'diaz')
+                              .values_list('codigo', flat=True)), ['PC1'])
+
+
+class EstadisticasAreaTests(TestCase):
+    CAMPOS = [campo.name for campo in EstadisticaInventarioArea._meta.fields if campo.name.endswith(('_ok', '_total'))]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.raiz = AreaOrganizativa.objects.create(nombre='Raíz')
+        cls.departamento = AreaOrganizativa.objects.create(nombre='Departamento', area_padre=cls.raiz)
+        cls.local = AreaOrganizativa.objects.create(nombre='Local', area_padre=cls.departamento)
+        cls.otra = AreaOrganizativa.objects.create(nombre='Otra')
+
+    def assertCoincideConCalculo(self):
+        conteos = EstadisticaInventarioArea.calcular_conteos()
+        for estadistica in EstadisticaInventarioArea.objects.all():
+            esperado = {campo: conteos.get(estadistica.area_id, {}).get(campo, 0) for campo in self.CAMPOS}
+            self.assertEqual({campo: getattr(estadistica, campo) for campo in self.CAMPOS}, esperado,
+                             estadistica.area.nombre)
+
+    def test_senales_mantienen_los_conteos(self):
+        ana = Responsable.objects.create(nombre='Ana', area=self.local)
+        luis = Responsable.objects.create(nombre='Luis', area=self.otra)
+        pc = PC.objects.create(responsable=ana, funciona=True)
+        monitor = Monitor.objects.create(pc_asociada=pc, funciona=False)
+        Teclado.objects.create(area=self.departamento, funciona=True)
+        self.assertCoincideConCalculo()
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.raiz).pcs_ok, 1)
+
+        # Cambia el estado
+        monitor.funciona = True
+        monitor.save()
+        self.assertCoincideConCalculo()
+
+        # Cambia de responsable y de área; el monitor sigue a la PC
+        pc.responsable = luis
+        pc.save()
+        self.assertCoincideConCalculo()
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.otra).monitores_total, 1)
+
+        # El responsable se mueve de área
+        ana.area = self.raiz
+        ana.save()
+        self.assertCoincideConCalculo()
+
+        pc.delete()
+        # La propagación movió el monitor con un UPDATE: se borra tal como está guardado
+        Monitor.objects.get(pk=monitor.pk).delete()
+        ana.delete()
+        self.assertCoincideConCalculo()
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.otra).pcs_total, 0)
+
+    def test_mover_area_reconstruye_los_conteos(self):
+        responsable = Responsable.objects.create(nombre='Ana', area=self.local)
+        PC.objects.create(responsable=responsable, funciona=True)
+        Monitor.objects.create(area=self.departamento)
+
+        self.departamento.area_padre = self.otra
+        self.departamento.save()
+        self.assertCoincideConCalculo()
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.raiz).pcs_total, 0)
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.otra).pcs_total, 1)
+
+    def test_contadores_desfasados_no_bajan_de_cero(self):
+        pc = PC.objects.create(area=self.local, funciona=True)
+        EstadisticaInventarioArea.objects.update(pcs_total=0, pcs_ok=0)
+        pc.delete()
+        self.assertEqual(
+            set(EstadisticaInventarioArea.objects.values_list('pcs_total', 'pcs_ok')), {(0, 0)}
+        )
+
+
+class JerarquiaAreasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.raiz = AreaOrganizativa.objects.create(nombre='Raíz')
+        cls.departamento = AreaOrganizativa.objects.create(nombre='Departamento', area_padre=cls.raiz)
+        cls.local = AreaOrganizativa.objects.create(nombre='Local', area_padre=cls.departamento)
+        cls.oficina = AreaOrganizativa.objects.create(nombre='Oficina', area_padre=cls.local)
+        cls.otra = AreaOrganizativa.objects.create(nombre='Otra')
+
+    def assertCoincideConPadres(self):
+        """Las filas de AreaJerarquia son exactamente las que da recorrer area_padre"""
+        padres = dict(AreaOrganizativa.objects.values_list('id', 'area_padre_id'))
+        esperadas = set()
+        for area_id in padres:
+            ancestro_id, profundidad = area_id, 0
+            while ancestro_id is not None:
+                esperadas.add((ancestro_id, area_id, profundidad))
+                ancestro_id, profundidad = padres[ancestro_id], profundidad + 1
+        self.assertEqual(
+            set(AreaJerarquia.objects.values_list('ancestro_id', 'descendiente_id', 'profundidad')), esperadas
+        )
+
+    def test_crear_areas(self):
+        self.assertCoincideConPadres()
+        self.assertEqual(AreaJerarquia.objects.get(ancestro=self.raiz, descendiente=self.oficina).profundidad, 3)
+
+    def test_mover_subarbol(self):
+        self.local.area_padre = self.otra
+        self.local.save()
+        self.assertCoincideConPadres()
+        self.assertEqual(set(self.otra.get_descendientes_ids()), {self.otra.pk, self.local.pk, self.oficina.pk})
+        self.assertEqual(AreaJerarquia.objects.get(ancestro=self.otra, descendiente=self.oficina).profundidad, 2)
+        self.assertFalse(AreaJerarquia.objects.filter(ancestro=self.raiz, descendiente=self.oficina).exists())
+
+        # Convertir el subárbol en raíz
+        self.local.area_padre = None
+        self.local.save()
+        self.assertCoincideConPadres()
+
+    def test_clean_rechaza_ciclos(self):
+        # Ni de sí misma ni de una subárea a cualquier profundidad
+        for padre in [self.departamento, self.local, self.oficina]:
+            self.departamento.area_padre = padre
+            with self.assertRaises(ValidationError):
+                self.departamento.clean()
+        self.departamento.area_padre = self.otra
+        self.departamento.clean()
@@ -1,48 +1,72 @@
+import hashlib
+from datetime import datetime, timezone
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from ComponentesInternos.models import NumeroInventario
-from Perifericos.models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
+from ComponentesInternos.versiones import obtener_version
 
 # Create your views here.
 
+RESULTADOS_POR_PAGINA = 20
+
+
+def _version_numeros_inventario(request):
+    # condition() pide el ETag y la fecha por separado: el sello se lee una vez por petición
+    if not hasattr(request, '_version_numeros_inventario'):
+        request._version_numeros_inventario = obtener_version(NumeroInventario.VERSION_DISPONIBLES)
+    return request._version_numeros_inventario
+
+
+def _etag_numeros_inventario(request):
+    """Cambia con los parámetros de la búsqueda y con cada modificación de los números"""
+    clave = f"{request.GET.urlencode()}|{_version_numeros_inventario(request)}"
+    return hashlib.md5(clave.encode()).hexdigest()
+
+
+def _ultima_modificacion_numeros_inventario(request):
+    return datetime.fromtimestamp(_version_numeros_inventario(request), tz=timezone.utc)
+
+
+# staff_member_required va por fuera: sin sesión de staff no hay ETag ni 304.
+# Una búsqueda repetida responde 304 con la sesión y el sello de versión, sin buscar.
 @staff_member_required
+@condition(etag_func=_etag_numeros_inventario,
+           last_modified_func=_ultima_modificacion_numeros_inventario)
+@cache_control(private=True, no_cache=True)
 def get_numeros_inventario(request):
-    """Vista para obtener números de inventario filtrados por tipo"""
+    """
+    Números de inventario libres de un tipo, en el formato de Select2.
+
+    Paginación por clave: `despues` es el último código de la página anterior
+    (se devuelve en pagination.despues) y la siguiente página empieza tras él.
+    """
     tipo = request.GET.get('tipo')
-    term = request.GET.get('term', '')  # Select2 usa 'term' para la búsqueda
-    
+    term = request.GET.get('term', '').strip()  # Select2 usa 'term' para la búsqueda
+    despues = request.GET.get('despues', '')
+
     if not tipo:
         return JsonResponse({'error': 'Tipo de dispositivo no especificado'}, status=400)
-    
-    # Filtrar por tipo
-    queryset = NumeroInventario.objects.filter(tipo_dispositivo=tipo)
-    
-    # Excluir los que ya están asignados según el tipo
-    if tipo == 'Monitor':
-        queryset = queryset.exclude(monitor__isnull=False)
-    elif tipo == 'Teclado':
-        queryset = queryset.exclude(teclado__isnull=False)
-    elif tipo == 'Mouse':
-        queryset = queryset.exclude(mouse__isnull=False)
-    elif tipo == 'Impresora':
-        queryset = queryset.exclude(impresora__isnull=False)
-    elif tipo == 'Scanner':
-        queryset = queryset.exclude(scaner__isnull=False)
-    elif tipo == 'UPS':
-        queryset = queryset.exclude(ups__isnull=False)
-    
-    # Filtrar por búsqueda si se proporciona
+
+    # Libres: sin dispositivo dueño (índice tipo_dispositivo, propietario_id, codigo)
+    queryset = NumeroInventario.objects.filter(tipo_dispositivo=tipo, propietario_id__isnull=True)
     if term:
-        queryset = queryset.filter(codigo__icontains=term)
-    
-    # Limitar a 10 resultados para no sobrecargar
-    results = [{'id': num.id, 'text': num.codigo} for num in queryset[:10]]
-    
+        queryset = queryset.filter(codigo__istartswith=term)
+    if despues:
+        queryset = queryset.filter(codigo__gt=despues)
+
+    # Un resultado de más indica si hay otra página, sin COUNT
+    numeros = list(queryset.order_by('codigo').values('id', 'codigo')[:RESULTADOS_POR_PAGINA + 1])
+    hay_mas = len(numeros) > RESULTADOS_POR_PAGINA
+    numeros = numeros[:RESULTADOS_POR_PAGINA]
+
     # Formato esperado por Select2
     return JsonResponse({
-        'results': results,
+        'results': [{'id': num['id'], 'text': num['codigo']} for num in numeros],
         'pagination': {
-            'more': False  # True si hay más resultados disponibles
+            'more': hay_mas,
+            'despues': numeros[-1]['codigo'] if hay_mas else None,
         }
     })
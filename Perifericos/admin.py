@@ -1,13 +1,15 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.admin import SimpleListFilter
-from import_export.admin import ExportMixin
+from ComponentesInternos.exportacion import ImportacionExportacionXLSXMixin
 from import_export.formats import base_formats
 from .models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
 from EstacionesTrabajo.models import AreaOrganizativa
 from .resources import (MonitorResource, TecladoResource, MouseResource, 
                       ImpresoraResource, ScanerResource, UPSResource)
-from EstacionesTrabajo.admin import PCAreaSelectFilter, PCSubareaSelectFilter, PCLocalSelectFilter
+from ComponentesInternos.admin import NumeroInventarioAutocompleteMixin
+from EstacionesTrabajo.admin import (PCAreaSelectFilter, PCSubareaSelectFilter, PCLocalSelectFilter,
+                                     mover_a_area_o_responsable)
 
 
 class AreaSelectFilter(SimpleListFilter):
@@ -24,16 +26,8 @@ class AreaSelectFilter(SimpleListFilter):
         if value:
             try:
                 area_id = int(value)
-                # Incluir el área seleccionada y todas sus subáreas y sub-subáreas
-                area_ids = [area_id]
-                # Obtener subáreas directas
-                subareas = AreaOrganizativa.objects.filter(area_padre_id=area_id)
-                area_ids.extend(subareas.values_list('id', flat=True))
-                # Obtener sub-subáreas
-                for subarea in subareas:
-                    sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea.id)
-                    area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(area_id__in=area_ids)
+                # Incluir el área seleccionada y todo su subárbol
+                return queryset.filter(area__jerarquia_ancestros__ancestro_id=area_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -56,11 +50,8 @@ class SubareaSelectFilter(SimpleListFilter):
         if value:
             try:
                 subarea_id = int(value)
-                # Incluir la subárea seleccionada y sus sub-subáreas
-                area_ids = [subarea_id]
-                sub_subareas = AreaOrganizativa.objects.filter(area_padre_id=subarea_id)
-                area_ids.extend(sub_subareas.values_list('id', flat=True))
-                return queryset.filter(area_id__in=area_ids)
+                # Incluir la subárea seleccionada y todo su subárbol
+                return queryset.filter(area__jerarquia_ancestros__ancestro_id=subarea_id)
             except (ValueError, TypeError):
                 return queryset
         return queryset
@@ -87,7 +78,7 @@ class LocalSelectFilter(SimpleListFilter):
                 return queryset
         return queryset
 
-class DispositivoAdmin(admin.ModelAdmin):
+class DispositivoAdmin(NumeroInventarioAutocompleteMixin, admin.ModelAdmin):
     list_display = ['get_numero_inventario', 'get_responsable', 'get_area', 'get_pc', 
                    'get_estado', 'get_proyecto_internacional', 'marca']
     list_filter = [
@@ -102,6 +93,7 @@ class DispositivoAdmin(admin.ModelAdmin):
                     'area__area_padre__nombre', 'area__area_padre__area_padre__nombre']
     autocomplete_fields = ['numero_inventario', 'pc_asociada', 'responsable', 'area']
     list_per_page = 20
+    actions = [mover_a_area_o_responsable]
 
     fieldsets = (
         ('Información del Dispositivo', {
@@ -118,6 +110,13 @@ class DispositivoAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Todo lo que muestran las columnas (y el __str__ de la fila) en la misma consulta
+        return super().get_queryset(request).select_related(
+            'numero_inventario', 'responsable', 'area__area_padre__area_padre',
+            'pc_asociada__numero_inventario'
+        )
+
     def get_numero_inventario(self, obj):
         if obj.numero_inventario:
             return obj.numero_inventario.codigo
@@ -132,7 +131,7 @@ class DispositivoAdmin(admin.ModelAdmin):
 
     def get_responsable(self, obj):
         if obj.responsable:
-            if obj.pc_asociada and obj.responsable == obj.pc_asociada.responsable:
+            if obj.pc_asociada and obj.responsable_id == obj.pc_asociada.responsable_id:
                 return format_html('<span title="Heredado de PC">👤 {}</span>', obj.responsable.nombre)
             return obj.responsable.nombre
         return "Sin responsable"
@@ -153,7 +152,7 @@ class DispositivoAdmin(admin.ModelAdmin):
                 area_completa = obj.area.nombre
 
             # Para el display, mostrar solo el nombre del área más específica
-            if obj.pc_asociada and obj.area == obj.pc_asociada.area:
+            if obj.pc_asociada and obj.area_id == obj.pc_asociada.area_id:
                 return format_html('<span title="{0}">🏢 {1}</span>', area_completa, obj.area.nombre)
             return format_html('<span title="{0}">{1}</span>', area_completa, obj.area.nombre)
         return "Sin área"
@@ -171,31 +170,31 @@ class DispositivoAdmin(admin.ModelAdmin):
     get_proyecto_internacional.short_description = 'Proyecto'
 
 @admin.register(Monitor)
-class MonitorAdmin(ExportMixin, DispositivoAdmin):
+class MonitorAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = MonitorResource
     formats = [base_formats.XLSX]
 
 @admin.register(Teclado)
-class TecladoAdmin(ExportMixin, DispositivoAdmin):
+class TecladoAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = TecladoResource
     formats = [base_formats.XLSX]
 
 @admin.register(Mouse)
-class MouseAdmin(ExportMixin, DispositivoAdmin):
+class MouseAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = MouseResource
     formats = [base_formats.XLSX]
 
 @admin.register(Impresora)
-class ImpresoraAdmin(ExportMixin, DispositivoAdmin):
+class ImpresoraAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = ImpresoraResource
     formats = [base_formats.XLSX]
 
 @admin.register(Scaner)
-class ScanerAdmin(ExportMixin, DispositivoAdmin):
+class ScanerAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = ScanerResource
     formats = [base_formats.XLSX]
 
 @admin.register(UPS)
-class UPSAdmin(ExportMixin, DispositivoAdmin):
+class UPSAdmin(ImportacionExportacionXLSXMixin, DispositivoAdmin):
     resource_class = UPSResource
     formats = [base_formats.XLSX]
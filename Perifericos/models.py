@@ -1,5 +1,6 @@
 from django.db import models
 from EstacionesTrabajo.models import PC, AreaOrganizativa, Responsable
+from EstacionesTrabajo.sincronizacion import completar_responsable_y_area, sincronizar_tipo_numeros
 from ComponentesInternos.models import NumeroInventario
 
 class DispositivoBase(models.Model):
@@ -46,6 +47,8 @@ class DispositivoBase(models.Model):
         default='Sin especificar',
         verbose_name='Marca'
     )
+    # Huella de la fila del Excel de la que se importó (ver EstacionesTrabajo.importacion)
+    hash_importacion = models.CharField(max_length=32, blank=True, default='', editable=False)
 
     class Meta:
         abstract = True
@@ -69,30 +72,23 @@ class DispositivoBase(models.Model):
                     existing.delete()  # Eliminar el registro existente para permitir la reasignación
 
     def save(self, *args, **kwargs):
-        # Si hay PC asociada, sincronizar responsable y área
-        if self.pc_asociada:
-            self.responsable = self.pc_asociada.responsable
-            self.area = self.pc_asociada.area
-        # Si hay responsable pero no área, sincronizar área
-        elif self.responsable and self.responsable.area:
-            self.area = self.responsable.area
-
-        # Asignar tipo de dispositivo al número de inventario
-        if self.numero_inventario:
-            self.numero_inventario.tipo_dispositivo = self.TIPO_DISPOSITIVO
-            self.numero_inventario.save()
+        # Responsable y área de la PC asociada (o área del responsable) y tipo del
+        # número de inventario, con el mismo código que las importaciones en bloque
+        completar_responsable_y_area([self])
+        sincronizar_tipo_numeros([self])
 
         super().save(*args, **kwargs)
 
+        # Mantener el puntero del número de inventario hacia este dispositivo
+        NumeroInventario.sincronizar_propietario(self)
+
     def __str__(self):
         partes = []
         if self.numero_inventario:
-            partes.append(str(self.numero_inventario))
+            # El dispositivo del número es este mismo
+            partes.append(self.numero_inventario.describir(self))
         if self.responsable:
-            print("tiene responsable")
             partes.append(f"de {self.responsable}")
-        else:
-            print("no tiene responsable")
         if self.area:
             partes.append(f"en {self.area}")
         if partes:
@@ -1,47 +1,53 @@
-from import_export import resources, fields
-from import_export.widgets import ForeignKeyWidget, BooleanWidget
+from import_export import fields
 from .models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
 from EstacionesTrabajo.models import PC, AreaOrganizativa, Responsable
+from EstacionesTrabajo.resources import RecursoDispositivo, SiNoWidget
 from ComponentesInternos.models import NumeroInventario
+from ComponentesInternos.resources import ForeignKeyPrecargadoWidget
 
-class SiNoWidget(BooleanWidget):
-    def render(self, value, obj=None, **kwargs):
-        return 'SI' if value else 'NO'
+class BasePerifericoResource(RecursoDispositivo):
+    relaciones_exportacion = ('numero_inventario', 'responsable', 'area', 'pc_asociada__numero_inventario')
+    campos_exportacion = ('numero_inventario__codigo', 'responsable__nombre', 'area__nombre',
+                          'pc_asociada__numero_inventario__codigo', 'funciona',
+                          'es_proyecto_internacional', 'marca')
 
-class BasePerifericoResource(resources.ModelResource):
     numero_inventario = fields.Field(
         column_name='No. Inv.',
         attribute='numero_inventario',
-        widget=ForeignKeyWidget(NumeroInventario, 'codigo')
+        widget=ForeignKeyPrecargadoWidget(NumeroInventario, 'codigo')
     )
     responsable = fields.Field(
         column_name='Responsable',
         attribute='responsable',
-        widget=ForeignKeyWidget(Responsable, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(Responsable, 'nombre')
     )
     area = fields.Field(
         column_name='Área',
         attribute='area',
-        widget=ForeignKeyWidget(AreaOrganizativa, 'nombre')
+        widget=ForeignKeyPrecargadoWidget(AreaOrganizativa, 'nombre')
     )
     pc_asociada = fields.Field(
         column_name='PC Asociada',
         attribute='pc_asociada',
-        widget=ForeignKeyWidget(PC, 'numero_inventario')
+        # El código de la PC, ya unido en la consulta (PC.__str__ haría consultas por fila)
+        widget=ForeignKeyPrecargadoWidget(PC, 'numero_inventario__codigo')
     )
     funciona = fields.Field(
         column_name='Estado',
         attribute='funciona',
-        widget=SiNoWidget()
+        widget=SiNoWidget(),
+        default=True
     )
     es_proyecto_internacional = fields.Field(
         column_name='Proyecto Int.',
         attribute='es_proyecto_internacional',
-        widget=SiNoWidget()
+        widget=SiNoWidget(),
+        default=False
     )
 
     class Meta:
         abstract = True
+        import_id_fields = ('numero_inventario',)
         fields = ('numero_inventario', 'responsable', 'area', 'pc_asociada', 
                  'funciona', 'es_proyecto_internacional', 'marca')
         export_order = fields
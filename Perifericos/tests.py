@@ -1,3 +1,281 @@
+from django.contrib.auth.models import Permission, User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import Monitor, Teclado, Mouse, Impresora, Scaner, UPS
+from EstacionesTrabajo.models import PC, Responsable, AreaOrganizativa, EstadisticaInventarioArea
+from EstacionesTrabajo.sincronizacion import (modelos_perifericos, propagar_a_perifericos,
+                                              sincronizar_tipo_numeros)
+from ComponentesInternos.models import NumeroInventario
+from EstacionesTrabajo.tests import importar_desde_admin
 
-# Create your tests here.
+
+class DispositivoAdminChangelistTests(TestCase):
+    MODELOS = [Monitor, Teclado, Mouse, Impresora, Scaner, UPS]
+    FILAS = [20, 100, 500]
+    # Sesión y usuario (2), lookups de los filtros de área (3), conteos del paginador (2)
+    # y la página de dispositivos (1). No debe crecer con el número de filas.
+    MAX_CONSULTAS = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        area = AreaOrganizativa.objects.create(nombre='Área')
+        departamento = AreaOrganizativa.objects.create(nombre='Departamento', area_padre=area)
+        cls.local = AreaOrganizativa.objects.create(nombre='Local', area_padre=departamento)
+        cls.responsable = Responsable.objects.create(nombre='Responsable', area=cls.local)
+        cls.pc = PC.objects.create(
+            numero_inventario=NumeroInventario.objects.create(codigo='PC-1', tipo_dispositivo='PC'),
+            responsable=cls.responsable,
+            area=cls.local,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def crear_dispositivos(self, modelo, cantidad):
+        """Crea `cantidad` dispositivos en total; la mitad asociados a la PC"""
+        existentes = modelo.objects.count()
+        numeros = NumeroInventario.objects.bulk_create([
+            NumeroInventario(codigo=f'{modelo.TIPO_DISPOSITIVO}-{i}', tipo_dispositivo=modelo.TIPO_DISPOSITIVO)
+            for i in range(existentes, cantidad)
+        ])
+        modelo.objects.bulk_create([
+            modelo(
+                numero_inventario=numero,
+                pc_asociada=self.pc if i % 2 == 0 else None,
+                responsable=self.responsable,
+                area=self.local,
+            )
+            for i, numero in enumerate(numeros)
+        ])
+
+    def test_changelists_con_consultas_acotadas(self):
+        for modelo in self.MODELOS:
+            url = reverse(f'admin:Perifericos_{modelo._meta.model_name}_changelist')
+            for filas in self.FILAS:
+                with self.subTest(modelo=modelo.__name__, filas=filas):
+                    self.crear_dispositivos(modelo, filas)
+                    with CaptureQueriesContext(connection) as consultas:
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(consultas), self.MAX_CONSULTAS)
+
+
+class SincronizacionDispositivosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.local = AreaOrganizativa.objects.create(nombre='Local', area_padre=cls.area)
+        cls.responsable = Responsable.objects.create(nombre='Responsable', area=cls.local)
+        cls.pc = PC.objects.create(responsable=cls.responsable, area=cls.area)
+
+    def actualizaciones_de_tipo(self, consultas):
+        return [c for c in consultas.captured_queries
+                if c['sql'].startswith('UPDATE') and '"tipo_dispositivo"' in c['sql']]
+
+    def test_save_copia_la_pc_y_solo_cambia_el_tipo_si_hace_falta(self):
+        monitor = Monitor.objects.create(
+            numero_inventario=NumeroInventario.objects.create(codigo='M-1'),
+            pc_asociada=PC.objects.get(pk=self.pc.pk),
+        )
+        monitor.refresh_from_db()
+        self.assertEqual((monitor.responsable, monitor.area), (self.responsable, self.local))
+        self.assertEqual(monitor.numero_inventario.tipo_dispositivo, 'Monitor')
+
+        with CaptureQueriesContext(connection) as consultas:
+            monitor.save()
+        self.assertEqual(self.actualizaciones_de_tipo(consultas), [])
+
+    def test_sincronizar_tipo_en_bloque(self):
+        numeros = NumeroInventario.objects.bulk_create([NumeroInventario(codigo=f'T-{i}') for i in range(50)])
+        teclados = Teclado.objects.bulk_create([Teclado(numero_inventario=numero) for numero in numeros])
+        with CaptureQueriesContext(connection) as consultas:
+            sincronizar_tipo_numeros(Teclado.objects.filter(pk__in=[t.pk for t in teclados]))
+        self.assertEqual(len(self.actualizaciones_de_tipo(consultas)), 1)
+        self.assertEqual(NumeroInventario.objects.filter(tipo_dispositivo='Teclado').count(), 50)
+
+    def test_cambiar_responsable_de_pc_actualiza_sus_perifericos(self):
+        otra_area = AreaOrganizativa.objects.create(nombre='Otra área')
+        nuevo = Responsable.objects.create(nombre='Nuevo Responsable', area=otra_area)
+        for modelo in (Monitor, Teclado, UPS):
+            modelo.objects.create(
+                numero_inventario=NumeroInventario.objects.create(codigo=f'{modelo.TIPO_DISPOSITIVO}-1'),
+                pc_asociada=self.pc,
+                funciona=True,
+            )
+        suelto = Mouse.objects.create(responsable=self.responsable)
+        EstadisticaInventarioArea.reconstruir()
+
+        pc = PC.objects.get(pk=self.pc.pk)
+        pc.responsable = nuevo
+        with CaptureQueriesContext(connection) as consultas:
+            pc.save()
+        actualizaciones = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE "Perifericos_')]
+        self.assertEqual(len(actualizaciones), len(modelos_perifericos()))
+
+        for modelo in (Monitor, Teclado, UPS):
+            dispositivo = modelo.objects.select_related('numero_inventario').get()
+            self.assertEqual((dispositivo.responsable, dispositivo.area), (nuevo, otra_area))
+            self.assertEqual(dispositivo.numero_inventario.responsable_nombre, 'Nuevo Responsable')
+            self.assertEqual(dispositivo.numero_inventario.responsable_busqueda, 'nuevo responsable')
+        suelto.refresh_from_db()
+        self.assertEqual(suelto.responsable, self.responsable)
+
+        incremental = {e.area_id: (e.monitores_total, e.monitores_ok, e.ups_total)
+                       for e in EstadisticaInventarioArea.objects.all()}
+        EstadisticaInventarioArea.reconstruir()
+        reconstruidas = {e.area_id: (e.monitores_total, e.monitores_ok, e.ups_total)
+                         for e in EstadisticaInventarioArea.objects.all()}
+        self.assertEqual(incremental, reconstruidas)
+        self.assertEqual(incremental[otra_area.pk], (1, 1, 1))
+
+    def test_propagar_varias_pcs(self):
+        otra_area = AreaOrganizativa.objects.create(nombre='Otra área')
+        pcs = [PC.objects.create(responsable=self.responsable, area=self.area) for _ in range(5)]
+        Monitor.objects.bulk_create([Monitor(pc_asociada=pc, area=self.local) for pc in pcs])
+        PC.objects.filter(pk__in=[pc.pk for pc in pcs]).update(area=otra_area)
+        EstadisticaInventarioArea.reconstruir()
+
+        with CaptureQueriesContext(connection) as consultas:
+            actualizados = propagar_a_perifericos(PC.objects.filter(area=otra_area))
+        self.assertEqual(actualizados, 5)
+        self.assertEqual(Monitor.objects.filter(area=otra_area).count(), 5)
+        # Una sola pasada por tabla de periféricos para las cinco PCs
+        actualizaciones = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE "Perifericos_')]
+        self.assertEqual(len(actualizaciones), len(modelos_perifericos()))
+
+
+class MoverDispositivosAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.destino = AreaOrganizativa.objects.create(nombre='Destino')
+        cls.responsable = Responsable.objects.create(nombre='Responsable', area=cls.area)
+        cls.nuevo = Responsable.objects.create(nombre='Nuevo Responsable', area=cls.destino)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def accion(self, url, ids, **datos):
+        return self.client.post(url, {'action': 'mover_a_area_o_responsable',
+                                      '_selected_action': ids, **datos})
+
+    def test_mover_pcs_con_sus_perifericos(self):
+        pcs = [PC.objects.create(responsable=self.responsable, area=self.area) for _ in range(20)]
+        numeros = NumeroInventario.objects.bulk_create(
+            [NumeroInventario(codigo=f'M-{i}') for i in range(20)]
+        )
+        Monitor.objects.bulk_create([
+            Monitor(pc_asociada=pc, numero_inventario=numero, responsable=self.responsable,
+                    area=self.area, funciona=True)
+            for pc, numero in zip(pcs, numeros)
+        ])
+        EstadisticaInventarioArea.reconstruir()
+        url = reverse('admin:EstacionesTrabajo_pc_changelist')
+        ids = [pc.pk for pc in pcs]
+
+        # Primero la página de confirmación, sin cambiar nada
+        respuesta = self.accion(url, ids)
+        self.assertContains(respuesta, 'name="aplicar"')
+        self.assertContains(respuesta, '<strong>20</strong> periféricos')
+        self.assertFalse(PC.objects.filter(responsable=self.nuevo).exists())
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.accion(url, ids, aplicar='1', responsable=self.nuevo.pk)
+        self.assertRedirects(respuesta, url, fetch_redirect_response=False)
+        self.assertEqual(PC.objects.filter(responsable=self.nuevo, area=self.destino).count(), 20)
+        self.assertEqual(Monitor.objects.filter(responsable=self.nuevo, area=self.destino).count(), 20)
+        self.assertEqual(NumeroInventario.objects.filter(responsable_nombre='Nuevo Responsable').count(), 20)
+        # Unos pocos UPDATEs en bloque, no uno por dispositivo
+        actualizaciones = [c for c in consultas.captured_queries if c['sql'].startswith('UPDATE')]
+        self.assertLess(len(actualizaciones), 20)
+
+        incremental = {e.area_id: (e.pcs_total, e.monitores_total, e.monitores_ok)
+                       for e in EstadisticaInventarioArea.objects.all()}
+        EstadisticaInventarioArea.reconstruir()
+        reconstruidas = {e.area_id: (e.pcs_total, e.monitores_total, e.monitores_ok)
+                         for e in EstadisticaInventarioArea.objects.all()}
+        self.assertEqual(incremental, reconstruidas)
+        self.assertEqual(incremental[self.destino.pk], (20, 20, 20))
+
+    def test_perifericos_conectados_se_omiten(self):
+        pc = PC.objects.create(responsable=self.responsable, area=self.area)
+        conectado = Teclado.objects.create(pc_asociada=pc)
+        suelto = Teclado.objects.create(responsable=self.responsable)
+        url = reverse('admin:Perifericos_teclado_changelist')
+
+        self.accion(url, [conectado.pk, suelto.pk], aplicar='1', area=self.destino.pk)
+        conectado.refresh_from_db()
+        suelto.refresh_from_db()
+        self.assertEqual(conectado.area, self.area)
+        self.assertEqual((suelto.responsable, suelto.area), (self.responsable, self.destino))
+
+    def test_sin_permiso_de_cambio_no_hay_accion(self):
+        solo_lectura = User.objects.create_user('lector', 'lector@example.com', 'clave', is_staff=True)
+        solo_lectura.user_permissions.add(Permission.objects.get(codename='view_pc'))
+        pc = PC.objects.create(responsable=self.responsable, area=self.area)
+        self.client.force_login(solo_lectura)
+        url = reverse('admin:EstacionesTrabajo_pc_changelist')
+
+        self.assertNotContains(self.client.get(url), 'mover_a_area_o_responsable')
+        self.accion(url, [pc.pk], aplicar='1', area=self.destino.pk)
+        pc.refresh_from_db()
+        self.assertEqual(pc.area, self.area)
+
+    def test_area_distinta_de_la_del_responsable_vuelve_al_formulario(self):
+        teclado = Teclado.objects.create(responsable=self.responsable)
+        respuesta = self.accion(reverse('admin:Perifericos_teclado_changelist'), [teclado.pk],
+                                aplicar='1', area=self.area.pk, responsable=self.nuevo.pk)
+        self.assertContains(respuesta, 'pertenece al área Destino')
+        teclado.refresh_from_db()
+        self.assertEqual((teclado.responsable, teclado.area), (self.responsable, self.area))
+
+    def test_sin_area_ni_responsable_vuelve_al_formulario(self):
+        teclado = Teclado.objects.create(responsable=self.responsable)
+        respuesta = self.accion(reverse('admin:Perifericos_teclado_changelist'), [teclado.pk], aplicar='1')
+        self.assertContains(respuesta, 'Indique un área, un responsable o ambos.')
+
+
+class ImportacionPerifericosAdminTests(TestCase):
+    CABECERA = ['No. Inv.', 'Responsable', 'Área', 'PC Asociada', 'Estado', 'Proyecto Int.', 'marca']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.area = AreaOrganizativa.objects.create(nombre='Área')
+        cls.otra = AreaOrganizativa.objects.create(nombre='Otra')
+        cls.responsable = Responsable.objects.create(nombre='Responsable', area=cls.area)
+        for i in range(40):
+            PC.objects.create(
+                numero_inventario=NumeroInventario.objects.create(codigo=f'PC-{i}', tipo_dispositivo='PC'),
+                responsable=cls.responsable,
+            )
+        # Un número del mismo código pero de otro tipo no se reutiliza
+        NumeroInventario.objects.create(codigo='M-0', tipo_dispositivo='Teclado')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_monitores_toman_el_responsable_y_el_area_de_su_pc(self):
+        filas = [self.CABECERA] + [[f'M-{i}', '', 'Otra', f'PC-{i}', 'SI', 'NO', 'LG'] for i in range(30)]
+        filas.append(['M-suelto', 'Responsable', 'Otra', '', 'NO', 'NO', ''])
+        vista_previa, confirmacion = importar_desde_admin(self, Monitor, filas)
+        # Sin consultas por fila: ni para resolver columnas ni para mostrar la vista previa
+        self.assertLess(len(vista_previa), 30)
+        self.assertLess(len(confirmacion), 100)
+
+        monitor = Monitor.objects.select_related('numero_inventario', 'pc_asociada').get(
+            numero_inventario__codigo='M-7'
+        )
+        self.assertEqual(monitor.pc_asociada.numero_inventario.codigo, 'PC-7')
+        self.assertEqual((monitor.responsable, monitor.area, monitor.marca), (self.responsable, self.area, 'LG'))
+        self.assertEqual(monitor.numero_inventario.tipo_dispositivo, 'Monitor')
+        self.assertEqual(monitor.numero_inventario.propietario, monitor)
+        suelto = Monitor.objects.get(numero_inventario__codigo='M-suelto')
+        # Como save(): el área del responsable, y la marca por defecto
+        self.assertEqual((suelto.area, suelto.funciona, suelto.marca), (self.area, False, 'Sin especificar'))
+        self.assertEqual(EstadisticaInventarioArea.objects.get(area=self.area).monitores_total, 31)
+        self.assertEqual(NumeroInventario.objects.filter(codigo='M-0').count(), 2)